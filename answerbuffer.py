@@ -0,0 +1,144 @@
+"""
+Write-behind buffer for answers, kept in Redis.
+
+With ANSWER_BUFFER_URL set POST /users/answers puts the answers in a per-user hash keyed by question instead of
+saving them, so repeated saves of a field between flushes coalesce into one answer. flush_answers.py moves them to
+the answer table in batches. Until then the user's reads include the pending answers.
+
+A flush renames the user's pending hash to a flushing hash, saves it and deletes it after the commit, so answers
+buffered meanwhile wait for the next flush and a failed flush is retried with the same answers. A flusher holds a
+lease on each user it flushes, so several flushers can run, a flush whose lease expired is taken over by recover.
+"""
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Union
+
+PENDING = 'answerbuffer:pending:%d'
+FLUSHING = 'answerbuffer:flushing:%d'
+LEASE = 'answerbuffer:lease:%d'
+# ids of the users with answers to flush
+USERS = 'answerbuffer:users'
+# a flusher that stopped without done or retry gives the users up after this
+LEASE_SECONDS = 300
+
+
+class PendingAnswer(NamedTuple):
+    # rendered like an Answer, there is no id until it is flushed
+    id: Union[int, None]
+    time_received: datetime
+    answer: str
+    question_name: str
+    user_id: int
+
+
+clients = {}
+lock = threading.Lock()
+
+
+def connect(url: str):
+    """
+    Redis client for the url, one per process. redis is only needed when the buffer is used.
+    """
+    client = clients.get(url)
+    if client is None:
+        import redis
+        with lock:
+            client = clients.setdefault(url, redis.Redis.from_url(url, decode_responses=True))
+    return client
+
+
+def add(client, user_id: int, answers: Dict[str, str], trecv: datetime) -> List[PendingAnswer]:
+    # replaces any pending answer to the same questions
+    values = {question_name: json.dumps([answer, trecv.strftime("%Y-%m-%d-%H-%M-%S")])
+              for question_name, answer in answers.items()}
+    pipe = client.pipeline()
+    pipe.hset(PENDING % user_id, mapping=values)
+    pipe.sadd(USERS, user_id)
+    pipe.execute()
+    return [PendingAnswer(None, trecv, answer, question_name, user_id) for question_name, answer in answers.items()]
+
+
+def answers_in(user_id: int, values: Dict[str, str]) -> Dict[str, PendingAnswer]:
+    answers = {}
+    for question_name, value in values.items():
+        answer, trecv = json.loads(value)
+        answers[question_name] = PendingAnswer(None, datetime.strptime(trecv, "%Y-%m-%d-%H-%M-%S"), answer, question_name, user_id)
+    return answers
+
+
+def pending(client, user_id: int) -> Dict[str, PendingAnswer]:
+    """
+    Answers of the user not in the answer table yet, by question. Those being flushed are included until the
+    flush is committed.
+    """
+    pipe = client.pipeline()
+    pipe.hgetall(FLUSHING % user_id)
+    pipe.hgetall(PENDING % user_id)
+    flushing, waiting = pipe.execute()
+    if not flushing and not waiting:
+        return {}
+    answers = answers_in(user_id, flushing)
+    answers.update(answers_in(user_id, waiting))
+    return answers
+
+
+def ready(client, count: int) -> List[int]:
+    # up to count users with answers to flush, each user is only handed to one flusher
+    return [int(user_id) for user_id in client.spop(USERS, count) or ()]
+
+
+def lease(client, user_id: int, owner: str) -> bool:
+    # take the user for a flush, False if another flusher has it
+    return bool(client.set(LEASE % user_id, owner, nx=True, ex=LEASE_SECONDS))
+
+
+def take(client, user_id: int) -> Dict[str, PendingAnswer]:
+    """
+    The answers of the user to flush. Answers left by a flush that failed are taken again before newer ones.
+    """
+    if not client.exists(FLUSHING % user_id):
+        # only this flusher has the user, nothing else removes the pending hash
+        if not client.exists(PENDING % user_id):
+            return {}
+        client.rename(PENDING % user_id, FLUSHING % user_id)
+    return answers_in(user_id, client.hgetall(FLUSHING % user_id))
+
+
+def done(client, user_id: int) -> None:
+    """
+    The taken answers are committed. Answers buffered since then, or since a failed flush queued the user again, are
+    queued for the next flush, add did not queue them if the user was queued already.
+    """
+    pipe = client.pipeline()
+    pipe.delete(FLUSHING % user_id)
+    pipe.delete(LEASE % user_id)
+    pipe.exists(PENDING % user_id)
+    deleted, released, waiting = pipe.execute()
+    if waiting:
+        client.sadd(USERS, user_id)
+
+
+def retry(client, user_ids: List[int]) -> None:
+    # the flush failed, the taken answers stay to be flushed again
+    if user_ids:
+        pipe = client.pipeline()
+        pipe.delete(*[LEASE % user_id for user_id in user_ids])
+        pipe.sadd(USERS, *user_ids)
+        pipe.execute()
+
+
+def recover(client) -> List[int]:
+    """
+    Queue the users whose flush was interrupted, those with a flushing hash and no lease, for a flusher starting up.
+    Flushes other flushers are still running keep their lease.
+    """
+    user_ids = [int(key.rsplit(':', 1)[1]) for key in client.scan_iter(FLUSHING.replace('%d', '*'))]
+    user_ids = [user_id for user_id in user_ids if not client.exists(LEASE % user_id)]
+    retry(client, user_ids)
+    return user_ids
+
+
+def discard(client, user_id: int) -> None:
+    # the user was deleted
+    client.delete(PENDING % user_id, FLUSHING % user_id)
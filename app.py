@@ -3,6 +3,7 @@ Primary app code. Listens to email and processes submissions
 """
 import os
 import logging
+import time
 from datetime import datetime
 from flask import Flask
 from config import Config
@@ -27,21 +28,26 @@ os.makedirs(app.config['LOGDIR'], 0o777, True)
 logging.basicConfig(filename=logfile, level=app.config['LOGLEVEL'],
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+import json
 import pprint
 from datetime import date, timedelta, timezone
 from passlib.hash import argon2
-from typing import Tuple, Union
-from flask import jsonify, request
+from typing import Dict, Iterator, List, Set, Tuple, Union
+from flask import Response, jsonify, request, stream_with_context
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from flask_jwt_extended import (
     JWTManager, jwt_required, decode_token, get_jwt_identity,
     create_access_token, create_refresh_token
 )
-from sqlalchemy import func, cast, literal
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, bindparam, or_, func, literal, select, union_all
+from sqlalchemy.orm import aliased, joinedload
 from sqlalchemy.exc import IntegrityError
-from vidb.models import User, Token, Question, Answer, Index, Result, ResultComponent, ResultSubComponent, IndexComponent, IndexSubComponent
-from views import UserView, AnswerView, ResultView, ResultComponentView
+from vidb.models import User, Token, Question, Answer, AnswerArchive, CurrentAnswer, AnsweredCount, indexsubcomponent_question, Index, Result, ResultComponent, ResultSubComponent, IndexComponent, IndexSubComponent
+from views import UserView, AnswerView, ResultView, ResultComponentView, ScoreView
+import indexmodel
+import answerbuffer
+import resultwriter
+import packedscores
 from vicalc import VICalculator
 from vimailserver.mail_tasks import send_password_reset
 from flask_sqlalchemy import SQLAlchemy
@@ -49,6 +55,8 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
+VICalculator.cache.resize(app.config['SCORE_CACHE_SIZE'])
+VICalculator.shadow.configure(VICalculator.candidate(app.config['SHADOW_SCORER']), app.config['SHADOW_RATE'])
 
 
 class VIServiceException(Exception):
@@ -517,17 +525,73 @@ def delete_user():
     # deletes ALL user data - user record, all answers and results
     db.session.delete(user)
     db.session.commit()
+    if app.config['ANSWER_BUFFER_URL']:
+        answerbuffer.discard(answerbuffer.connect(app.config['ANSWER_BUFFER_URL']), user.id)
 
     return jsonify(
         {'count': 1, 'data': [{'type': 'Message', 'msg': "Successfully deleted user {} out".format(user.email)}]})
 
 
+def str_to_cursor(ans: str) -> Tuple[datetime, int]:
+    # answer page cursor - time received and id of the last answer on the previous page
+    t, _, answer_id = ans.rpartition('.')
+    if not t:
+        raise ValueError("no time in cursor %s" % ans)
+    return str_to_datetime(t), int(answer_id)
+
+
+def cursor_for(answer: Answer) -> str:
+    return "%s.%d" % (answer.time_received.strftime("%Y-%m-%d-%H-%M-%S"), answer.id)
+
+
+def requested_question_names(idx: indexmodel.IndexModel) -> List[str]:
+    """
+    Index questions, or the one in the question url parameter.
+    """
+    # this parameter can be a question name or not provided
+    # if not provided answers for all questions (possibly qualified by index) are returned
+    question_name = request.args.get('question')
+    if question_name:
+        question = db.session.query(Question).get(question_name)
+        if not question:
+            raise VI404Exception("No Question with the specified id was found.")
+        return [question_name] if question_name in idx.questions else []
+    return list(idx.questions)
+
+
+def answer_page(user: User, question_names: List[str], cursor: Union[Tuple[datetime, int], None], limit: int):
+    """
+    Up to limit answers of the user to the questions, newest first, after cursor. Keyset paging on
+    (time_received, id) so every page is an index range read however deep it is.
+    """
+    answers = db.session.query(Answer.id, Answer.time_received, Answer.answer, Answer.question_name)
+    answers = answers.filter(Answer.user_id == user.id).filter(Answer.question_name.in_(question_names))
+    if cursor:
+        answers = answers.filter(or_(Answer.time_received < cursor[0],
+                                     and_(Answer.time_received == cursor[0], Answer.id < cursor[1])))
+    return answers.order_by(Answer.time_received.desc(), Answer.id.desc()).limit(limit).all()
+
+
+def with_pending_answers(user: User, question_names: List[str], page: List) -> List:
+    """
+    The first page of answers with the answers of the user still in the write-behind buffer added, newest first.
+    Pending answers have no id to page past so they are all on the first page, in addition to its limit.
+    """
+    pending = [answer for answer in pending_answers(user).values() if answer.question_name in question_names]
+    if not pending:
+        return page
+    pending.sort(key=lambda answer: answer.question_name)
+    # a pending answer comes before a saved one received in the same second
+    return sorted(pending + page, key=lambda answer: (answer.time_received, answer.id is None), reverse=True)
+
+
 # get answer set for user
 # default get the latest answer for user for each question in index
-# filters as url parameters - as-of-time, question
+# filters as url parameters - as-of-time, question, limit, cursor
 # as-of-time - latest answer for each question before this time
 # question - all answers for question ordered by time received desc
 # question and as-of-time - latest answer for question before time
+# limit, cursor - one page of answers ordered by time received desc, the next cursor is returned with the page
 @app.route('/users/answers', methods=['GET'])
 @jwt_required()
 def answers_for_user():
@@ -538,55 +602,87 @@ def answers_for_user():
     user = check_user(('viuser',))
 
     # get index
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
-    answers = db.session.query(Answer).join(Question)
-    answers = answers.join((IndexSubComponent, Question.index_sub_components)).join(IndexComponent)
-    answers = answers.filter(Answer.user_id == user.id).filter(IndexComponent.index_name == idx.name)
-    # this parameter can be a question name or not provided
-    # if not provided answers for all questions (possibly qualified by index) are returned
-    question_name = request.args.get('question')
-    if question_name:
-        question = db.session.query(Question).get(question_name)
-        if not question:
-            raise VI404Exception("No Question with the specified id was found.")
-        answers = answers.filter(Question.name == question_name)
-    else:
-        answers = answers.order_by(Question.name)
-    answers = answers.order_by(Answer.time_received.desc())
+    question_names = requested_question_names(idx)
     # this parameter can be a datetime string or not provided
     # pretty much required for useful answers unless question is specified
     aod = request.args.get('as-of-time', type=str_to_datetime)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=str_to_cursor)
+    if request.args.get('cursor') and not cursor:
+        raise VI400Exception("Invalid cursor.")
+    if request.args.get('limit') and (limit is None or limit <= 0):
+        raise VI400Exception("Invalid limit.")
     if aod:
-        answers = answers.filter(Answer.time_received <= aod).all()
-        manswers = {}
-        # assume current answers are ordered by question and time received descending
-        for answer in answers:
-            if answer.question not in manswers:
-                manswers[answer.question] = answer
-        answers = manswers.values()
+        # latest answer for each question
+        answers = latest_answer_snapshot(user, question_names, aod)
+    elif limit or cursor:
+        limit = min(limit or app.config['ANSWER_PAGE_SIZE'], app.config['ANSWER_PAGE_MAX'])
+        answers = answer_page(user, question_names, cursor, limit)
+        next_cursor = cursor_for(answers[-1]) if len(answers) == limit else None
+        if not cursor:
+            answers = with_pending_answers(user, question_names, answers)
+        ret_answers = {'count': len(answers), 'data': [AnswerView.render(a) for a in answers], 'next': next_cursor}
+        return jsonify(ret_answers)
     else:
-        answers = answers.all()
+        answers = db.session.query(Answer).filter(Answer.user_id == user.id).filter(Answer.question_name.in_(question_names))
+        answers = answers.order_by(Answer.question_name, Answer.time_received.desc()).all()
+        pending = [answer for answer in pending_answers(user).values() if answer.question_name in question_names]
+        if pending:
+            # newest first within each question, a pending answer before a saved one received in the same second
+            answers = sorted(answers + pending, key=lambda answer: (answer.time_received, answer.id is None), reverse=True)
+            answers.sort(key=lambda answer: answer.question_name)
 
     ret_answers = {'count': len(answers), 'data': [AnswerView.render(a) for a in answers]}
     return jsonify(ret_answers)
 
 
-# add a new answer(s) for a user
-# answers in POST data
-@app.route('/users/answers', methods=['POST'])
+# export all the answers of a user
+# filters as url parameters - question
+# streamed a page at a time, newest first, so the response never has to be held in memory
+@app.route('/users/answers/export', methods=['GET'])
 @jwt_required()
-def add_answers_for_user():
+def export_answers_for_user():
     logging.info("handling request to %s", request.url)
-    logging.info("in add_answers_for_user[POST]")
-    # truncate to second precision
-    trecv = datetime.utcnow().replace(microsecond=0)
+    logging.info("in export_answers_for_user[GET]")
 
-    # authorize user, will abort if auth fails
+    # authenticate user
     user = check_user(('viuser',))
 
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
+    question_names = requested_question_names(idx)
+    limit = app.config['ANSWER_PAGE_MAX']
+
+    def generate():
+        count = 0
+        cursor = None
+        yield '{"data": ['
+        while True:
+            answers = answer_page(user, question_names, cursor, limit)
+            page = answers if cursor else with_pending_answers(user, question_names, answers)
+            for answer in page:
+                yield (',' if count else '') + json.dumps(AnswerView.render(answer))
+                count += 1
+            if len(answers) < limit:
+                break
+            cursor = (answers[-1].time_received, answers[-1].id)
+            # the pages are read back as plain rows, nothing builds up in the session
+        yield '], "count": %d}' % count
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def posted_answers() -> Dict[str, str]:
+    """
+    The answers in the POST data by question, validated. Empty answers are left out.
+    """
     data = None
     if request.is_json:
         data = request.get_json()
@@ -595,7 +691,8 @@ def add_answers_for_user():
         logging.error("no input supplied")
         raise VI400Exception("No input supplied.")
 
-    logging.debug("data - %s" % pprint.pformat(data, indent=4))
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("data - %s", pprint.pformat(data, indent=4))
 
     try:
         answers = data['answers']
@@ -604,33 +701,127 @@ def add_answers_for_user():
         logging.error("no answers supplied")
         raise VI400Exception("No answers supplied.")
 
+    # validate answers here before saving
+    # empty answers are not saved
+    # all answers are strings so this tests for empty string or None
+    answers = {question_name: answer for question_name, answer in answers.items() if answer}
+    if not indexmodel.known_questions(db.session, answers.keys()):
+        # warning - answer for question that does not exist
+        raise VI404Exception("No Question with the specified id was found.")
+    return answers
+
+
+# add a new answer(s) for a user
+# answers in POST data
+@app.route('/users/answers', methods=['POST'])
+@jwt_required()
+def add_answers_for_user():
+    logging.info("handling request to %s", request.url)
+    logging.info("in add_answers_for_user[POST]")
+    # truncate to second precision
+    trecv = datetime.utcnow().replace(microsecond=0)
+
+    # authorize user, will abort if auth fails
+    user = check_user(('viuser',))
+
+    answers = posted_answers()
+
     # get index
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
-    ret_answers = []
-    for question_name in answers.keys():
-        # validate answers here before saving
-        # empty answers are not saved
-        # all answers are strings so this tests for empty string or None
-        if answers[question_name]:
-            question = db.session.query(Question).get(question_name)
-            if not question:
-                # warning - answer for question that does not exist
-                raise VI404Exception("No Question with the specified id was found.")
-
-            # create Answer
-            answer = Answer(question=question, time_received=trecv, answer=answers[question_name], user=user)
-            db.session.add(answer)
-            ret_answers.append(answer)
+    if app.config['ANSWER_BUFFER_URL']:
+        # write behind, flush_answers.py saves them
+        ret_answers = answerbuffer.add(answerbuffer.connect(app.config['ANSWER_BUFFER_URL']), user.id, answers, trecv)
+        ranswers = {'count': len(ret_answers), 'data': [AnswerView.render(a) for a in ret_answers]}
+        return jsonify(ranswers), 202
 
+    ret_answers = save_answers(user, idx, answers, trecv)
     db.session.commit()
 
     ranswers = {'count': len(ret_answers), 'data': [AnswerView.render(a) for a in ret_answers]}
     return jsonify(ranswers), 201
 
 
+def set_current_answers(new: List[Dict[str, object]], existing: List[Dict[str, object]]) -> Set[str]:
+    """
+    Point the current answers at newly saved answers, values are current_answer rows. A current answer is only moved
+    to a newer answer, a concurrent request may have saved one meanwhile or created a row in new first.
+    Returns the questions of the rows inserted, the questions answered for the first time.
+    """
+    table = CurrentAnswer.__table__
+    inserted = set()
+    existing = list(existing)
+    if new:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), new)
+            inserted.update(value['question_name'] for value in new)
+        except IntegrityError:
+            # another request created some of them first, one at a time then
+            for value in new:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(table.insert(), value)
+                    inserted.add(value['question_name'])
+                except IntegrityError:
+                    existing.append(value)
+    if existing:
+        update = table.update().where(table.c.user_id == bindparam('b_user_id'))
+        update = update.where(table.c.question_name == bindparam('b_question_name'))
+        update = update.where(table.c.time_received <= bindparam('b_time_received'))
+        db.session.execute(update.values(answer_id=bindparam('b_answer_id'), time_received=bindparam('b_time_received')),
+                           [{'b_' + key: value for key, value in row.items()} for row in existing])
+    return inserted
+
+
+def save_answers(user: User, idx: indexmodel.IndexModel, answers: Dict[str, str], trecv: datetime,
+                 rescore: bool = True) -> List[Answer]:
+    """
+    Save the answers of the user received at trecv, answers equal to (or older than) the current answer are not saved.
+    Keeps the current answers and answered counts up to date and, with rescore, rescores if RESCORE_ON_SAVE.
+    Nothing is committed. Returns the accepted Answer for each question.
+    """
+    # the current answer to each question
+    current = db.session.query(CurrentAnswer).options(joinedload(CurrentAnswer.answer)).filter(CurrentAnswer.user_id == user.id)
+    current = {ca.question_name: ca for ca in current.filter(CurrentAnswer.question_name.in_(list(answers.keys())))}
+    changed = {question_name: answer for question_name, answer in answers.items()
+               if question_name not in current or (current[question_name].answer.answer != answer and
+                                                   current[question_name].time_received <= trecv)}
+    saved = {question_name: current[question_name].answer for question_name in answers.keys() if question_name not in changed}
+    # questions the user had not answered before
+    first_answers = set()
+    if changed:
+        # create Answers, one batched insert
+        db.session.execute(Answer.__table__.insert(), [{'time_received': trecv, 'answer': answer, 'user_id': user.id,
+                                                        'question_name': question_name}
+                                                       for question_name, answer in changed.items()])
+        # and read them back, the newest if the same question was answered twice in this second
+        new = db.session.query(Answer).filter(Answer.user_id == user.id).filter(Answer.time_received == trecv)
+        saved.update((answer.question_name, answer) for answer in new.filter(Answer.question_name.in_(list(changed.keys()))).order_by(Answer.id))
+
+        # and point the current answer for each question at them
+        values = [{'user_id': user.id, 'question_name': question_name, 'answer_id': saved[question_name].id,
+                   'time_received': trecv} for question_name in changed.keys()]
+        first_answers = set_current_answers([value for value in values if value['question_name'] not in current],
+                                            [value for value in values if value['question_name'] in current])
+        for ca in current.values():
+            db.session.expire(ca)
+    logging.info("save_answers: %d answers, %d changed for %s", len(answers), len(changed), user.email)
+
+    if first_answers:
+        db.session.flush()
+        update_answered_counts(user, idx, first_answers)
+
+    if changed and rescore and app.config['RESCORE_ON_SAVE']:
+        # only the modules reading the saved questions are rescored
+        db.session.flush()
+        score_user(user, idx, trecv)
+
+    return [saved[question_name] for question_name in answers.keys()]
+
+
 # get answer statistics for user
 @app.route('/users/answers/counts', methods=['GET'])
 @jwt_required()
@@ -642,25 +833,25 @@ def answer_counts_for_user():
     user = check_user(('viuser',))
 
     # get index
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
-    questions = db.session.query(Question).join((IndexSubComponent, Question.index_sub_components)).join(IndexComponent)
-    questions = questions.filter(IndexComponent.index_name == idx.name).all()
+    # questions answered at least once, kept up to date when answers are saved
+    answered = db.session.query(AnsweredCount.indexcomponent_name, AnsweredCount.answered).filter(AnsweredCount.user_id == user.id)
+    answered = dict(answered.all()) or answered_counts(user, idx)
 
     counts = {idx.name: {'total': 0, 'answered': 0}}
-    for q in questions:
-        # number of unanswered question
-        answers = db.session.query(Answer).filter(Answer.user_id == user.id).filter(Answer.question_name == q.name).count()
-        for isc in q.index_sub_components:
-            if isc.indexcomponent_name not in counts:
-                counts[isc.indexcomponent_name] = {'total': 0, 'answered': 0}
-            counts[isc.indexcomponent_name]['total'] += 1
+    for question_name, component_names in idx.questions.items():
+        for component_name in component_names:
+            if component_name not in counts:
+                counts[component_name] = {'total': 0, 'answered': 0}
+            counts[component_name]['total'] += 1
             counts[idx.name]['total'] += 1
-            if answers > 0:
-                counts[isc.indexcomponent_name]['answered'] += 1
-                counts[idx.name]['answered'] += 1
+    for component_name, count in answered.items():
+        if component_name in counts:
+            counts[component_name]['answered'] = count
+            counts[idx.name]['answered'] += count
 
     ret_answers = {'count': 1, 'data': [counts]}
     return jsonify(ret_answers)
@@ -679,7 +870,7 @@ def results_for_user():
     user = check_user(('viuser',))
 
     # get index
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
@@ -687,12 +878,291 @@ def results_for_user():
     # this parameter can be a datetime string or not provided
     aod = request.args.get('as-of-time', type=str_to_datetime, default=trecv)
     numpts = request.args.get('numpts', type=int, default=1)
-    results = results.filter(Result.time_generated <= aod).order_by(Result.time_generated.desc()).limit(numpts)
+    # a rescored result has the same time generated as the one it was rescored from, newest first
+    results = results.filter(Result.time_generated <= aod).order_by(Result.time_generated.desc(), Result.id.desc()).limit(numpts)
     ret_results = [ResultView.render(r) for r in results]
     rresults = {'count': len(ret_results), 'data': ret_results}
     return jsonify(rresults)
 
 
+def result_answers(result: Result) -> List[Answer]:
+    # the answers of the answer set of the result, or its answer_result links if it is from before answer sets
+    return result.answers if result.answer_set_id else result.linked_answers
+
+
+def previous_score_cards(user: User, idx: indexmodel.IndexModel, answers: Dict[str, Union[Answer, None]]) -> Tuple[Set[str], Dict[str, object]]:
+    """
+    Questions whose latest answer differs from the answers linked to the previous Result for the user,
+    and the score cards of the previous Result components to reuse for the modules not reading them.
+    """
+    prev = db.session.query(Result).filter(Result.user_id == user.id).filter(Result.index_name == idx.name)
+    # stored scores are only reused if they were calculated with the current rules
+    prev = prev.filter(Result.rules_version == VICalculator.RULES_VERSION)
+    prev = prev.order_by(Result.time_generated.desc(), Result.id.desc()).first()
+    if not prev:
+        return set(), {}
+
+    prev_answers = {answer.question_name: answer.id for answer in result_answers(prev)}
+    # answers still in the write-behind buffer have no id yet, they are always changed
+    changed = {qname for qname, answer in answers.items()
+               if (answer is not None and answer.id is None) or prev_answers.get(qname) != (answer.id if answer else None)}
+    changed.update(qname for qname in prev_answers if qname not in answers)
+
+    previous = {}
+    rcs = db.session.query(ResultComponent).options(joinedload(ResultComponent.result_sub_components))
+    for rc in rcs.filter(ResultComponent.result_id == prev.id):
+        card = VICalculator.storedCard(rc.indexcomponent_name, rc.points, rc.maxforanswered,
+                                       {rsc.indexsubcomponent_name: (rsc.points, rsc.maxforanswered)
+                                        for rsc in packedscores.sub_components(rc, prev)})
+        if card:
+            previous[rc.indexcomponent_name] = card
+    logging.debug("previous_score_cards: %d questions changed since Result %d", len(changed), prev.id)
+    return changed, previous
+
+
+def answered_counts(user: User, idx: indexmodel.IndexModel) -> Dict[str, int]:
+    """
+    Number of questions of each index component the user has answered, a question counts once for each of its
+    subcomponents. One grouped query.
+    """
+    questions = db.session.query(Answer.question_name).filter(Answer.user_id == user.id).distinct().subquery()
+    counts = db.session.query(IndexSubComponent.indexcomponent_name, func.count()).select_from(questions)
+    counts = counts.join(indexsubcomponent_question, indexsubcomponent_question.c.question_name == questions.c.question_name)
+    counts = counts.join(IndexSubComponent, IndexSubComponent.name == indexsubcomponent_question.c.indexsubcomponent_name)
+    counts = counts.filter(IndexSubComponent.indexcomponent_name.in_(list(idx.components)))
+    return dict(counts.group_by(IndexSubComponent.indexcomponent_name).all())
+
+
+def insert_answered_counts(user: User, counts: Dict[str, int]) -> bool:
+    # create counters of the user, False if another request created one of them first
+    if not counts:
+        return True
+    try:
+        with db.session.begin_nested():
+            db.session.execute(AnsweredCount.__table__.insert(), [
+                {'user_id': user.id, 'indexcomponent_name': component_name, 'answered': count}
+                for component_name, count in counts.items()])
+        return True
+    except IntegrityError:
+        return False
+
+
+def update_answered_counts(user: User, idx: indexmodel.IndexModel, question_names: Set[str]) -> None:
+    """
+    Add the questions answered for the first time to the answered counts of the user, the new answers must be flushed.
+    Users without counts yet get them counted from their answers. Counters created by a concurrent request meanwhile,
+    which could not see these answers, are incremented instead.
+    """
+    table = AnsweredCount.__table__
+    if db.session.query(AnsweredCount.user_id).filter(AnsweredCount.user_id == user.id).first() is None:
+        if insert_answered_counts(user, answered_counts(user, idx)):
+            return
+
+    increments = {}
+    for question_name in question_names:
+        for component_name in idx.questions.get(question_name, ()):
+            increments[component_name] = increments.get(component_name, 0) + 1
+    for component_name, increment in increments.items():
+        # in sql so concurrent updates add up
+        update = table.update().where(table.c.user_id == user.id).where(table.c.indexcomponent_name == component_name)
+        update = update.values(answered=table.c.answered + increment)
+        if not db.session.execute(update).rowcount and not insert_answered_counts(user, {component_name: increment}):
+            db.session.execute(update)
+
+
+def pending_answers(user: User) -> Dict[str, answerbuffer.PendingAnswer]:
+    # answers of the user in the write-behind buffer, by question
+    if not app.config['ANSWER_BUFFER_URL']:
+        return {}
+    return answerbuffer.pending(answerbuffer.connect(app.config['ANSWER_BUFFER_URL']), user.id)
+
+
+def latest_answer_snapshot(user: User, question_names: List[str], aod: Union[datetime, None] = None) -> List[Answer]:
+    """
+    Latest answer of the user as of aod (or ever) to each of the questions, ordered by question.
+    Answers still in the write-behind buffer take the place of saved ones received before them, answers can be saved
+    directly meanwhile by POST /users/answers/score.
+    """
+    answers = stored_answer_snapshot(user, question_names, aod)
+    pending = {question_name: answer for question_name, answer in pending_answers(user).items()
+               if question_name in question_names and (aod is None or answer.time_received <= aod)}
+    if not pending:
+        return answers
+    answers = {answer.question_name: answer for answer in answers}
+    answers.update((question_name, answer) for question_name, answer in pending.items()
+                   if question_name not in answers or answers[question_name].time_received <= answer.time_received)
+    return [answers[question_name] for question_name in sorted(answers.keys())]
+
+
+def stored_answer_snapshot(user: User, question_names: List[str], aod: Union[datetime, None] = None) -> List[Answer]:
+    """
+    Latest saved answer of the user as of aod (or ever) to each of the questions, ordered by question.
+    Read from the current answers, unless one of them is newer than aod. Then the answers are ranked per question
+    newest first with ROW_NUMBER, which answer_idx_user_question_time covers. Either is one round trip.
+    """
+    current = db.session.query(Answer).join(CurrentAnswer, CurrentAnswer.answer_id == Answer.id)
+    current = current.filter(CurrentAnswer.user_id == user.id).filter(CurrentAnswer.question_name.in_(question_names))
+    current = current.order_by(CurrentAnswer.question_name).all()
+    if current and (aod is None or all(answer.time_received <= aod for answer in current)):
+        return current
+    if aod and aod < archive_horizon():
+        return archived_answer_snapshot(user, question_names, aod)
+
+    ranked = db.session.query(Answer.id.label('id'),
+                              func.row_number().over(partition_by=Answer.question_name,
+                                                     order_by=(Answer.time_received.desc(), Answer.id.desc())).label('rownum'))
+    ranked = ranked.filter(Answer.user_id == user.id).filter(Answer.question_name.in_(question_names))
+    if aod:
+        ranked = ranked.filter(Answer.time_received <= aod)
+    ranked = ranked.subquery()
+    answers = db.session.query(Answer).join(ranked, Answer.id == ranked.c.id).filter(ranked.c.rownum == 1)
+    return answers.order_by(Answer.question_name).all()
+
+
+def archive_horizon() -> datetime:
+    # answers superseded before this time may have been moved to answer_archive
+    return datetime.utcnow().replace(microsecond=0) - timedelta(days=app.config['ANSWER_RETENTION_DAYS'])
+
+
+def archived_answer_snapshot(user: User, question_names: List[str], aod: datetime) -> List[Union[Answer, AnswerArchive]]:
+    """
+    Latest answer of the user as of aod to each of the questions, ordered by question, for times before the archive
+    horizon. The answers and the archived answers are ranked together, archived ones are returned as AnswerArchive.
+    """
+    history = union_all(
+        select(Answer.id, Answer.question_name, Answer.time_received).where(Answer.user_id == user.id)
+        .where(Answer.question_name.in_(question_names)).where(Answer.time_received <= aod),
+        select(AnswerArchive.id, AnswerArchive.question_name, AnswerArchive.time_received).where(AnswerArchive.user_id == user.id)
+        .where(AnswerArchive.question_name.in_(question_names)).where(AnswerArchive.time_received <= aod)
+    ).subquery()
+    ranked = select(history.c.id, func.row_number().over(partition_by=history.c.question_name,
+                                                         order_by=(history.c.time_received.desc(), history.c.id.desc())).label('rownum')).subquery()
+    answer_ids = [answer_id for answer_id, in db.session.execute(select(ranked.c.id).where(ranked.c.rownum == 1))]
+    answers = db.session.query(Answer).filter(Answer.id.in_(answer_ids)).all()
+    archived_ids = set(answer_ids).difference(answer.id for answer in answers)
+    if archived_ids:
+        answers += db.session.query(AnswerArchive).filter(AnswerArchive.id.in_(archived_ids)).all()
+    return sorted(answers, key=lambda answer: answer.question_name)
+
+
+def latest_answers(user: User, idx: indexmodel.IndexModel, aod: datetime) -> Dict[str, Union[Answer, None]]:
+    """
+    Latest answer of the user as of aod for every question in the index, None if not answered.
+    """
+    # map questions by name and create null answer for each question
+    answers = {question_name: None for question_name in idx.questions}
+    found_at_least_one = False
+    for lanswer in latest_answer_snapshot(user, list(idx.questions), aod):
+        found_at_least_one = True
+        answers[lanswer.question_name] = lanswer
+
+    if not found_at_least_one:
+        # no answers in db
+        logging.warning("Generating Result with no answers")
+    return answers
+
+
+def answer_sweep(answers: List[Answer], questions: List[str]) -> Iterator[Tuple[datetime, Dict[str, Union[Answer, None]], Set[str]]]:
+    """
+    Walk an answer history ordered by time received and yield the time, the latest answer for every question
+    and the questions whose answer changed, for each time at which an answer changed.
+    """
+    current = {qname: None for qname in questions}
+    changed = set()
+    for pos, answer in enumerate(answers):
+        latest = current.get(answer.question_name, False)
+        if latest is not False:
+            if latest is None or latest.answer != answer.answer:
+                changed.add(answer.question_name)
+            current[answer.question_name] = answer
+        # answers saved together share the time received
+        if changed and (pos + 1 == len(answers) or answers[pos + 1].time_received != answer.time_received):
+            yield answer.time_received, dict(current), changed
+            changed = set()
+
+
+def scoring_answers(user: User, answers: Dict[str, Union[Answer, None]]) -> Dict[str, str]:
+    """
+    Answer strings for the scorer, with the user birth date and gender added.
+    """
+    ret_answers = {k: getattr(v, "answer") if v else '' for k, v in answers.items()}
+
+    bdate = user.birth_date
+    # add birthdate to answers
+    ret_answers['BirthDate'] = bdate.strftime("%Y-%m-%d")
+    ret_answers['Gender'] = user.gender
+    return ret_answers
+
+
+def score_user(user: User, idx: indexmodel.IndexModel, aod: datetime, trace: Union[list, None] = None,
+               shadow: bool = False) -> Result:
+    """
+    Score the latest answers of the user as of aod and add the new Result to the session.
+    If trace is a list the explain trace of the score is appended to it.
+    If shadow is set the score may be sampled for comparison with the shadow candidate scorer.
+    """
+    return score_answers(user, idx, aod, latest_answers(user, idx, aod), trace, shadow)
+
+
+def score_answers(user: User, idx: indexmodel.IndexModel, aod: datetime, answers: Dict[str, Union[Answer, None]],
+                  trace: Union[list, None] = None, shadow: bool = False) -> Result:
+    """
+    Score answers, the latest answer of the user as of aod for every question in the index, and add the new Result
+    to the session. trace and shadow as for score_user.
+    """
+    ret_answers = scoring_answers(user, answers)
+    sampled = shadow and VICalculator.shadow.sample()
+    # calculate score, timed without the database reads for the shadow comparison
+    start = time.perf_counter()
+    if trace is not None or not app.config['RESCORE_ON_SAVE']:
+        # explained scores are always scored in full, the others come from the cache if they can
+        score = VICalculator.vi_points(ret_answers, trace)
+        elapsed = time.perf_counter() - start
+    else:
+        # a save changes a few answers, on a cache miss only the modules reading them are rescored
+        score = VICalculator.cached_points(ret_answers)
+        elapsed = time.perf_counter() - start
+        if score is None:
+            changed, previous = previous_score_cards(user, idx, answers)
+            start = time.perf_counter()
+            score = VICalculator.vi_points_incremental(ret_answers, changed, previous)
+            elapsed += time.perf_counter() - start
+    if sampled:
+        # records the comparison only, the candidate score is not used
+        VICalculator.shadow.compare(ret_answers, score, elapsed)
+
+    return new_result(user, idx, aod, answers, score)
+
+
+def new_result(user: User, idx: indexmodel.IndexModel, aod: datetime, answers: Dict[str, Union[Answer, None]],
+               score: Dict[str, object]) -> Result:
+    """
+    Save the Result tree for a score of answers as of aod, with the answer set of the answers.
+    """
+    return new_results(user, idx, [(aod, answers, score)])[0]
+
+
+def new_results(user: User, idx: indexmodel.IndexModel,
+                scored: List[Tuple[datetime, Dict[str, Union[Answer, None]], Dict[str, object]]]) -> List[Result]:
+    """
+    Save the Result trees for scores of answers as of each time with the bulk result writer, each with the answer set
+    of its answers. Returns the new Results in the same order.
+    """
+    logging.info("score_user: creating %d Results for %s", len(scored), user.email)
+    # archived and buffered answers can not be linked
+    rows = [resultwriter.ResultRow(user.id, idx.name, aod, score,
+                                   tuple(answer.id for answer in answers.values() if isinstance(answer, Answer)))
+            for aod, answers, score in scored]
+    packing = packedscores.layout(idx) if app.config['RESULT_PACKED_SCORES'] else None
+    rids = resultwriter.insert_results(db.session.connection(), rows, packing)
+
+    results = {}
+    for batch in resultwriter.batches(rids, resultwriter.MAX_PARAMETERS):
+        saved = db.session.query(Result).options(joinedload(Result.result_components)).filter(Result.id.in_(batch))
+        results.update((res.id, res) for res in saved)
+    return [results[rid] for rid in rids]
+
+
 # calc new index for user
 @app.route('/users/results', methods=['POST'])
 @jwt_required()
@@ -716,70 +1186,183 @@ def create_index_for_user():
         aod = str_to_datetime(data['as-of-time'])
 
     # get index
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
-    questions = db.session.query(Question).join((IndexSubComponent, Question.index_sub_components)).join(IndexComponent)
-    questions = questions.filter(IndexComponent.index_name == idx.name)
-    answers = {}
-    found_at_least_one = False
-    # questions now holds all the questions defined
-    # map questions by name and create null answer for each question
-    for question in questions:
-        if question.name not in answers:
-            answers[question.name] = None
-            # get the latest answer for this question and user
-            lanswers = db.session.query(Answer).filter(Answer.user_id == user.id).filter(Answer.time_received <= aod)
-            lanswer = lanswers.filter(Answer.question == question).order_by(Answer.time_received.desc()).limit(1).first()
-            if lanswer:
-                found_at_least_one = True
-                answers[question.name] = lanswer
+    # explain=1 returns the rules that fired with the result
+    trace = [] if request.args.get('explain', type=int, default=0) else None
+    res = score_user(user, idx, aod, trace, shadow=True)
+    db.session.commit()
 
-    if not found_at_least_one:
-        # no answers in db
-        logging.warning("Generating Result with no answers")
+    rresult = ResultView.render(res)
+    if trace is not None:
+        rresult['attributes']['explain'] = trace
+    rresults = {'count': 1, 'data': [rresult]}
+    return jsonify(rresults), 201
 
-    ret_answers = {k: getattr(v, "answer") if v else '' for k, v in answers.items()}
 
-    bdate = user.birth_date
-    # calculate score
-    # add birthdate to answers
-    ret_answers['BirthDate'] = bdate.strftime("%Y-%m-%d")
+# save answers and score them in one request
+# answers in POST data, the new Result is returned
+@app.route('/users/answers/score', methods=['POST'])
+@jwt_required()
+def score_answers_for_user():
+    logging.info("handling request to %s", request.url)
+    logging.info("in score_answers_for_user[POST]")
+    # truncate to second precision
+    trecv = datetime.utcnow().replace(microsecond=0)
+
+    # authorize user, will abort if auth fails
+    user = check_user(('viuser',))
+
+    answers = posted_answers()
+
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
+    # saved directly, also with the write-behind buffer, the Result links to the saved answers
+    saved = save_answers(user, idx, answers, trecv, rescore=False)
+    # the answers just saved are not read back, only the current answers to the other questions
+    latest = {question_name: None for question_name in idx.questions}
+    latest.update((answer.question_name, answer)
+                  for answer in latest_answer_snapshot(user, [qname for qname in idx.questions if qname not in answers]))
+    latest.update((answer.question_name, answer) for answer in saved if answer.question_name in latest)
+    res = score_answers(user, idx, trecv, latest, shadow=True)
+    db.session.commit()
+
+    rresults = {'count': 1, 'data': [ResultView.render(res)]}
+    return jsonify(rresults), 201
+
+
+# score answers without saving anything
+# answers in POST data, merge - score them over the current answers of the user
+@app.route('/users/results/preview', methods=['POST'])
+@jwt_required()
+def preview_index_for_user():
+    logging.info("handling request to %s", request.url)
+    logging.info("in preview_index_for_user[POST]")
+    trecv = datetime.utcnow().replace(microsecond=0)
+
+    # authenticate user
+    user = check_user(('viuser',))
+
+    answers = posted_answers()
+    merge = bool(request.get_json().get('merge'))
+
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
+    ret_answers = {question_name: '' for question_name in idx.questions}
+    if merge:
+        ret_answers.update((answer.question_name, answer.answer) for answer in latest_answer_snapshot(user, list(idx.questions)))
+    ret_answers.update((question_name, answer) for question_name, answer in answers.items() if question_name in ret_answers)
+    # as scoring_answers
+    ret_answers['BirthDate'] = user.birth_date.strftime("%Y-%m-%d")
     ret_answers['Gender'] = user.gender
     score = VICalculator.vi_points(ret_answers)
 
-    # create the result linked to index
-    logging.info("create_index_for_user: creating Result for %s", user.email)
-    res = Result(time_generated=aod, user=user, points=score['INDEX'],
-                 maxforanswered=score['MAXFORANSWERED'], index=idx)
-
-    # link answer objects to result
-    logging.info("create_index_for_user: Updating Answers - linking to Result for %s", user.email)
-    for answer in answers.values():
-        if answer:
-            res.answers.append(answer)
-            answer.results.append(res)
-
-    # create and link index components
-    logging.info("create_index_for_user: Saving Result Components for %s", user.email)
-    for icname, icscore in score['COMPONENTS'].items():
-        ic = ResultComponent(points=icscore['POINTS'],
-                             maxforanswered=icscore['MAXFORANSWERED'], result=res, indexcomponent_name=icname)
-        res.result_components.append(ic)
-        for scname, scscore in icscore['COMPONENTS'].items():
-            rsc = ResultSubComponent(points=scscore['POINTS'],
-                                     maxforanswered=scscore['MAXFORANSWERED'], result_component=ic,
-                                     indexsubcomponent_name=scname)
-            ic.result_sub_components.append(rsc)
-
-    db.session.add(res)
+    rscores = {'count': 1, 'data': [ScoreView.render(score, idx, trecv, VICalculator.RULES_VERSION)]}
+    return jsonify(rscores)
+
+
+# calc the score history of a user
+# a new result at each time an answer changed, from the whole answer history in one pass
+# filters in POST data - from-time, to-time
+@app.route('/users/results/backfill', methods=['POST'])
+@jwt_required()
+def backfill_results_for_user():
+    logging.info("handling request to %s", request.url)
+    logging.info("in backfill_results_for_user[POST]")
+    trecv = datetime.utcnow().replace(microsecond=0)
+
+    # authenticate user
+    user = check_user(('viuser',))
+
+    data = None
+    if request.is_json:
+        data = request.get_json()
+    data = data or {}
+    fromt = str_to_datetime(data.get('from-time'))
+    tot = str_to_datetime(data.get('to-time')) or trecv
+
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
+    answers = db.session.query(Answer).filter(Answer.user_id == user.id).filter(Answer.question_name.in_(idx.questions.keys()))
+    answers = answers.filter(Answer.time_received <= tot).order_by(Answer.time_received, Answer.id).all()
+    if not fromt or fromt < archive_horizon():
+        # snapshots from before the archive horizon need the archived answers too
+        archived = db.session.query(AnswerArchive).filter(AnswerArchive.user_id == user.id)
+        archived = archived.filter(AnswerArchive.question_name.in_(idx.questions.keys())).filter(AnswerArchive.time_received <= tot).all()
+        if archived:
+            answers = sorted(answers + archived, key=lambda answer: (answer.time_received, answer.id))
+    # times already scored with the current rules are not scored again
+    existing = db.session.query(Result.time_generated).filter(Result.user_id == user.id).filter(Result.index_name == idx.name)
+    existing = {t for t, in existing.filter(Result.rules_version == VICalculator.RULES_VERSION)}
+
+    scored = []
+    previous = {}
+    for aod, snapshot, changed in answer_sweep(answers, list(idx.questions)):
+        # only the modules reading the changed questions are rescored from one time to the next
+        cards = VICalculator.rescoreCards(scoring_answers(user, snapshot), changed, previous)
+        previous = {card.plan.name: card for card in cards}
+        if (fromt and aod < fromt) or aod in existing:
+            continue
+        scored.append((aod, snapshot, VICalculator.results(cards)))
+    # all the Result trees in one batch
+    results = new_results(user, idx, scored) if scored else []
+    logging.info("backfill_results_for_user: %d Results from %d Answers for %s", len(results), len(answers), user.email)
     db.session.commit()
 
-    rresults = {'count': 1, 'data': [ResultView.render(res)]}
+    rresults = {'count': len(results), 'data': [ResultView.render(r) for r in results]}
     return jsonify(rresults), 201
 
 
+# points change for every alternative answer to the questions of the index
+# filters as url parameters - as-of-time
+@app.route('/users/sensitivity', methods=['GET'])
+@jwt_required()
+def sensitivity_for_user():
+    logging.info("handling request to %s", request.url)
+    logging.info("in sensitivity_for_user[GET]")
+    trecv = datetime.utcnow().replace(microsecond=0)
+
+    # authenticate user
+    user = check_user(('viuser',))
+
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
+    aod = request.args.get('as-of-time', type=str_to_datetime, default=trecv)
+    answers = latest_answers(user, idx, aod)
+    deltas = VICalculator.sensitivity(scoring_answers(user, answers), answers.keys())
+
+    ret_deltas = []
+    for question_name, qdeltas in deltas.items():
+        answer = answers[question_name]
+        ret_deltas.append({'type': 'Sensitivity',
+                           'attributes': {'question': question_name,
+                                          'answer': answer.answer if answer else None,
+                                          'deltas': qdeltas,
+                                          'maxdelta': max(qdeltas.values(), default=0)
+                                          },
+                           'relationships': {
+                               'answer': "/answers/{0}".format(answer.id) if answer else None
+                               }
+                           })
+    # biggest wins first
+    ret_deltas.sort(key=lambda d: d['attributes']['maxdelta'], reverse=True)
+    return jsonify({'count': len(ret_deltas), 'data': ret_deltas})
+
+
 #
 # recommendation methods
 #
@@ -796,12 +1379,13 @@ def get_recommendations_for_result(component_name):
     trecv = datetime.utcnow().replace(microsecond=0)
     recommendations = []
 
-    idx = db.session.query(Index).get(app.config['INDEX'])
+    idx = indexmodel.load(db.session, app.config['INDEX'])
     if not idx:
         raise VI404Exception("No Index with the specified id was found.")
 
     results = db.session.query(Result).filter(Result.user_id == user.id).filter(Result.index_name == idx.name)
-    results = results.filter(Result.time_generated <= trecv).order_by(Result.time_generated.desc()).limit(1)
+    # a rescored result has the same time generated as the one it was rescored from
+    results = results.filter(Result.time_generated <= trecv).order_by(Result.time_generated.desc(), Result.id.desc()).limit(1)
     result = results.first()
     if not result:
         # user has no results
@@ -814,7 +1398,7 @@ def get_recommendations_for_result(component_name):
     # We pick the three worst and provide recommendations for those
 
     # get specified component
-    components = db.session.query(ResultComponent).options(joinedload(ResultComponent.index_component), joinedload(ResultComponent.result_sub_components))
+    components = db.session.query(ResultComponent).options(joinedload(ResultComponent.result_sub_components))
     components = components.filter(ResultComponent.result_id == result.id)
     components = components.filter(ResultComponent.indexcomponent_name == component_name)
     component = components.one_or_none()
@@ -823,7 +1407,7 @@ def get_recommendations_for_result(component_name):
         logging.error("in recommendations - invalid category specified, %s", component_name)
         raise VI404Exception("Invalid category specified, %s" % component_name)
 
-    aratio = component.maxforanswered / component.index_component.maxpoints
+    aratio = component.maxforanswered / idx.component_maxpoints(component.indexcomponent_name)
     logging.info("get_recommendations: found component %s with aratio %f for %s", component.indexcomponent_name, aratio, user.email)
     if aratio < .5:
         # answer more questions
@@ -835,19 +1419,17 @@ def get_recommendations_for_result(component_name):
     # look at the subcomponents
     # order them by % of maxforanswered points ascending
     # grab worst 3
-    subs = db.session.query(ResultSubComponent).join(IndexSubComponent)
-    subs = subs.filter(ResultSubComponent.resultcomponent_id == component.id)
-    # non empty recommendation
-    subs = subs.filter(IndexSubComponent.recommendation != '')
-    # some questions answered
-    subs = subs.filter(ResultSubComponent.maxforanswered > 0)
-    subs = subs.order_by(cast(ResultSubComponent.points, db.Float) / cast(ResultSubComponent.maxforanswered, db.Float))
-    subs = subs.limit(3)
+    # rows or packed in the result, loaded with the component either way
+    subs = packedscores.sub_components(component, result)
+    # non empty recommendation, some questions answered
+    subs = [sub for sub in subs if sub.indexsubcomponent_name in idx.sub_components and
+            idx.sub_components[sub.indexsubcomponent_name].recommendation and sub.maxforanswered > 0]
+    subs = sorted(subs, key=lambda sub: float(sub.points) / float(sub.maxforanswered))[:3]
     for sub in subs:
         logging.info("get_recommendations: adding recommendation for %s", sub.indexsubcomponent_name)
         recommendations.append({'type': 'Recommendation',
                                 'component': component_name,
-                                'text': sub.index_sub_component.recommendation})
+                                'text': idx.sub_components[sub.indexsubcomponent_name].recommendation})
 
     return jsonify({'count': len(recommendations), 'data': recommendations})
 
@@ -904,7 +1486,7 @@ def get_result_answers(result_id):
     logging.info("handling request to %s", request.url)
     logging.info("in get_result_answers[GET]")
     user = check_user(('viuser',))
-    result = db.session.query(Result).options(joinedload(Result.answers)).get(result_id)
+    result = db.session.query(Result).get(result_id)
     if not result:
         # no result with this id
         raise VI404Exception("No Result with specified id.")
@@ -913,7 +1495,8 @@ def get_result_answers(result_id):
         # resource exists but is not owned by, and therefor enot viewable by, user
         raise VI403Exception("User does not have permission.")
 
-    ranswers = {'count': len(result.answers), 'data': [AnswerView.render(a) for a in result.answers]}
+    answers = result_answers(result)
+    ranswers = {'count': len(answers), 'data': [AnswerView.render(a) for a in answers]}
     return jsonify(ranswers)
 
 
@@ -921,6 +1504,14 @@ def get_result_answers(result_id):
 # statistics methods
 #
 
+def latest_result_id():
+    # id of the latest Result of each User, correlated. A rescored result has the same time generated as the one it
+    # was rescored from and a higher id, so old and new rules are not both counted.
+    latest = aliased(Result)
+    latest_ids = db.session.query(latest.id).filter(latest.user_id == User.id).correlate(User)
+    return latest_ids.order_by(latest.time_generated.desc(), latest.id.desc()).limit(1).scalar_subquery()
+
+
 # provide average vi for certain criteria
 # age, gender, location, component
 # noinspection PyTypeChecker
@@ -934,6 +1525,11 @@ def get_statistics():
     # authenticate user
     check_user(('viuser',))
 
+    # get index
+    idx = indexmodel.load(db.session, app.config['INDEX'])
+    if not idx:
+        raise VI404Exception("No Index with the specified id was found.")
+
     agerange = request.args.get('agerange')
     gender = request.args.get('gender')
 
@@ -946,23 +1542,23 @@ def get_statistics():
         dplus = td - timedelta(days=int(ages[0]) * 365)
         dminus = td - timedelta(days=int(ages[1]) * 365)
         vgs = vgs.filter(User.birth_date.between(dminus, dplus))
-    vg = vgs.filter(Result.time_generated == db.session.query(func.max(Result.time_generated)).filter(Result.user_id == User.id).correlate(User)).first()
+    vg = vgs.filter(Result.id == latest_result_id()).first()
     if vg:
         result = {
             'type': 'Result',
             'attributes': {
                 'maxforanswered': vg[1],
-                'maxpoints': 1000,
-                'name': 'Vitality Index',
+                'maxpoints': idx.maxpoints,
+                'name': idx.name,
                 'points': vg[0],
                 'time_generated': trecv.strftime("%Y-%m-%d-%H-%M-%S"),
                 'result_components': []
             }
         }
 
-        vgs = db.session.query(IndexComponent.name,
+        vgs = db.session.query(ResultComponent.indexcomponent_name,
                                func.avg(ResultComponent.points),
-                               func.avg(ResultComponent.maxforanswered)).join(Result).join(User).join(IndexComponent).group_by(IndexComponent.name)
+                               func.avg(ResultComponent.maxforanswered)).join(Result).join(User).group_by(ResultComponent.indexcomponent_name)
         if agerange:
             # age range is string like "x-y"
             ages = agerange.split('-')
@@ -973,13 +1569,14 @@ def get_statistics():
         if gender:
             vgs = vgs.filter(User.gender == gender)
 
-        vgs = vgs.filter(Result.time_generated == db.session.query(func.max(Result.time_generated)).filter(Result.user_id == User.id).correlate(User))
+        vgs = vgs.filter(Result.id == latest_result_id())
 
         for vg in vgs:
             rc = {
                 'type': 'ResultComponent',
                 'attributes': {
                     'maxforanswered': vg[2],
+                    'maxpoints': idx.component_maxpoints(vg[0]),
                     'name': vg[0],
                     'points': vg[1]
                 }
@@ -991,6 +1588,33 @@ def get_statistics():
         return jsonify({'count': 0, 'data': []})
 
 
+# score cache counters for this process
+@app.route('/statistics/score-cache', methods=['GET'])
+@jwt_required()
+def get_score_cache_statistics():
+    logging.info("handling request to %s", request.url)
+    logging.info("in get_score_cache_statistics[GET]")
+    # authenticate user
+    check_user(('vivendor',))
+
+    stats = {'type': 'ScoreCache', 'attributes': VICalculator.cache.stats()}
+    return jsonify({'count': 1, 'data': [stats]})
+
+
+# shadow scoring comparison counters for this process
+@app.route('/statistics/shadow-scoring', methods=['GET'])
+@jwt_required()
+def get_shadow_scoring_statistics():
+    logging.info("handling request to %s", request.url)
+    logging.info("in get_shadow_scoring_statistics[GET]")
+    # authenticate user
+    check_user(('vivendor',))
+
+    stats = {'type': 'ShadowScoring', 'attributes': VICalculator.shadow.stats()}
+    stats['attributes']['candidate'] = app.config['SHADOW_SCORER']
+    return jsonify({'count': 1, 'data': [stats]})
+
+
 # get answer
 @app.route('/answers/<int:answer_id>', methods=['GET'])
 @jwt_required()
@@ -998,7 +1622,8 @@ def get_answer(answer_id):
     logging.info("handling request to %s", request.url)
     logging.info("in get_answer[GET]")
     user = check_user(('viuser',))
-    answer = db.session.query(Answer).get(answer_id)
+    # archived answers can still be read
+    answer = db.session.query(Answer).get(answer_id) or db.session.query(AnswerArchive).get(answer_id)
     if not answer:
         # no answer with this id
         raise VI404Exception("No Answer with specified id.")
@@ -1018,7 +1643,7 @@ def get_answer_results(answer_id):
     logging.info("handling request to %s", request.url)
     logging.info("in get_answer_results[GET]")
     user = check_user(('viuser',))
-    answer = db.session.query(Answer).options(joinedload(Answer.results)).get(answer_id)
+    answer = db.session.query(Answer).options(joinedload(Answer.results), joinedload(Answer.linked_results)).get(answer_id)
     if not answer:
         # no answer with this id
         raise VI404Exception("No Answer with specified id.")
@@ -1027,7 +1652,9 @@ def get_answer_results(answer_id):
         # resource exists but is not owned by, and therefore not viewable by, user
         raise VI403Exception("User does not have permission.")
 
-    rresults = {'count': len(answer.results), 'data': [ResultView.render(r) for r in answer.results]}
+    # results scored from an answer set with the answer and results from before answer sets linked to it
+    results = sorted(set(answer.results).union(answer.linked_results), key=lambda r: (r.time_generated, r.id), reverse=True)
+    rresults = {'count': len(results), 'data': [ResultView.render(r) for r in results]}
     return jsonify(rresults)
 
 
@@ -18,10 +18,29 @@ class Config(object):
     cstring = parse.quote_plus(cstring)
     SQLALCHEMY_DATABASE_URI = "mssql+pyodbc:///?odbc_connect=%s" % cstring
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # send executemany parameter sets in one round trip (pyodbc)
+    SQLALCHEMY_ENGINE_OPTIONS = {'fast_executemany': True}
     # itsdangerous, jwt
     JWT_SECRET_KEY = os.environ.get('JWTKEY') or 'you-will-never-guess'
     IDANGEROUSKEY = os.environ.get('ITSDANGEROUSKEY') or 'you-will-never-guess'
 
     INDEX = os.environ.get('INDEX') or "Vitality Index"
+    # create a new Result each time answers are saved
+    RESCORE_ON_SAVE = (os.environ.get('RESCORE_ON_SAVE') or 'False') in ('1', 'True', 'true')
+    # number of scored answer sets kept in each process
+    SCORE_CACHE_SIZE = int(os.environ.get('SCORE_CACHE_SIZE') or 4096)
+    # candidate scorer (a VICalculator.Candidates name or module:function) compared with the production score
+    # on this fraction of POST /users/results requests
+    SHADOW_SCORER = os.environ.get('SHADOW_SCORER') or None
+    SHADOW_RATE = float(os.environ.get('SHADOW_RATE') or 0.0)
+    # redis url of the answer write-behind buffer, answers are saved by flush_answers.py, see answerbuffer.py
+    ANSWER_BUFFER_URL = os.environ.get('ANSWER_BUFFER_URL') or None
+    # store the subcomponent scores of new Results packed in the Result row, see packedscores.py
+    RESULT_PACKED_SCORES = (os.environ.get('RESULT_PACKED_SCORES') or 'False') in ('1', 'True', 'true')
+    # answers superseded longer ago than this are moved to answer_archive, see vidb/archive_answers.py
+    ANSWER_RETENTION_DAYS = int(os.environ.get('ANSWER_RETENTION_DAYS') or 730)
+    # answers per page of GET /users/answers, default and largest
+    ANSWER_PAGE_SIZE = int(os.environ.get('ANSWER_PAGE_SIZE') or 100)
+    ANSWER_PAGE_MAX = int(os.environ.get('ANSWER_PAGE_MAX') or 1000)
     WWWHOST = '0.0.0.0'
     WWWPORT = 5000
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Flush the answers buffered in Redis by POST /users/answers (ANSWER_BUFFER_URL set) to the answer table.
+
+Takes up to --batch-size users with buffered answers at a time and saves their answers in one transaction, the same
+way POST /users/answers saves them without the buffer. Answers buffered in the same request keep their shared time
+received. If the transaction fails the users are queued again with the same answers. Several flushers can run, each
+user is leased to one of them while it is flushed.
+
+python flush_answers.py [--batch-size 100] [--interval 1.0] [--once]
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import time
+from typing import List, Union
+from app import app, db, save_answers
+from vidb.models import User
+import answerbuffer
+import indexmodel
+
+
+def flush(client, idx: indexmodel.IndexModel, batch_size: int, owner: str) -> int:
+    """
+    Save the buffered answers of one batch of users, the number of answers saved.
+    """
+    # a user leased to another flusher is still being flushed, its done queues the user again if needed
+    user_ids = [user_id for user_id in answerbuffer.ready(client, batch_size) if answerbuffer.lease(client, user_id, owner)]
+    if not user_ids:
+        return 0
+    count = 0
+    try:
+        for user_id in user_ids:
+            user = db.session.query(User).get(user_id)
+            pending = answerbuffer.take(client, user_id)
+            if not user:
+                # deleted since
+                continue
+            by_time = {}
+            for question_name, answer in pending.items():
+                by_time.setdefault(answer.time_received, {})[question_name] = answer.answer
+            for trecv in sorted(by_time.keys()):
+                save_answers(user, idx, by_time[trecv], trecv)
+            count += len(pending)
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        logging.error("flush: failed to save the answers of users %s - %r", user_ids, error)
+        answerbuffer.retry(client, user_ids)
+        raise
+    for user_id in user_ids:
+        answerbuffer.done(client, user_id)
+    return count
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(description="Save the answers buffered in Redis to the database.")
+    parser.add_argument('--batch-size', type=int, default=100, help="users per transaction, default 100")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds to wait when nothing is buffered, default 1")
+    parser.add_argument('--once', action='store_true', help="flush what is buffered and stop")
+    args = parser.parse_args(argv)
+
+    if not app.config['ANSWER_BUFFER_URL']:
+        print("ANSWER_BUFFER_URL is not set")
+        return 1
+    client = answerbuffer.connect(app.config['ANSWER_BUFFER_URL'])
+    owner = "%s:%d" % (socket.gethostname(), os.getpid())
+    with app.app_context():
+        idx = indexmodel.load(db.session, app.config['INDEX'])
+        if not idx:
+            print("no index %s" % app.config['INDEX'])
+            return 1
+        recovered = answerbuffer.recover(client)
+        if recovered:
+            print("retrying the interrupted flush of %d users" % len(recovered))
+
+        total = 0
+        while True:
+            start = time.time()
+            try:
+                count = flush(client, idx, args.batch_size, owner)
+            except Exception:
+                # logged and queued again by flush
+                count = None
+            finally:
+                db.session.remove()
+            if count:
+                total += count
+                logging.info("flush_answers: %d answers in %.2fs, total %d", count, time.time() - start, total)
+            elif args.once:
+                break
+            else:
+                time.sleep(args.interval)
+    print("done: %d answers" % total)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
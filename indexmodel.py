@@ -0,0 +1,135 @@
+"""
+Immutable in-memory copy of the Index, IndexComponent and IndexSubComponent rows.
+
+The index structure only changes when the database is reloaded so it is read once per process and shared by the
+scorer, the views and the statistics code instead of being queried and lazy loaded on every request.
+Components and subcomponents are keyed by the vicalc component names (the names Results are stored under).
+The names of all the questions are kept the same way to validate submitted answers.
+"""
+import logging
+import threading
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple, Tuple, Union
+from sqlalchemy.orm import joinedload
+from vidb.models import Question, Index, IndexComponent, IndexSubComponent
+from vicalc import VICalculator
+
+
+class SubComponentModel(NamedTuple):
+    name: str
+    maxpoints: int
+    info: Union[str, None]
+    recommendation: Union[str, None]
+    component_name: str
+    questions: Tuple[str, ...]
+
+
+class ComponentModel(NamedTuple):
+    name: str
+    maxpoints: int
+    info: Union[str, None]
+    recommendation: Union[str, None]
+    sub_components: Tuple[str, ...]
+
+
+class IndexModel(NamedTuple):
+    name: str
+    maxpoints: int
+    components: Mapping[str, ComponentModel]
+    sub_components: Mapping[str, SubComponentModel]
+    # question name -> names of the components reading it, one entry per subcomponent
+    questions: Mapping[str, Tuple[str, ...]]
+
+    def component_maxpoints(self, name: str) -> Union[int, None]:
+        component = self.components.get(name)
+        return component.maxpoints if component else None
+
+    def sub_component_maxpoints(self, name: str) -> Union[int, None]:
+        sub_component = self.sub_components.get(name)
+        return sub_component.maxpoints if sub_component else None
+
+
+def build(idx: Index) -> IndexModel:
+    components = {}
+    sub_components = {}
+    questions = {}
+    for ic in idx.index_components:
+        components[ic.name] = ComponentModel(ic.name, ic.maxpoints, ic.info, ic.recommendation,
+                                             tuple(isc.name for isc in ic.index_sub_components))
+        for isc in ic.index_sub_components:
+            qnames = tuple(q.name for q in isc.questions)
+            sub_components[isc.name] = SubComponentModel(isc.name, isc.maxpoints, isc.info, isc.recommendation,
+                                                         ic.name, qnames)
+            for qname in qnames:
+                questions[qname] = questions.get(qname, ()) + (ic.name,)
+    model = IndexModel(idx.name, idx.maxpoints, MappingProxyType(components), MappingProxyType(sub_components),
+                       MappingProxyType(dict(sorted(questions.items()))))
+    check(model)
+    return model
+
+
+def check(model: IndexModel) -> None:
+    # the db rows and the vicalc plans should agree, log the differences rather than fail
+    if model.maxpoints != VICalculator.MAXPOINTS:
+        logging.warning("index model: %s maxpoints %s, vicalc %s", model.name, model.maxpoints, VICalculator.MAXPOINTS)
+    for constituent in VICalculator.ConstituentModules:
+        plan = constituent.PLAN
+        if model.component_maxpoints(plan.name) != plan.maxpoints:
+            logging.warning("index model: %s maxpoints %s, vicalc %s", plan.name, model.component_maxpoints(plan.name), plan.maxpoints)
+        for cname, cmaxpoints in zip(plan.components, plan.component_maxpoints):
+            if model.sub_component_maxpoints(cname) != cmaxpoints:
+                logging.warning("index model: %s maxpoints %s, vicalc %s", cname, model.sub_component_maxpoints(cname), cmaxpoints)
+
+
+models = {}
+# names of all the questions, see known_questions
+catalog = set()
+lock = threading.Lock()
+
+
+def load(session, name: str) -> Union[IndexModel, None]:
+    """
+    The model of the named index, read from the database with session the first time it is asked for.
+    None if there is no such index, a missing index is not remembered.
+    """
+    model = models.get(name)
+    if model is None:
+        with lock:
+            model = models.get(name)
+            if model is None:
+                idx = session.query(Index).options(
+                    joinedload(Index.index_components).joinedload(IndexComponent.index_sub_components).joinedload(IndexSubComponent.questions)
+                ).filter(Index.name == name).one_or_none()
+                if idx is None:
+                    return None
+                model = build(idx)
+                models[name] = model
+                logging.info("index model: loaded %s, %d components, %d subcomponents, %d questions", name,
+                             len(model.components), len(model.sub_components), len(model.questions))
+    return model
+
+
+def known_questions(session, question_names: Iterable[str]) -> bool:
+    """
+    True if there is a Question for each of the names. Checked against the question catalog read once per process,
+    names it does not have are looked up in the database (and added) in case the question was added since.
+    """
+    names = set(question_names)
+    # the catalog is only read under the lock, other requests add to it and reset clears it
+    with lock:
+        unknown = names.difference(catalog)
+    if unknown:
+        with lock:
+            if not catalog:
+                catalog.update(name for name, in session.query(Question.name))
+            else:
+                catalog.update(name for name, in session.query(Question.name).filter(Question.name.in_(list(unknown))))
+            unknown.difference_update(catalog)
+    return not unknown
+
+
+def reset() -> None:
+    # forget the loaded models, the next load reads the database again
+    with lock:
+        models.clear()
+        catalog.clear()
@@ -0,0 +1,123 @@
+"""
+Packed storage of the subcomponent scores of a Result.
+
+With RESULT_PACKED_SCORES set the points and the maxforanswered of every subcomponent of a Result are written to
+Result.sub_component_scores as two vectors of little-endian 32 bit ints instead of as ResultSubComponent rows.
+The vectors are in the order of a layout, the components and their subcomponents sorted by name. A layout is
+identified by a hash of it, stored in Result.structure_version, and saved in index_structure the first time it is
+used so Results stay readable after the index structure changes.
+sub_components expands a packed Result back into the ResultSubComponent shape when it is read.
+"""
+import hashlib
+import json
+import struct
+import threading
+from typing import Dict, List, NamedTuple, Tuple, Union
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from vidb.models import IndexStructure, Result, ResultComponent, ResultSubComponent
+import indexmodel
+
+
+class Layout(NamedTuple):
+    version: str
+    index_name: str
+    # (component name, subcomponent names) in packed order
+    components: Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+class PackedSubComponent(NamedTuple):
+    # a ResultSubComponent expanded from a packed Result, there is no row
+    id: None
+    points: int
+    maxforanswered: int
+    resultcomponent_id: int
+    indexsubcomponent_name: str
+
+
+layouts = {}
+# versions known to be in index_structure
+saved = set()
+lock = threading.Lock()
+
+
+def layout(idx: indexmodel.IndexModel) -> Layout:
+    components = tuple((name, tuple(sorted(idx.components[name].sub_components))) for name in sorted(idx.components))
+    version = hashlib.sha1(json.dumps(components).encode()).hexdigest()[:16]
+    with lock:
+        return layouts.setdefault(version, Layout(version, idx.name, components))
+
+
+def load(session, version: str) -> Layout:
+    """
+    The layout of a structure version, read from index_structure the first time it is asked for.
+    """
+    found = layouts.get(version)
+    if found is None:
+        structure = session.query(IndexStructure).get(version)
+        components = tuple((name, tuple(sub_names)) for name, sub_names in json.loads(structure.layout))
+        with lock:
+            found = layouts.setdefault(version, Layout(version, structure.index_name, components))
+            saved.add(version)
+    return found
+
+
+def register(conn, packing: Layout) -> None:
+    # save the layout the first time results are packed with it, another process may be saving it too
+    if packing.version in saved:
+        return
+    table = IndexStructure.__table__
+    if conn.execute(select(table.c.version).where(table.c.version == packing.version)).first() is None:
+        try:
+            with conn.begin_nested():
+                conn.execute(table.insert(), {'version': packing.version, 'index_name': packing.index_name,
+                                              'layout': json.dumps(packing.components)})
+        except IntegrityError:
+            pass
+    with lock:
+        saved.add(packing.version)
+
+
+def pack(packing: Layout, score: Dict[str, object]) -> Union[bytes, None]:
+    """
+    The points then the maxforanswered of the subcomponents of a VICalculator score in layout order.
+    None if the score does not have exactly the subcomponents of the layout, it is stored with rows then.
+    """
+    components = score['COMPONENTS']
+    if len(components) != len(packing.components):
+        return None
+    points = []
+    maxforanswered = []
+    for name, sub_names in packing.components:
+        scores = components.get(name, {}).get('COMPONENTS', {})
+        if len(scores) != len(sub_names) or any(sub_name not in scores for sub_name in sub_names):
+            return None
+        points.extend(scores[sub_name]['POINTS'] for sub_name in sub_names)
+        maxforanswered.extend(scores[sub_name]['MAXFORANSWERED'] for sub_name in sub_names)
+    return struct.pack('<%di' % (2 * len(points)), *points, *maxforanswered)
+
+
+def unpack(packing: Layout, data: bytes) -> Dict[str, List[Tuple[str, int, int]]]:
+    # component name -> (subcomponent name, points, maxforanswered) in layout order
+    values = struct.unpack('<%di' % (len(data) // 4), data)
+    count = len(values) // 2
+    expanded = {}
+    pos = 0
+    for name, sub_names in packing.components:
+        expanded[name] = [(sub_name, values[pos + i], values[count + pos + i]) for i, sub_name in enumerate(sub_names)]
+        pos += len(sub_names)
+    return expanded
+
+
+def sub_components(rc: ResultComponent, result: Union[Result, None] = None) -> List[Union[ResultSubComponent, PackedSubComponent]]:
+    """
+    The subcomponent scores of a result component, its ResultSubComponent rows or expanded from the packed Result.
+    """
+    if result is None:
+        result = rc.result
+    if result.sub_component_scores is None:
+        return list(rc.result_sub_components)
+    packing = load(object_session(result), result.structure_version)
+    return [PackedSubComponent(None, points, maxforanswered, rc.id, sub_name)
+            for sub_name, points, maxforanswered in unpack(packing, result.sub_component_scores).get(rc.indexcomponent_name, ())]
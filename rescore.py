@@ -0,0 +1,208 @@
+"""
+Bulk rescoring of Results after a vicalc scoring rule change.
+
+Streams users in chunks, rebuilds the as-of answer snapshot for each Result that was calculated with other rules
+(or for every user at --as-of), scores the snapshots in a process pool and bulk inserts the new
+Result/ResultComponent/ResultSubComponent trees tagged with VICalculator.RULES_VERSION with resultwriter.
+Progress is checkpointed after every committed chunk so an interrupted run resumes where it stopped, a run with other
+rules or another --as-of starts over. The checkpoint is removed when the run completes.
+
+python rescore.py [--as-of 2021-10-01-00-00-00] [--chunk-size 200] [--workers 4] [--checkpoint rescore.checkpoint.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+from sqlalchemy import create_engine, literal, or_
+from sqlalchemy.orm import sessionmaker
+from config import Config
+from vidb.models import User, Answer, AnswerArchive, Result
+from vicalc import VICalculator
+import indexmodel
+import packedscores
+import resultwriter
+
+
+ScoreType = Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]
+
+
+def score_snapshot(answers: Dict[str, str]) -> Union[ScoreType, None]:
+    # runs in the worker processes
+    try:
+        return VICalculator.vi_points(answers)
+    except Exception as error:
+        logging.error("score_snapshot: failed to score answers - %r", error)
+        return None
+
+
+def load_checkpoint(path: str, aod: Union[datetime, None]) -> Dict[str, Union[int, float, str, None]]:
+    as_of = aod.strftime("%Y-%m-%d-%H-%M-%S") if aod else None
+    checkpoint = {'rules_version': VICalculator.RULES_VERSION, 'as_of': as_of, 'last_user_id': 0, 'users': 0,
+                  'results': 0, 'failed': 0, 'elapsed': 0.0}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get('rules_version') == VICalculator.RULES_VERSION and saved.get('as_of') == as_of:
+            checkpoint.update(saved)
+        else:
+            logging.warning("load_checkpoint: ignoring checkpoint for rules version %s as of %s",
+                            saved.get('rules_version'), saved.get('as_of'))
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Union[int, float, str, None]]) -> None:
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def snapshot_times(session, idx: indexmodel.IndexModel, user_ids: List[int], aod: Union[datetime, None]) -> Dict[int, List[datetime]]:
+    """
+    As-of times to score for each user, the time of each Result calculated with other rules or aod.
+    Times that already have a Result with the current rules are skipped so reruns do not duplicate Results.
+    """
+    times = {user_id: set() for user_id in user_ids}
+    if aod:
+        for user_id in user_ids:
+            times[user_id].add(aod)
+    else:
+        results = session.query(Result.user_id, Result.time_generated).filter(Result.index_name == idx.name)
+        results = results.filter(Result.user_id.in_(user_ids))
+        results = results.filter(or_(Result.rules_version.is_(None), Result.rules_version != VICalculator.RULES_VERSION))
+        for user_id, time_generated in results:
+            times[user_id].add(time_generated)
+
+    done = session.query(Result.user_id, Result.time_generated).filter(Result.index_name == idx.name)
+    done = done.filter(Result.user_id.in_(user_ids)).filter(Result.rules_version == VICalculator.RULES_VERSION)
+    for user_id, time_generated in done:
+        times[user_id].discard(time_generated)
+    return {user_id: sorted(utimes) for user_id, utimes in times.items() if utimes}
+
+
+def snapshots(session, idx: indexmodel.IndexModel, questions: List[str], users: List[User],
+              times: Dict[int, List[datetime]]) -> List[Tuple[int, datetime, Dict[str, Answer], Dict[str, str]]]:
+    """
+    Latest answer for each question as of each time, one pass over the answers (and archived answers) of the chunk.
+    """
+    answers = session.query(Answer.id, Answer.user_id, Answer.question_name, Answer.answer, Answer.time_received,
+                            literal(False).label('archived'))
+    answers = answers.filter(Answer.user_id.in_(list(times.keys()))).filter(Answer.question_name.in_(questions))
+    archived = session.query(AnswerArchive.id, AnswerArchive.user_id, AnswerArchive.question_name, AnswerArchive.answer,
+                             AnswerArchive.time_received, literal(True).label('archived'))
+    archived = archived.filter(AnswerArchive.user_id.in_(list(times.keys()))).filter(AnswerArchive.question_name.in_(questions))
+    by_user = {}
+    for answer in sorted(answers.all() + archived.all(), key=lambda answer: (answer.user_id, answer.time_received, answer.id)):
+        by_user.setdefault(answer.user_id, []).append(answer)
+
+    ret = []
+    for user in users:
+        if user.id not in times:
+            continue
+        uanswers = by_user.get(user.id, [])
+        current = {}
+        pos = 0
+        for aod in times[user.id]:
+            # answers are in time order, advance to the as-of time
+            while pos < len(uanswers) and uanswers[pos].time_received <= aod:
+                current[uanswers[pos].question_name] = uanswers[pos]
+                pos += 1
+            ret_answers = {qname: '' for qname in questions}
+            ret_answers.update({qname: answer.answer for qname, answer in current.items()})
+            ret_answers['BirthDate'] = user.birth_date.strftime("%Y-%m-%d")
+            ret_answers['Gender'] = user.gender
+            ret.append((user.id, aod, dict(current), ret_answers))
+    return ret
+
+
+def rescore(session, executor: ProcessPoolExecutor, workers: int, idx: indexmodel.IndexModel, aod: Union[datetime, None],
+            chunk_size: int, checkpoint_path: str) -> Dict[str, Union[int, float, str, None]]:
+    checkpoint = load_checkpoint(checkpoint_path, aod)
+    if checkpoint['last_user_id']:
+        print("resuming rescore for rules version %s after user %d" % (checkpoint['rules_version'], checkpoint['last_user_id']))
+
+    questions = list(idx.questions)
+    packing = packedscores.layout(idx) if Config.RESULT_PACKED_SCORES else None
+
+    while True:
+        start = time.time()
+        users = session.query(User).filter(User.id > checkpoint['last_user_id']).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            break
+
+        times = snapshot_times(session, idx, [user.id for user in users], aod)
+        chunk = snapshots(session, idx, questions, users, times)
+        scores = executor.map(score_snapshot, [ret_answers for user_id, uaod, answers, ret_answers in chunk],
+                              chunksize=max(1, len(chunk) // (4 * workers)))
+        scored = []
+        failed = 0
+        for (user_id, uaod, answers, ret_answers), score in zip(chunk, scores):
+            if score is None:
+                failed += 1
+                logging.error("rescore: no score for user %d as of %s", user_id, uaod)
+                continue
+            scored.append((user_id, uaod, answers, score))
+        if scored:
+            # archived answers can not be linked
+            resultwriter.insert_results(session.connection(), [
+                resultwriter.ResultRow(user_id, idx.name, uaod, score,
+                                       tuple(answer.id for answer in answers.values() if not answer.archived))
+                for user_id, uaod, answers, score in scored], packing)
+        session.commit()
+
+        elapsed = time.time() - start
+        checkpoint['last_user_id'] = users[-1].id
+        checkpoint['users'] += len(users)
+        checkpoint['results'] += len(scored)
+        checkpoint['failed'] += failed
+        checkpoint['elapsed'] += elapsed
+        save_checkpoint(checkpoint_path, checkpoint)
+        print("users %d-%d: %d results (%d failed) in %.2fs, %.1f results/s - total %d users, %d results, %.1f results/s" %
+              (users[0].id, users[-1].id, len(scored), failed, elapsed, len(scored) / elapsed if elapsed else 0.0,
+               checkpoint['users'], checkpoint['results'],
+               checkpoint['results'] / checkpoint['elapsed'] if checkpoint['elapsed'] else 0.0))
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        # done, the next run starts over
+        os.remove(checkpoint_path)
+    return checkpoint
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rescore Results with the current vicalc scoring rules.")
+    parser.add_argument('--as-of', help="score every user as of this time (%%Y-%%m-%%d-%%H-%%M-%%S) instead of "
+                                        "rescoring the existing Results")
+    parser.add_argument('--chunk-size', type=int, default=200, help="users per chunk, default 200")
+    parser.add_argument('--workers', type=int, default=None, help="scoring processes, default one per cpu")
+    parser.add_argument('--checkpoint', default='rescore.checkpoint.json', help="checkpoint file used to resume")
+    parser.add_argument('--database-uri', default=Config.SQLALCHEMY_DATABASE_URI, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOGLEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+    aod = datetime.strptime(args.as_of, "%Y-%m-%d-%H-%M-%S") if args.as_of else None
+
+    options = {'fast_executemany': True} if args.database_uri.startswith('mssql+pyodbc') else {}
+    engine = create_engine(args.database_uri, **options)
+    session = sessionmaker(bind=engine)()
+    idx = indexmodel.load(session, Config.INDEX)
+    if not idx:
+        print("no index %s" % Config.INDEX)
+        return 1
+
+    print("rescoring %s with rules version %s" % (idx.name, VICalculator.RULES_VERSION))
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        checkpoint = rescore(session, executor, workers, idx, aod, args.chunk_size, args.checkpoint)
+    print("done: %d users, %d results, %d failed in %.1fs" % (checkpoint['users'], checkpoint['results'],
+                                                            checkpoint['failed'], checkpoint['elapsed']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Bulk writer for Result trees.
+
+A Result and its ResultComponents and ResultSubComponents are inserted with a few statements per batch of Results
+instead of one INSERT (and identity fetch) per row through the unit of work. The rows are the ones the ORM would write.
+A Result references the AnswerSet of the answers it was scored from, sets are content addressed by a digest of the
+answer ids so consecutive Results from the same answers share one set and only a new set has its answers written.
+Where the dialect can, SQL Server with OUTPUT and PostgreSQL with RETURNING, the generated ids come back
+from multi-row INSERT ... VALUES statements, otherwise the rows are inserted with executemany and the ids read back
+by their keys. The rows without children are always inserted with executemany, fast_executemany on pyodbc.
+With a packed scores layout the subcomponent scores go in the Result row instead, see packedscores.py.
+"""
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Union
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from vidb.models import AnswerSet, Result, ResultComponent, ResultSubComponent, answer_set_answer, answer_set_digest
+from vicalc import VICalculator
+import packedscores
+
+# SQL Server takes at most 2100 parameters in a statement
+MAX_PARAMETERS = 2000
+
+
+class ResultRow(NamedTuple):
+    user_id: int
+    index_name: str
+    time_generated: datetime
+    # VICalculator score dict
+    score: Dict[str, object]
+    answer_ids: Tuple[int, ...]
+
+
+def batches(rows: List, size: int) -> Iterator[List]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def returning(conn) -> bool:
+    # multi-row VALUES with OUTPUT/RETURNING, SQL Server enables multi-row VALUES for the server version once connected
+    return bool(conn.dialect.full_returning and conn.dialect.supports_multivalues_insert)
+
+
+def insert_returning(conn, table, values: List[dict], keys: Tuple[str, ...]) -> Dict[tuple, int]:
+    # id of each inserted row by its key column values, the keys are unique in values
+    ids = {}
+    for batch in batches(values, max(1, MAX_PARAMETERS // len(values[0]))):
+        stmt = table.insert().values(batch).returning(table.c.id, *[table.c[key] for key in keys])
+        ids.update((tuple(row[1:]), row[0]) for row in conn.execute(stmt))
+    return ids
+
+
+def answer_set_ids(conn, digests: List[str]) -> Dict[str, int]:
+    table = AnswerSet.__table__
+    ids = {}
+    for batch in batches(digests, MAX_PARAMETERS):
+        ids.update((digest, sid) for sid, digest in conn.execute(select(table.c.id, table.c.digest).where(table.c.digest.in_(batch))))
+    return ids
+
+
+def insert_answer_sets(conn, rows: List[ResultRow]) -> List[int]:
+    """
+    The AnswerSet id of each row, the sets that are not saved yet are inserted with their answers.
+    """
+    table = AnswerSet.__table__
+    digests = [answer_set_digest(row.user_id, row.answer_ids) for row in rows]
+    ids = answer_set_ids(conn, list(set(digests)))
+    for attempt in range(2):
+        new = {digest: row for digest, row in zip(digests, rows) if digest not in ids}
+        if not new:
+            break
+        try:
+            with conn.begin_nested():
+                values = [{'digest': digest, 'user_id': row.user_id} for digest, row in new.items()]
+                if returning(conn):
+                    new_ids = {digest: sid for (digest,), sid in insert_returning(conn, table, values, ('digest',)).items()}
+                else:
+                    conn.execute(table.insert(), values)
+                    new_ids = answer_set_ids(conn, list(new.keys()))
+                members = [{'answer_set_id': new_ids[digest], 'answer_id': answer_id}
+                           for digest, row in new.items() for answer_id in row.answer_ids]
+                if members:
+                    conn.execute(answer_set_answer.insert(), members)
+            ids.update(new_ids)
+            break
+        except IntegrityError:
+            # a concurrent request saved one of the sets first, take theirs and save the rest again
+            if attempt:
+                raise
+            ids.update(answer_set_ids(conn, list(new.keys())))
+    return [ids[digest] for digest in digests]
+
+
+def insert_result_rows(conn, rows: List[ResultRow], sids: List[int], packed: List[Union[bytes, None]],
+                       packing: Union[packedscores.Layout, None]) -> List[int]:
+    table = Result.__table__
+    values = [{'time_generated': row.time_generated, 'points': row.score['INDEX'],
+               'maxforanswered': row.score['MAXFORANSWERED'], 'rules_version': VICalculator.RULES_VERSION,
+               'structure_version': packing.version if data is not None else None, 'sub_component_scores': data,
+               'user_id': row.user_id, 'index_name': row.index_name, 'answer_set_id': sid}
+              for row, sid, data in zip(rows, sids, packed)]
+    keys = [(row.user_id, row.time_generated) for row in rows]
+    if len(keys) == 1 or len(set(keys)) < len(keys):
+        # the id comes back with each single row insert
+        return [conn.execute(table.insert(), rvalues).inserted_primary_key[0] for rvalues in values]
+    if returning(conn):
+        ids = insert_returning(conn, table, values, ('user_id', 'time_generated'))
+    else:
+        # read back by (user_id, time_generated), the ids after before can also be another writer's
+        before = conn.execute(select(func.max(table.c.id))).scalar() or 0
+        conn.execute(table.insert(), values)
+        ids = {}
+        for batch in batches(keys, MAX_PARAMETERS // 2):
+            readback = select(table.c.id, table.c.user_id, table.c.time_generated).where(table.c.id > before)
+            readback = readback.where(table.c.user_id.in_(list({user_id for user_id, time_generated in batch})))
+            readback = readback.where(table.c.time_generated.in_(list({time_generated for user_id, time_generated in batch})))
+            for rid, user_id, time_generated in conn.execute(readback):
+                key = (user_id, time_generated)
+                if key in ids and ids[key] != rid:
+                    # the components could go to the other writer's Result, roll back instead
+                    raise RuntimeError("Results for user %d at %s were written concurrently" % key)
+                ids[key] = rid
+    return [ids[key] for key in keys]
+
+
+def insert_results(conn, rows: List[ResultRow], packing: Union[packedscores.Layout, None] = None) -> List[int]:
+    """
+    Insert the Result tree of each row with conn, in the caller's transaction. Returns the Result ids in row order.
+    With packing the subcomponent scores are packed into the Results in its layout.
+    """
+    if not rows:
+        return []
+    packed = [None] * len(rows)
+    if packing:
+        packedscores.register(conn, packing)
+        packed = [packedscores.pack(packing, row.score) for row in rows]
+    rids = insert_result_rows(conn, rows, insert_answer_sets(conn, rows), packed, packing)
+
+    table = ResultComponent.__table__
+    values = [{'points': icscore['POINTS'], 'maxforanswered': icscore['MAXFORANSWERED'], 'result_id': rid,
+               'indexcomponent_name': icname}
+              for row, rid in zip(rows, rids) for icname, icscore in row.score['COMPONENTS'].items()]
+    if returning(conn):
+        rcids = insert_returning(conn, table, values, ('result_id', 'indexcomponent_name'))
+    else:
+        conn.execute(table.insert(), values)
+        rcids = {}
+        for batch in batches(rids, MAX_PARAMETERS):
+            readback = select(table.c.id, table.c.result_id, table.c.indexcomponent_name).where(table.c.result_id.in_(batch))
+            rcids.update(((rid, icname), rcid) for rcid, rid, icname in conn.execute(readback))
+
+    sub_values = [{'points': scscore['POINTS'], 'maxforanswered': scscore['MAXFORANSWERED'],
+                   'resultcomponent_id': rcids[(rid, icname)], 'indexsubcomponent_name': scname}
+                  for row, rid, data in zip(rows, rids, packed) if data is None
+                  for icname, icscore in row.score['COMPONENTS'].items()
+                  for scname, scscore in icscore['COMPONENTS'].items()]
+    if sub_values:
+        conn.execute(ResultSubComponent.__table__.insert(), sub_values)
+    return rids
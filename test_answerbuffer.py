@@ -0,0 +1,183 @@
+"""
+Tests of the flush cycle of the write-behind answer buffer and of scoring with buffered answers.
+
+Run against fakeredis, or the Redis at ANSWER_BUFFER_TEST_URL, and skipped without either. The scoring tests use
+an in-memory sqlite database.
+python -m unittest test_answerbuffer
+"""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+import answerbuffer
+
+
+def make_client():
+    if os.environ.get('ANSWER_BUFFER_TEST_URL'):
+        import redis
+        client = redis.Redis.from_url(os.environ['ANSWER_BUFFER_TEST_URL'], decode_responses=True)
+        client.flushdb()
+        return client
+    try:
+        import fakeredis
+    except ImportError:
+        raise unittest.SkipTest("needs fakeredis or ANSWER_BUFFER_TEST_URL")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+class FlushTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = make_client()
+
+    def test_flush(self):
+        answerbuffer.add(self.client, 1, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        answerbuffer.add(self.client, 1, {'q1': 'b', 'q2': 'c'}, datetime(2021, 1, 1, 11))
+        self.assertEqual(answerbuffer.ready(self.client, 10), [1])
+        taken = answerbuffer.take(self.client, 1)
+        self.assertEqual({q: a.answer for q, a in taken.items()}, {'q1': 'b', 'q2': 'c'})
+        answerbuffer.done(self.client, 1)
+        self.assertEqual(answerbuffer.pending(self.client, 1), {})
+        self.assertEqual(answerbuffer.ready(self.client, 10), [])
+
+    def test_add_during_flush(self):
+        answerbuffer.add(self.client, 1, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        answerbuffer.ready(self.client, 10)
+        answerbuffer.take(self.client, 1)
+        answerbuffer.add(self.client, 1, {'q2': 'b'}, datetime(2021, 1, 1, 11))
+        answerbuffer.done(self.client, 1)
+        self.assertEqual(answerbuffer.ready(self.client, 10), [1])
+        self.assertEqual(set(answerbuffer.take(self.client, 1)), {'q2'})
+
+    def test_add_after_failed_flush(self):
+        answerbuffer.add(self.client, 1, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        answerbuffer.ready(self.client, 10)
+        answerbuffer.take(self.client, 1)
+        answerbuffer.retry(self.client, [1])
+        # the user is queued already, add does not queue it again
+        answerbuffer.add(self.client, 1, {'q2': 'b'}, datetime(2021, 1, 1, 11))
+
+        self.assertEqual(answerbuffer.ready(self.client, 10), [1])
+        # the failed flush's answers are taken again first
+        self.assertEqual(set(answerbuffer.take(self.client, 1)), {'q1'})
+        answerbuffer.done(self.client, 1)
+        self.assertEqual(set(answerbuffer.pending(self.client, 1)), {'q2'})
+
+        # the newer answers are flushed next
+        self.assertEqual(answerbuffer.ready(self.client, 10), [1])
+        self.assertEqual(set(answerbuffer.take(self.client, 1)), {'q2'})
+        answerbuffer.done(self.client, 1)
+        self.assertEqual(answerbuffer.pending(self.client, 1), {})
+        self.assertEqual(answerbuffer.ready(self.client, 10), [])
+
+    def test_lease(self):
+        answerbuffer.add(self.client, 1, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        self.assertTrue(answerbuffer.lease(self.client, 1, 'one'))
+        self.assertFalse(answerbuffer.lease(self.client, 1, 'two'))
+        answerbuffer.take(self.client, 1)
+        answerbuffer.retry(self.client, [1])
+        # the failed flush gave the user up
+        self.assertTrue(answerbuffer.lease(self.client, 1, 'two'))
+        answerbuffer.take(self.client, 1)
+        answerbuffer.done(self.client, 1)
+        self.assertTrue(answerbuffer.lease(self.client, 1, 'one'))
+
+    def test_recover_skips_running_flush(self):
+        answerbuffer.add(self.client, 2, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        answerbuffer.ready(self.client, 10)
+        answerbuffer.lease(self.client, 2, 'one')
+        answerbuffer.take(self.client, 2)
+        # another flusher starting up leaves the flush alone
+        self.assertEqual(answerbuffer.recover(self.client), [])
+        self.assertEqual(answerbuffer.ready(self.client, 10), [])
+
+    def test_recover(self):
+        answerbuffer.add(self.client, 2, {'q1': 'a'}, datetime(2021, 1, 1, 10))
+        answerbuffer.ready(self.client, 10)
+        answerbuffer.lease(self.client, 2, 'one')
+        answerbuffer.take(self.client, 2)
+        # the flusher stopped before done or retry and its lease expired
+        self.client.delete(answerbuffer.LEASE % 2)
+        self.assertEqual(answerbuffer.recover(self.client), [2])
+        self.assertEqual(answerbuffer.ready(self.client, 10), [2])
+        self.assertEqual(set(answerbuffer.take(self.client, 2)), {'q1'})
+
+
+def make_app():
+    """
+    The service on an in-memory sqlite database with the index built from the vicalc plans.
+    """
+    os.environ.setdefault('LOGDIR', os.path.join(tempfile.gettempdir(), 'vitest', ''))
+    from sqlalchemy.pool import StaticPool
+    import app as service
+    from vicalc import VICalculator
+    from vidb.models import Base, Index, IndexComponent, IndexSubComponent, Question, User
+
+    service.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    service.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'check_same_thread': False}, 'poolclass': StaticPool}
+    context = service.app.app_context()
+    context.push()
+    db = service.db
+    Base.metadata.drop_all(db.engine)
+    Base.metadata.create_all(db.engine)
+    service.indexmodel.reset()
+    idx = Index(name=service.app.config['INDEX'], maxpoints=VICalculator.MAXPOINTS)
+    db.session.add(idx)
+    for constituent in VICalculator.ConstituentModules:
+        ic = IndexComponent(name=constituent.name(), maxpoints=constituent.PLAN.maxpoints, index=idx)
+        iscs = [IndexSubComponent(name=cname, maxpoints=cmaxpoints, index_component=ic)
+                for cname, cmaxpoints in zip(constituent.PLAN.components, constituent.PLAN.component_maxpoints)]
+        for i, qname in enumerate(constituent.inputs()):
+            if qname in VICalculator.VolatileInputs:
+                continue
+            question = db.session.query(Question).get(qname) or Question(name=qname)
+            question.index_sub_components.append(iscs[i % len(iscs)])
+            db.session.add(question)
+    user = User(email='a@b.c', pword='x', first_name='A', birth_date=date(1970, 5, 5), gender='Female', postal_code='1')
+    db.session.add(user)
+    db.session.commit()
+    return service, context, user
+
+
+class PendingScoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = make_client()
+        self.service, self.context, self.user = make_app()
+        self.service.app.config['ANSWER_BUFFER_URL'] = 'redis://answerbuffer-test'
+        answerbuffer.clients['redis://answerbuffer-test'] = self.client
+        self.service.VICalculator.cache.clear()
+
+    def tearDown(self):
+        answerbuffer.clients.pop('redis://answerbuffer-test', None)
+        self.service.app.config['ANSWER_BUFFER_URL'] = None
+        self.service.db.session.remove()
+        self.context.pop()
+
+    def full_score(self, aod):
+        service = self.service
+        idx = service.indexmodel.load(service.db.session, service.app.config['INDEX'])
+        answers = service.scoring_answers(self.user, service.latest_answers(self.user, idx, aod))
+        return service.VICalculator.vi_points_uncached(answers)['INDEX']
+
+    def test_score_with_pending_answer_to_new_question(self):
+        service = self.service
+        idx = service.indexmodel.load(service.db.session, service.app.config['INDEX'])
+        trecv = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=1)
+        service.save_answers(self.user, idx, {'Height': '70', 'Weight': '160'}, trecv)
+        service.score_user(self.user, idx, trecv)
+        service.db.session.commit()
+
+        # a question the previous Result had no answer to, still in the buffer
+        answerbuffer.add(self.client, self.user.id, {'OverallHealth': '1'}, trecv + timedelta(seconds=1))
+        aod = trecv + timedelta(seconds=2)
+        result = service.score_user(self.user, idx, aod)
+        service.db.session.commit()
+        self.assertEqual(result.points, self.full_score(aod))
+        # a full score of the same answers is not served stale cards from the cache
+        self.assertEqual(service.VICalculator.vi_points(service.scoring_answers(self.user, service.latest_answers(self.user, idx, aod)))['INDEX'],
+                         self.full_score(aod))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Tests of the bulk Result writer on sqlite, which has no RETURNING for SQLAlchemy 1.4 so the ids are read back.
+
+Concurrent writers are simulated by inserting rows on the same connection right after one of the writer's statements.
+python -m unittest test_resultwriter
+"""
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, event, select
+from vidb.models import AnswerSet, Base, Result, ResultComponent, ResultSubComponent, answer_set_answer, answer_set_digest
+import resultwriter
+
+
+def make_engine():
+    engine = create_engine('sqlite://')
+
+    # let SQLAlchemy emit BEGIN itself so savepoints work with pysqlite
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def score(points: int) -> dict:
+    # a VICalculator score dict with one component and one subcomponent
+    return {'INDEX': points, 'MAXFORANSWERED': 100, 'COMPONENTS': {
+        'C1': {'POINTS': points, 'MAXFORANSWERED': 100, 'COMPONENTS': {'S1': {'POINTS': points, 'MAXFORANSWERED': 100}}}}}
+
+
+def row(user_id: int, hour: int, points: int, answer_ids=(1, 2)) -> resultwriter.ResultRow:
+    return resultwriter.ResultRow(user_id, 'VI', datetime(2021, 1, 1, hour), score(points), tuple(answer_ids))
+
+
+def after_first(engine, prefix: str, sql: str, params: tuple):
+    """
+    Run sql on the connection once, right after the first statement starting with prefix, like a concurrent writer.
+    """
+    state = {'done': False}
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def concurrent(conn, cursor, statement, parameters, context, executemany):
+        if not state['done'] and statement.lstrip().startswith(prefix):
+            state['done'] = True
+            conn.connection.cursor().execute(sql, params)
+
+    return concurrent
+
+
+class ReadbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = make_engine()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_ids_read_back(self):
+        rows = [row(1, 10, 11), row(2, 10, 12), row(1, 11, 13)]
+        with self.engine.begin() as conn:
+            self.assertFalse(resultwriter.returning(conn))
+            rids = resultwriter.insert_results(conn, rows)
+            for r, rid in zip(rows, rids):
+                result = conn.execute(select(Result.__table__).where(Result.__table__.c.id == rid)).one()
+                self.assertEqual((result.user_id, result.time_generated, result.points), (r.user_id, r.time_generated, r.score['INDEX']))
+                rc = conn.execute(select(ResultComponent.__table__).where(ResultComponent.__table__.c.result_id == rid)).one()
+                self.assertEqual(rc.points, r.score['INDEX'])
+                rsc = conn.execute(select(ResultSubComponent.__table__).where(ResultSubComponent.__table__.c.resultcomponent_id == rc.id)).one()
+                self.assertEqual(rsc.points, r.score['INDEX'])
+
+    def test_other_writers_results_not_matched(self):
+        # another writer's Result for the same user at another time, inserted between the batch insert and the readback
+        after_first(self.engine, 'INSERT INTO result', "INSERT INTO result (time_generated, points, maxforanswered, user_id, "
+                    "index_name) VALUES (?, 99, 100, 1, 'VI')", ('2021-01-01 12:00:00.000000',))
+        rows = [row(1, 10, 11), row(2, 10, 12)]
+        with self.engine.begin() as conn:
+            rids = resultwriter.insert_results(conn, rows)
+            points = dict(conn.execute(select(Result.__table__.c.id, Result.__table__.c.points)).all())
+        self.assertEqual([points[rid] for rid in rids], [11, 12])
+        self.assertEqual(len(points), 3)
+
+    def test_same_key_written_concurrently(self):
+        after_first(self.engine, 'INSERT INTO result', "INSERT INTO result (time_generated, points, maxforanswered, user_id, "
+                    "index_name) VALUES (?, 99, 100, 1, 'VI')", ('2021-01-01 10:00:00.000000',))
+        with self.assertRaises(RuntimeError):
+            with self.engine.begin() as conn:
+                resultwriter.insert_results(conn, [row(1, 10, 11), row(2, 10, 12)])
+        with self.engine.connect() as conn:
+            # rolled back, nothing of the batch was saved
+            self.assertEqual(conn.execute(select(Result.__table__.c.points)).scalars().all(), [])
+
+
+class AnswerSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = make_engine()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_sets_shared(self):
+        with self.engine.begin() as conn:
+            rids = resultwriter.insert_results(conn, [row(1, 10, 11), row(1, 11, 12), row(1, 12, 13, (1, 3))])
+            rids += resultwriter.insert_results(conn, [row(1, 13, 14, (2, 1))])
+            sids = [conn.execute(select(Result.__table__.c.answer_set_id).where(Result.__table__.c.id == rid)).scalar()
+                    for rid in rids]
+            members = conn.execute(select(answer_set_answer.c.answer_set_id, answer_set_answer.c.answer_id)).all()
+        self.assertEqual(sids[0], sids[1])
+        self.assertEqual(sids[0], sids[3])
+        self.assertNotEqual(sids[0], sids[2])
+        self.assertEqual(sorted(members), sorted([(sids[0], 1), (sids[0], 2), (sids[2], 1), (sids[2], 3)]))
+
+    def test_set_saved_concurrently(self):
+        # another writer saves the same set after this one looked it up
+        digest = answer_set_digest(1, (1, 2))
+        after_first(self.engine, 'SELECT answer_set.id', "INSERT INTO answer_set (digest, user_id) VALUES (?, 1)", (digest,))
+        with self.engine.begin() as conn:
+            rids = resultwriter.insert_results(conn, [row(1, 10, 11), row(1, 11, 12, (1, 3))])
+            sets = dict(conn.execute(select(AnswerSet.__table__.c.digest, AnswerSet.__table__.c.id)).all())
+            sids = [conn.execute(select(Result.__table__.c.answer_set_id).where(Result.__table__.c.id == rid)).scalar()
+                    for rid in rids]
+            members = conn.execute(select(answer_set_answer.c.answer_set_id, answer_set_answer.c.answer_id)).all()
+        self.assertEqual(len(sets), 2)
+        self.assertEqual(sids, [sets[digest], sets[answer_set_digest(1, (1, 3))]])
+        # the other writer's set gets its members from that writer, only the new set's are written here
+        self.assertEqual(sorted(members), [(sids[1], 1), (sids[1], 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
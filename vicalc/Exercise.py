@@ -1,6 +1,6 @@
 import logging
 from . import utilities
-from typing import Tuple, Dict, Union
+from typing import Dict, List, Tuple, Union
 
 """Calculate the Exercise VI score
 
@@ -78,160 +78,105 @@ def name() -> str:
 
 
 def inputs() -> Tuple[str, ...]:
-    return ('BirthDate', 'MinutesVigorousExercise', 'MinutesModerateExercise',
+    return ('BirthDate', 'MinutesPhysicalActivity', 'MinutesVigorousExercise', 'MinutesModerateExercise',
               'DaysPhysicalActivity', 'DaysResistanceExercise', 'SetsResistanceExercise', 'DaysFlexibilityExercise',
               'MinutesFlexibilityActivity', 'DaysBalanceAgilityExercise', 'MinutesBalanceAgilityActivity',
               'AverageHoursNonSedentary')
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
-    logging.debug("calculating score for %s" % name())
-
-    results = {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0,
-               'COMPONENTS': {'EXERCISE': {'POINTS': 0, 'MAXPOINTS': MaxExerciseActivityPointsAvailable, 'MAXFORANSWERED': 0},
-                              'DAYSEX': {'POINTS': 0, 'MAXPOINTS': DaysPhysicalActivityPoints.max(), 'MAXFORANSWERED': 0},
-                              'DAYSRES': {'POINTS': 0, 'MAXPOINTS': DaysResistanceExercisePoints.max(), 'MAXFORANSWERED': 0},
-                              'SETSRES': {'POINTS': 0, 'MAXPOINTS': SetsResistanceExercisePoints.max(), 'MAXFORANSWERED': 0},
-                              'DAYSFLEX': {'POINTS': 0, 'MAXPOINTS': DaysFlexibilityExercisePoints.max(), 'MAXFORANSWERED': 0},
-                              'MINSFLEX': {'POINTS': 0, 'MAXPOINTS': MinutesFlexibilityActivityPoints.max(), 'MAXFORANSWERED': 0},
-                              'DAYSBAL': {'POINTS': 0, 'MAXPOINTS': MinutesFlexibilityActivityPoints.max(), 'MAXFORANSWERED': 0},
-                              'MINSBAL': {'POINTS': 0, 'MAXPOINTS': MinutesBalanceAndAgilityActivityPoints.max(), 'MAXFORANSWERED': 0},
-                              'HOURSNONSED': {'POINTS': 0, 'MAXPOINTS': NonSedentaryBehaviorPoints.max(), 'MAXFORANSWERED': 0}}}
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['EXERCISE']['MAXPOINTS']
+PLAN = utilities.ScoringPlan(name(), (('EXERCISE', MaxExerciseActivityPointsAvailable),
+                                       ('DAYSEX', DaysPhysicalActivityPoints.max()),
+                                       ('DAYSRES', DaysResistanceExercisePoints.max()),
+                                       ('SETSRES', SetsResistanceExercisePoints.max()),
+                                       ('DAYSFLEX', DaysFlexibilityExercisePoints.max()),
+                                       ('MINSFLEX', MinutesFlexibilityActivityPoints.max()),
+                                       ('DAYSBAL', MinutesFlexibilityActivityPoints.max()),
+                                       ('MINSBAL', MinutesBalanceAndAgilityActivityPoints.max()),
+                                       ('HOURSNONSED', NonSedentaryBehaviorPoints.max())))
+EXERCISE = PLAN.slots['EXERCISE']
+
+RULES = utilities.compileRules(PLAN, (('DAYSEX', 'DaysPhysicalActivity', utilities.AnswerVector.asKey, DaysPhysicalActivityPoints),
+                                      ('DAYSRES', 'DaysResistanceExercise', utilities.AnswerVector.asKey, DaysResistanceExercisePoints),
+                                      ('SETSRES', 'SetsResistanceExercise', utilities.AnswerVector.asKey, SetsResistanceExercisePoints),
+                                      ('DAYSFLEX', 'DaysFlexibilityExercise', utilities.AnswerVector.asKey, DaysFlexibilityExercisePoints),
+                                      ('MINSFLEX', 'MinutesFlexibilityActivity', utilities.AnswerVector.asKey, MinutesFlexibilityActivityPoints),
+                                      ('DAYSBAL', 'DaysBalanceAgilityExercise', utilities.AnswerVector.asKey, MinutesFlexibilityActivityPoints),
+                                      ('MINSBAL', 'MinutesBalanceAgilityActivity', utilities.AnswerVector.asKey, MinutesBalanceAndAgilityActivityPoints),
+                                      ('HOURSNONSED', 'AverageHoursNonSedentary', utilities.AnswerVector.asKey, NonSedentaryBehaviorPoints)))
+
+# activity goals by age group
+# (vigorous, moderate, combined vigorous, combined moderate, use % moderate when it is the best partial level)
+ActivityGoalsUnderSixtyFive = (VIActivityGoalVigorousUnderSixtyfive, VIActivityGoalModerate,
+                               VIActivityGoalVigorousCombinedUnderSixtyFive, VIActivityGoalModerateCombinedUnderSixtyFive,
+                               False)
+ActivityGoalsSixtyFivePlus = (VIActivityGoalVigorousSixtyfivePlus, VIActivityGoalModerate,
+                              VIActivityGoalVigorousCombinedSixtyFivePlus, VIActivityGoalModerateCombinedSixtyFivePlus,
+                              True)
+
+
+def activityPoints(age: int, minutesVigorousActivity: int, minutesModerateActivity: int) -> int:
+    vigorousGoal, moderateGoal, combinedVigorousGoal, combinedModerateGoal, useModerate = \
+        ActivityGoalsUnderSixtyFive if age < ActivityLevelAgeThreshold else ActivityGoalsSixtyFivePlus
+
+    # Determine if any of the VI Ultimate GOAL LEVEL thresholds have been met
+    if minutesVigorousActivity >= vigorousGoal:
+        # Vigorous GOAL Met, return full points
+        logging.debug("vigorous goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
+        return MaxExerciseActivityPointsAvailable
+    if minutesModerateActivity >= moderateGoal:
+        # Moderate GOAL Met, return full points
+        logging.debug("moderate goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
+        return MaxExerciseActivityPointsAvailable
+    if minutesVigorousActivity >= combinedVigorousGoal and minutesModerateActivity >= combinedModerateGoal:
+        # Combined GOAL Met, return full points
+        logging.debug("combined goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
+        return MaxExerciseActivityPointsAvailable
+
+    # no ULTIMATE GOAL level was achieved, determine highest level reached
+    percentVigorousMet = minutesVigorousActivity / vigorousGoal
+    percentModerateMet = minutesModerateActivity / moderateGoal
+    percentCombinedVigorousMet = minutesVigorousActivity / combinedVigorousGoal
+    percentCombinedModerateMet = minutesModerateActivity / combinedModerateGoal
+    percentCombinedMet = (percentCombinedVigorousMet + percentCombinedModerateMet) / 2
+
+    if percentVigorousMet > percentModerateMet:
+        if percentVigorousMet > percentCombinedMet:
+            expts = round(MaxExerciseActivityPointsAvailable * percentVigorousMet)
+            logging.debug("no goal met, using %% vigorous, score increased by %d", expts)
+            return expts
+    elif useModerate and percentModerateMet > percentCombinedMet:
+        expts = round(MaxExerciseActivityPointsAvailable * percentModerateMet)
+        logging.debug("no goal met, using %% moderate, score increased by %d", expts)
+        return expts
+    expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
+    logging.debug("no goal met, using %% combined, score increased by %d", expts)
+    return expts
+
+
+def domains() -> Dict[str, Tuple[str, ...]]:
+    # legal answers for the questions with a fixed set of answers
+    return utilities.ruleDomains(RULES)
+
+
+def score(answers: utilities.AnswerVector, trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> utilities.ScoreCard:
+    card = PLAN.card(trace)
+
     # answer should be int
-    minsExercised = utilities.strToInt(answers, 'MinutesPhysicalActivity')
+    minsExercised = answers.asInt('MinutesPhysicalActivity')
     if minsExercised:
-        results['COMPONENTS']['EXERCISE']['MAXFORANSWERED'] = results['COMPONENTS']['EXERCISE']['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS']['EXERCISE']['MAXFORANSWERED']
+        card.answered(EXERCISE)
 
         if minsExercised > 0:
-            bdate = utilities.strToDate(answers, 'BirthDate')
-            minutesVigorousActivity = utilities.strToInt(answers, 'MinutesVigorousExercise')
-            minutesModerateActivity = utilities.strToInt(answers, 'MinutesModerateExercise')
-            if bdate is not None and minutesVigorousActivity is not None and minutesModerateActivity is not None:
-                age = utilities.ageFromBirthDate(bdate)
-
-                # Determine if any of the VI Ultimate GOAL LEVEL thresholds have been met)
-                if age < ActivityLevelAgeThreshold:
-                    if minutesVigorousActivity >= VIActivityGoalVigorousUnderSixtyfive:
-                        # Vigorous GOAL Met, return full points
-                        logging.debug("vigorous goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    elif minutesModerateActivity >= VIActivityGoalModerate:
-                        # Moderate GOAL Met, return full points
-                        logging.debug("moderate goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    elif (minutesVigorousActivity >= VIActivityGoalVigorousCombinedUnderSixtyFive) and (
-                            minutesModerateActivity >= VIActivityGoalModerateCombinedUnderSixtyFive):
-                        # Combined GOAL Met, return full points
-                        logging.debug("combined goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    else:
-                        # no ULTIMATE GOAL level was achieved, determine highest level reached;
-                        percentVigorousMet = minutesVigorousActivity / VIActivityGoalVigorousUnderSixtyfive
-                        percentModerateMet = minutesModerateActivity / VIActivityGoalModerate
-                        percentCombinedVigorousMet = minutesVigorousActivity / VIActivityGoalVigorousCombinedUnderSixtyFive
-                        percentCombinedModerateMet = minutesModerateActivity / VIActivityGoalModerateCombinedUnderSixtyFive
-                        percentCombinedMet = (percentCombinedVigorousMet + percentCombinedModerateMet) / 2
-
-                        if percentVigorousMet > percentModerateMet:
-                            if percentVigorousMet > percentCombinedMet:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentVigorousMet)
-                                logging.debug("no goal met, using %% vigorous, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                            else:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
-                                logging.debug("no goal met, using %% combined, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                        else:
-                            if percentModerateMet > percentCombinedMet:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
-                                logging.debug("no goal met, using %% moderate, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                            else:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
-                                logging.debug("no goal met, using %% combined, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                else:
-                    if minutesVigorousActivity >= VIActivityGoalVigorousSixtyfivePlus:
-                        # Vigorous GOAL Met, return full points
-                        logging.debug("vigorous goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    elif minutesModerateActivity >= VIActivityGoalModerate:
-                        # Moderate GOAL Met, return full points
-                        logging.debug("moderate goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    elif (minutesVigorousActivity >= VIActivityGoalVigorousCombinedSixtyFivePlus) and (
-                            minutesModerateActivity >= VIActivityGoalModerateCombinedSixtyFivePlus):
-                        # Combined GOAL Met, return full points
-                        logging.debug("combined goal met, score increased by %d", MaxExerciseActivityPointsAvailable)
-                        results['COMPONENTS']['EXERCISE']['POINTS'] = MaxExerciseActivityPointsAvailable
-                        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                    else:
-                        # No ULTIMATE GOAL level was achieved, determine highest level reached;
-                        percentVigorousMet = minutesVigorousActivity / VIActivityGoalVigorousSixtyfivePlus
-                        percentModerateMet = minutesModerateActivity / VIActivityGoalModerate
-
-                        percentCombinedVigorousMet = minutesVigorousActivity / VIActivityGoalVigorousCombinedSixtyFivePlus
-                        percentCombinedModerateMet = minutesModerateActivity / VIActivityGoalModerateCombinedSixtyFivePlus
-                        percentCombinedMet = (percentCombinedVigorousMet + percentCombinedModerateMet) / 2
-
-                        if percentVigorousMet > percentModerateMet:
-                            if percentVigorousMet > percentCombinedMet:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentVigorousMet)
-                                logging.debug("no goal met, using %% vigorous, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                            else:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
-                                logging.debug("no goal met, using %% combined, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                        else:
-                            if percentModerateMet > percentCombinedMet:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentModerateMet)
-                                logging.debug("no goal met, using %% moderate, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-                            else:
-                                expts = round(MaxExerciseActivityPointsAvailable * percentCombinedMet)
-                                logging.debug("no goal met, using %% combined, score increased by %d", expts)
-                                results['COMPONENTS']['EXERCISE']['POINTS'] = expts
-                                results['POINTS'] = results['POINTS'] + results['COMPONENTS']['EXERCISE']['POINTS']
-
-    daysExercised = utilities.strToKey(answers, 'DaysPhysicalActivity')
-    results = utilities.subpts(daysExercised, 'DAYSEX', DaysPhysicalActivityPoints, results)
-
-    daysOfResistanceExercise = utilities.strToKey(answers, 'DaysResistanceExercise')
-    results = utilities.subpts(daysOfResistanceExercise, 'DAYSRES', DaysResistanceExercisePoints, results)
-
-    setsOfResistanceExercisePerDay = utilities.strToKey(answers, 'SetsResistanceExercise')
-    results = utilities.subpts(setsOfResistanceExercisePerDay, 'SETSRES', SetsResistanceExercisePoints, results)
-
-    daysOfFlexibilityExercise = utilities.strToKey(answers, 'DaysFlexibilityExercise')
-    results = utilities.subpts(daysOfFlexibilityExercise, 'DAYSFLEX', DaysFlexibilityExercisePoints, results)
-
-    minutesOfFlexibilityActivity = utilities.strToKey(answers, 'MinutesFlexibilityActivity')
-    results = utilities.subpts(minutesOfFlexibilityActivity, 'MINSFLEX', MinutesFlexibilityActivityPoints, results)
-
-    daysOfBalanceAndAgilityExercise = utilities.strToKey(answers, 'DaysBalanceAgilityExercise')
-    results = utilities.subpts(daysOfBalanceAndAgilityExercise, 'DAYSBAL', MinutesFlexibilityActivityPoints, results)
-
-    minutesOfBalanceAndAgilityActivity = utilities.strToKey(answers, 'MinutesBalanceAgilityActivity')
-    results = utilities.subpts(minutesOfBalanceAndAgilityActivity, 'MINSBAL', MinutesBalanceAndAgilityActivityPoints,
-                               results)
-
-    nonSedentaryHoursPerDay = utilities.strToKey(answers, 'AverageHoursNonSedentary')
-    results = utilities.subpts(nonSedentaryHoursPerDay, 'HOURSNONSED', NonSedentaryBehaviorPoints, results)
-
-    return results
+            age = answers.age()
+            minutesVigorousActivity = answers.asInt('MinutesVigorousExercise')
+            minutesModerateActivity = answers.asInt('MinutesModerateExercise')
+            if age is not None and minutesVigorousActivity is not None and minutesModerateActivity is not None:
+                card.award(EXERCISE, activityPoints(age, minutesVigorousActivity, minutesModerateActivity),
+                           'MinutesPhysicalActivity', minsExercised, 'activity goals')
+
+    return utilities.scoreRules(RULES, answers, card).tally()
+
+
+def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
+    logging.debug("calculating score for %s", name())
+    return score(utilities.answerVector(answers)).results()
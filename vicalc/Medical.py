@@ -1,6 +1,6 @@
 import logging
 from . import utilities
-from typing import Tuple, Dict, Union
+from typing import Dict, List, Tuple, Union
 
 
 """Calculate the Major Conditions VI score
@@ -138,7 +138,7 @@ def name() -> str:
 def inputs() -> Tuple[str, ...]:
     return ('BirthDate',
               'Height',
-              'Weight'
+              'Weight',
               'NumberOfConditions',
               'ConditionsManagedByDoctor',
               'ConditionsManagedByLifestyle',
@@ -154,118 +154,104 @@ def inputs() -> Tuple[str, ...]:
               'UsedTobaccoInPast6Months')
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
-    logging.debug("calculating score for %s" % name())
-
-    results = {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0,
-               'COMPONENTS': {'BMI': {'POINTS': 0, 'MAXPOINTS': BelowBMIThresholdAgeRange.max(), 'MAXFORANSWERED': 0},
-                              'MEDCONDS': {'POINTS': 0, 'MAXPOINTS': MaxStartingMajorConditionsPoints, 'MAXFORANSWERED': 0},
-                              'NUMMEDS': {'POINTS': 0, 'MAXPOINTS': NumberMedicationsPoints.max(), 'MAXFORANSWERED': 0},
-                              'SYS': {'POINTS': 0, 'MAXPOINTS': SystolicRange.max(), 'MAXFORANSWERED': 0},
-                              'DIA': {'POINTS': 0, 'MAXPOINTS': DiastolicRange.max(), 'MAXFORANSWERED': 0},
-                              'LDL': {'POINTS': 0, 'MAXPOINTS': LDLRange.max(), 'MAXFORANSWERED': 0},
-                              'HDL': {'POINTS': 0, 'MAXPOINTS': HDLRange.max(), 'MAXFORANSWERED': 0},
-                              'TRI': {'POINTS': 0, 'MAXPOINTS': TriRange.max(), 'MAXFORANSWERED': 0},
-                              'RHR': {'POINTS': 0, 'MAXPOINTS': RHRRange.max(), 'MAXFORANSWERED': 0},
-                              'TOBACCO7': {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0},
-                              'TOBACCO180': {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0}}}
-
-    bmi = None
-    bdate = utilities.strToDate(answers, 'BirthDate')
-    height = utilities.strToInt(answers, 'Height')
-    weight = utilities.strToInt(answers, 'Weight')
-    if bdate is not None and height is not None and weight is not None:
-        age = utilities.ageFromBirthDate(bdate)
+PLAN = utilities.ScoringPlan(name(), (('BMI', BelowBMIThresholdAgeRange.max()),
+                                       ('MEDCONDS', MaxStartingMajorConditionsPoints),
+                                       ('NUMMEDS', NumberMedicationsPoints.max()),
+                                       ('SYS', SystolicRange.max()),
+                                       ('DIA', DiastolicRange.max()),
+                                       ('LDL', LDLRange.max()),
+                                       ('HDL', HDLRange.max()),
+                                       ('TRI', TriRange.max()),
+                                       ('RHR', RHRRange.max()),
+                                       ('TOBACCO7', 0),
+                                       ('TOBACCO180', 0)))
+BMI = PLAN.slots['BMI']
+MEDCONDS = PLAN.slots['MEDCONDS']
+TOBACCO7 = PLAN.slots['TOBACCO7']
+TOBACCO180 = PLAN.slots['TOBACCO180']
+
+RULES = utilities.compileRules(PLAN, (('NUMMEDS', 'NumberMedications', utilities.AnswerVector.asKey, NumberMedicationsPoints),
+                                      ('SYS', 'SystolicBloodPressure', utilities.AnswerVector.asInt, SystolicRange),
+                                      ('DIA', 'DiastolicBloodPressure', utilities.AnswerVector.asInt, DiastolicRange),
+                                      ('LDL', 'LDLCholesterol', utilities.AnswerVector.asInt, LDLRange),
+                                      ('HDL', 'HDLCholesterol', utilities.AnswerVector.asInt, HDLRange),
+                                      ('TRI', 'Triglycerides', utilities.AnswerVector.asInt, TriRange),
+                                      ('RHR', 'RestingHeartRate', utilities.AnswerVector.asInt, RHRRange)))
+
+
+def domains() -> Dict[str, Tuple[str, ...]]:
+    # legal answers for the questions with a fixed set of answers
+    xdomains = utilities.ruleDomains(RULES)
+    xdomains['ConditionsAffectOnLife'] = tuple(AffectOnLifeFromConditionsPoints._points)
+    return xdomains
+
+
+def conditionsPoints(answers: utilities.AnswerVector, numberOfConditions: int) -> int:
+    pts = MaxStartingMajorConditionsPoints
+    if numberOfConditions > 0:
+        # they have at least one condition and we use the rest of the answers
+        # subtractor so no change to max and maxforanswered
+        pts = pts + (numberOfConditions * PointDecreasePerMajorCondition)
+
+        # add back if managed by lifestyle
+        managedByLifestyle = answers.asInt('ConditionsManagedByLifestyle')
+        if managedByLifestyle is not None:
+            pts = pts + (managedByLifestyle * PointIncreaseForMangingConditionsWithMedicationandLifestyle)
+
+        # add back if managed by Dr
+        managedByDr = answers.asInt('ConditionsManagedByDoctor')
+        if managedByDr is not None:
+            pts = pts + (managedByDr * PointIncreaseForDoctorTreatingCondition)
+
+        # subtractor so no change to max and maxforanswered
+        affectOnLife = answers.asKey('ConditionsAffectOnLife')
+        if affectOnLife is not None:
+            pts = pts + AffectOnLifeFromConditionsPoints.points(affectOnLife)
+    return pts
+
+
+def score(answers: utilities.AnswerVector, trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> utilities.ScoreCard:
+    card = PLAN.card(trace)
+
+    age = answers.age()
+    height = answers.asInt('Height')
+    weight = answers.asInt('Weight')
+    if age is not None and height is not None and weight is not None:
         bmi = (weight / (height * height)) * BMIConstant
         logging.debug('bmi = %f', bmi)
         if age <= BMIAgeThreshold:
-            results = utilities.subpts(bmi, 'BMI', BelowBMIThresholdAgeRange, results)
+            card.lookup(BMI, bmi, BelowBMIThresholdAgeRange, 'BMI')
         else:
-            results = utilities.subpts(bmi, 'BMI', AboveBMIThresholdAgeRange, results)
-    else:
-        # get max
-        results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['BMI']['MAXPOINTS']
-
-    logging.debug('starting medical conditions score at %d', MaxStartingMajorConditionsPoints)
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['MEDCONDS']['MAXPOINTS']
+            card.lookup(BMI, bmi, AboveBMIThresholdAgeRange, 'BMI')
 
-    numberOfConditions = utilities.strToInt(answers, 'NumberOfConditions')
+    numberOfConditions = answers.asInt('NumberOfConditions')
     if numberOfConditions is not None:
         # number of conditions is answered
-        results['COMPONENTS']['MEDCONDS']['MAXFORANSWERED'] = results['COMPONENTS']['MEDCONDS']['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS']['MEDCONDS']['MAXFORANSWERED']
-        results['COMPONENTS']['MEDCONDS']['POINTS'] = MaxStartingMajorConditionsPoints
-
-        #
-        if numberOfConditions > 0:
-            # they have at least one condition and we use the rest of the answers
-            # subtractor so no change to max and maxforanswered
-            results['COMPONENTS']['MEDCONDS']['POINTS'] = results['COMPONENTS']['MEDCONDS']['POINTS'] + \
-                                                          (numberOfConditions * PointDecreasePerMajorCondition)
-
-            # add back if managed by lifestyle
-            managedByLifestyle = utilities.strToInt(answers, 'ConditionsManagedByLifestyle')
-            if managedByLifestyle is not None:
-                results['COMPONENTS']['MEDCONDS']['POINTS'] = results['COMPONENTS']['MEDCONDS']['POINTS'] + \
-                                                              (
-                                                                      managedByLifestyle * PointIncreaseForMangingConditionsWithMedicationandLifestyle)
-
-            # add back if managed by Dr
-            managedByDr = utilities.strToInt(answers, 'ConditionsManagedByDoctor')
-            if managedByDr is not None:
-                results['COMPONENTS']['MEDCONDS']['POINTS'] = results['COMPONENTS']['MEDCONDS']['POINTS'] + \
-                                                              (managedByDr * PointIncreaseForDoctorTreatingCondition)
-
-            # subtractor so no change to max and maxforanswered
-            affectOnLife = utilities.strToKey(answers, 'ConditionsAffectOnLife')
-            if affectOnLife is not None:
-                results['COMPONENTS']['MEDCONDS']['POINTS'] = results['COMPONENTS']['MEDCONDS']['POINTS'] + \
-                                                              AffectOnLifeFromConditionsPoints.points(affectOnLife)
-
-        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['MEDCONDS']['POINTS']
-
-    # number of medications taken
-    numberMedications = utilities.strToKey(answers, 'NumberMedications')
-    results = utilities.subpts(numberMedications, 'NUMMEDS', NumberMedicationsPoints, results)
-
-    # blood pressure
-    systolic = utilities.strToInt(answers, 'SystolicBloodPressure')
-    results = utilities.subpts(systolic, 'SYS', SystolicRange, results)
-
-    diastolic = utilities.strToInt(answers, 'DiastolicBloodPressure')
-    results = utilities.subpts(diastolic, 'DIA', DiastolicRange, results)
-
-    # cholesterol
-    tldl = utilities.strToInt(answers, 'LDLCholesterol')
-    results = utilities.subpts(tldl, 'LDL', LDLRange, results)
-
-    thdl = utilities.strToInt(answers, 'HDLCholesterol')
-    results = utilities.subpts(thdl, 'HDL', HDLRange, results)
-
-    ttri = utilities.strToInt(answers, 'Triglycerides')
-    results = utilities.subpts(ttri, 'TRI', TriRange, results)
-
-    # resting heart rate
-    restingHeartRate = utilities.strToInt(answers, 'RestingHeartRate')
-    results = utilities.subpts(restingHeartRate, 'RHR', RHRRange, results)
+        card.answered(MEDCONDS)
+        card.award(MEDCONDS, conditionsPoints(answers, numberOfConditions), 'NumberOfConditions', numberOfConditions,
+                   'conditions')
+
+    utilities.scoreRules(RULES, answers, card)
 
     # tobacco use
     # these are subtractions so MAX and MAXFORANSWERED stay at the default 0
-    usedTobaccoInPast7Days = utilities.strToBool(answers, 'UsedTobaccoInPast7Days')
+    usedTobaccoInPast7Days = answers.asBool('UsedTobaccoInPast7Days')
     # have to check for None here as that indicates no answer, False is valid answer
     if usedTobaccoInPast7Days is not None:
         if usedTobaccoInPast7Days:
-            results['COMPONENTS']['TOBACCO7']['POINTS'] = PointDecreaseForTobaccoUsePast7Days
-            logging.debug('score decreased by %d for Tobacco7', results['COMPONENTS']['TOBACCO7']['POINTS'])
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS']['TOBACCO7']['POINTS']
+            card.award(TOBACCO7, PointDecreaseForTobaccoUsePast7Days, 'UsedTobaccoInPast7Days', usedTobaccoInPast7Days,
+                       'tobacco use')
 
-    usedTobaccoInPast6Months = utilities.strToBool(answers, 'UsedTobaccoInPast6Months')
+    usedTobaccoInPast6Months = answers.asBool('UsedTobaccoInPast6Months')
     # have to check for None here as that indicates no answer, False is valid answer
     if usedTobaccoInPast6Months is not None:
         if usedTobaccoInPast6Months:
-            results['COMPONENTS']['TOBACCO180']['POINTS'] = PointDecreaseForTobaccoUsePast60Days
-            logging.debug('score decreased by %d for Tobacco180', results['COMPONENTS']['TOBACCO180']['POINTS'])
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS']['TOBACCO180']['POINTS']
+            card.award(TOBACCO180, PointDecreaseForTobaccoUsePast60Days, 'UsedTobaccoInPast6Months',
+                       usedTobaccoInPast6Months, 'tobacco use')
 
-    return results
+    return card.tally()
 
+
+def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
+    logging.debug("calculating score for %s", name())
+    return score(utilities.answerVector(answers)).results()
@@ -1,6 +1,6 @@
 import logging
 from . import utilities
-from typing import Tuple, Dict, Union
+from typing import Dict, List, Tuple, Union
 
 
 """Calculate the Nutrition VI score
@@ -66,51 +66,64 @@ def inputs() -> Tuple[str, ...]:
     return ('Gender','NumberFruitServings','NumberVegetableServings','NumberDrinks','NumberCaffeinatedDrinks','NumberWaterDrinks','NumberAlcoholicDrinks')
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
-    logging.debug("calculating score for %s" % name())
+PLAN = utilities.ScoringPlan(name(), (('NUMFRUITSSERVS', FruitServingsPoints.max()),
+                                       ('NUMVEGSERVS', VegetableServingsPoints.max()),
+                                       ('NUMFRUITANDVEG', FruitAndVegServingsMapMax),
+                                       ('NUMDRINKS', EightOunceDrinksPoints.max()),
+                                       ('NUMCAFDRINKS', CaffeinatedDrinksPoints.max()),
+                                       ('NUMWATERDRINKS', WaterServingsPoints.max()),
+                                       ('NUMALCDRINKS', AlcoholicDrinksMalePoints.max())))
+NUMFRUITANDVEG = PLAN.slots['NUMFRUITANDVEG']
+NUMALCDRINKS = PLAN.slots['NUMALCDRINKS']
+# component max points reported for women, NUMFRUITANDVEG shows the female alcohol max
+FemaleComponentMaxPoints = tuple(AlcoholicDrinksFemalePoints.max() if slot == NUMFRUITANDVEG else cmax
+                                 for slot, cmax in enumerate(PLAN.component_maxpoints))
 
-    results = {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0,
-               'COMPONENTS': {'NUMFRUITSSERVS': {'POINTS': 0, 'MAXPOINTS': FruitServingsPoints.max(), 'MAXFORANSWERED': 0},
-                              'NUMVEGSERVS': {'POINTS': 0, 'MAXPOINTS': VegetableServingsPoints.max(), 'MAXFORANSWERED': 0},
-                              'NUMFRUITANDVEG': {'POINTS': 0, 'MAXPOINTS': FruitAndVegServingsMapMax, 'MAXFORANSWERED': 0},
-                              'NUMDRINKS': {'POINTS': 0, 'MAXPOINTS': EightOunceDrinksPoints.max(), 'MAXFORANSWERED': 0},
-                              'NUMCAFDRINKS': {'POINTS': 0, 'MAXPOINTS': CaffeinatedDrinksPoints.max(), 'MAXFORANSWERED': 0},
-                              'NUMWATERDRINKS': {'POINTS': 0, 'MAXPOINTS': WaterServingsPoints.max(), 'MAXFORANSWERED': 0},
-                              'NUMALCDRINKS': {'POINTS': 0, 'MAXPOINTS': AlcoholicDrinksMalePoints.max(), 'MAXFORANSWERED': 0}}}
+SERVINGS_RULES = utilities.compileRules(PLAN, (('NUMFRUITSSERVS', 'NumberFruitServings', utilities.AnswerVector.asKey, FruitServingsPoints),
+                                               ('NUMVEGSERVS', 'NumberVegetableServings', utilities.AnswerVector.asKey, VegetableServingsPoints)))
+DRINKS_RULES = utilities.compileRules(PLAN, (('NUMDRINKS', 'NumberDrinks', utilities.AnswerVector.asKey, EightOunceDrinksPoints),
+                                             ('NUMWATERDRINKS', 'NumberWaterDrinks', utilities.AnswerVector.asKey, WaterServingsPoints),
+                                             ('NUMCAFDRINKS', 'NumberCaffeinatedDrinks', utilities.AnswerVector.asKey, CaffeinatedDrinksPoints)))
 
-    numberOfFruitServings  = utilities.strToKey(answers, 'NumberFruitServings')
-    results = utilities.subpts(numberOfFruitServings, 'NUMFRUITSSERVS', FruitServingsPoints, results)
 
-    numberOfVegServings = utilities.strToKey(answers, 'NumberVegetableServings')
-    results = utilities.subpts(numberOfVegServings, 'NUMVEGSERVS', VegetableServingsPoints, results)
+def domains() -> Dict[str, Tuple[str, ...]]:
+    # legal answers for the questions with a fixed set of answers
+    xdomains = utilities.ruleDomains(SERVINGS_RULES)
+    xdomains.update(utilities.ruleDomains(DRINKS_RULES))
+    xdomains['NumberAlcoholicDrinks'] = tuple(AlcoholicDrinksMalePoints._points)
+    return xdomains
 
-    # special case
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['NUMFRUITANDVEG']['MAXPOINTS']
-    if numberOfFruitServings is not None and numberOfVegServings is not None:
-        results['COMPONENTS']['NUMFRUITANDVEG']['MAXFORANSWERED'] = results['COMPONENTS']['NUMFRUITANDVEG']['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS']['NUMFRUITANDVEG']['MAXFORANSWERED']
-        results['COMPONENTS']['NUMFRUITANDVEG']['POINTS'] = FruitAndVegServingsMap[numberOfFruitServings][numberOfVegServings]
-        logging.debug("score increased by total of %d for %s", results['COMPONENTS']['NUMFRUITANDVEG']['POINTS'], 'NUMFRUITANDVEG')
-        results['POINTS'] = results['POINTS'] + results['COMPONENTS']['NUMFRUITANDVEG']['POINTS']
 
-    numberOfEightOunceDrinks = utilities.strToKey(answers, 'NumberDrinks')
-    results = utilities.subpts(numberOfEightOunceDrinks, 'NUMDRINKS', EightOunceDrinksPoints, results)
+def score(answers: utilities.AnswerVector, trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> utilities.ScoreCard:
+    card = PLAN.card(trace)
 
-    numberOfWaterServings = utilities.strToKey(answers, 'NumberWaterDrinks')
-    results = utilities.subpts(numberOfWaterServings, 'NUMWATERDRINKS', WaterServingsPoints, results)
+    utilities.scoreRules(SERVINGS_RULES, answers, card)
 
-    numberOfCaffeinatedDrinks = utilities.strToKey(answers, 'NumberCaffeinatedDrinks')
-    results = utilities.subpts(numberOfCaffeinatedDrinks, 'NUMCAFDRINKS', CaffeinatedDrinksPoints, results)
+    # special case
+    numberOfFruitServings = answers.asKey('NumberFruitServings')
+    numberOfVegServings = answers.asKey('NumberVegetableServings')
+    if numberOfFruitServings is not None and numberOfVegServings is not None:
+        card.answered(NUMFRUITANDVEG)
+        card.award(NUMFRUITANDVEG, FruitAndVegServingsMap[numberOfFruitServings][numberOfVegServings],
+                   'NumberFruitServings,NumberVegetableServings', numberOfFruitServings + ',' + numberOfVegServings,
+                   'fruit and vegetable servings')
 
-    numberOfAlcoholicDrinks = utilities.strToKey(answers, 'NumberAlcoholicDrinks')
+    utilities.scoreRules(DRINKS_RULES, answers, card)
+
+    numberOfAlcoholicDrinks = answers.asKey('NumberAlcoholicDrinks')
     isMale = utilities.isMale(answers['Gender'])
     if isMale is not None:
         if isMale:
-            results = utilities.subpts(numberOfAlcoholicDrinks, 'NUMALCDRINKS', AlcoholicDrinksMalePoints, results)
+            card.lookup(NUMALCDRINKS, numberOfAlcoholicDrinks, AlcoholicDrinksMalePoints, 'NumberAlcoholicDrinks')
         else:
-            results['COMPONENTS']['NUMFRUITANDVEG']['MAXPOINTS'] = AlcoholicDrinksFemalePoints.max()
-            results = utilities.subpts(numberOfAlcoholicDrinks, 'NUMALCDRINKS', AlcoholicDrinksFemalePoints, results)
+            card.component_maxpoints = FemaleComponentMaxPoints
+            card.lookup(NUMALCDRINKS, numberOfAlcoholicDrinks, AlcoholicDrinksFemalePoints, 'NumberAlcoholicDrinks')
     else:
-        results = utilities.subpts(numberOfAlcoholicDrinks, 'NUMALCDRINKS', AlcoholicDrinksMalePoints, results)
+        card.lookup(NUMALCDRINKS, numberOfAlcoholicDrinks, AlcoholicDrinksMalePoints, 'NumberAlcoholicDrinks')
+
+    return card.tally()
 
-    return results
+
+def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
+    logging.debug("calculating score for %s", name())
+    return score(utilities.answerVector(answers)).results()
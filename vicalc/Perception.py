@@ -1,6 +1,6 @@
 import logging
 from . import utilities
-from typing import Union, Dict, Tuple
+from typing import Dict, List, Tuple, Union
 
 """Calculate the Nutrition VI score
 
@@ -68,28 +68,26 @@ def inputs() -> Tuple[str, ...]:
             'OverallHealth')
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
-    logging.debug("calculating score for %s" % name())
-
-    results = {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0,
-               'COMPONENTS': {'PAINLIFE': {'POINTS': 0, 'MAXPOINTS': PainInterferingWithLifePoints.max(), 'MAXFORANSWERED': 0},
-                              'HEALTHLIFE': {'POINTS': 0, 'MAXPOINTS': HealthFactorsInterferingWithLifePoints.max(), 'MAXFORANSWERED': 0},
-                              'RELIEDOTHERS': {'POINTS': 0, 'MAXPOINTS': HowMuchRelianceOnOthersPoints.max(), 'MAXFORANSWERED': 0},
-                              'PERCEIVEDHEALTH': {'POINTS': 0, 'MAXPOINTS': OverallPerceivedHealthPoints.max(), 'MAXFORANSWERED': 0}}}
+PLAN = utilities.ScoringPlan(name(), (('PAINLIFE', PainInterferingWithLifePoints.max()),
+                                       ('HEALTHLIFE', HealthFactorsInterferingWithLifePoints.max()),
+                                       ('RELIEDOTHERS', HowMuchRelianceOnOthersPoints.max()),
+                                       ('PERCEIVEDHEALTH', OverallPerceivedHealthPoints.max())))
 
-    painAffectedActivities = utilities.strToKey(answers, 'PainInterferedWithActivities')
-    results = utilities.subpts(painAffectedActivities, 'PAINLIFE', PainInterferingWithLifePoints, results)
+RULES = utilities.compileRules(PLAN, (('PAINLIFE', 'PainInterferedWithActivities', utilities.AnswerVector.asKey, PainInterferingWithLifePoints),
+                                      ('HEALTHLIFE', 'OtherFactorsInterferedWithActivities', utilities.AnswerVector.asKey, HealthFactorsInterferingWithLifePoints),
+                                      ('RELIEDOTHERS', 'ReliedOnOthersForHelp', utilities.AnswerVector.asKey, HowMuchRelianceOnOthersPoints),
+                                      ('PERCEIVEDHEALTH', 'OverallHealth', utilities.AnswerVector.asKey, OverallPerceivedHealthPoints)))
 
-    otherFactorsAffectedActivities = utilities.strToKey(answers, 'OtherFactorsInterferedWithActivities')
-    results = utilities.subpts(otherFactorsAffectedActivities, 'HEALTHLIFE', HealthFactorsInterferingWithLifePoints,
-                               results)
 
-    reliedOnOthersForHelp = utilities.strToKey(answers, 'ReliedOnOthersForHelp')
-    results = utilities.subpts(reliedOnOthersForHelp, 'RELIEDOTHERS', HowMuchRelianceOnOthersPoints, results)
+def domains() -> Dict[str, Tuple[str, ...]]:
+    # legal answers for the questions with a fixed set of answers
+    return utilities.ruleDomains(RULES)
 
-    overallHealth = utilities.strToKey(answers, 'OverallHealth')
-    results = utilities.subpts(overallHealth, 'PERCEIVEDHEALTH', OverallPerceivedHealthPoints, results)
 
-    return results
+def score(answers: utilities.AnswerVector, trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> utilities.ScoreCard:
+    return utilities.scoreRules(RULES, answers, PLAN.card(trace)).tally()
 
 
+def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
+    logging.debug("calculating score for %s", name())
+    return score(utilities.answerVector(answers)).results()
@@ -1,6 +1,6 @@
 import logging
 from . import utilities
-from typing import Union, Dict, Tuple
+from typing import Dict, List, Tuple, Union
 
 """Calculate the Psycho Social VI score
 
@@ -312,74 +312,118 @@ def inputs() -> Tuple[str, ...]:
             'GratificationLargeGroupActivities', 'StressLargeGroupActivities')
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
-    logging.debug("calculating score for %s" % name())
-
-    results = {'POINTS': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0,
-               'COMPONENTS': {'WORKCOMP': {'POINTS': 0, 'MAXPOINTS': ComparisonOfHoursWorkedToDesiredPoints.max(), 'MAXFORANSWERED': 0},
-                              'WORKGRAT': {'POINTS': 0, 'MAXPOINTS': GratificationFromWorkPoints.max(), 'MAXFORANSWERED': 0},
-                              'WORKCAR': {'POINTS': 0, 'MAXPOINTS': HoursSpentInCarForJobPoints.max(), 'MAXFORANSWERED': 0},
-                              'WORKHOURS': {'POINTS': 0, 'MAXPOINTS': HoursSpentWorkingJobPoints.max(), 'MAXFORANSWERED': 0},
-                              'WORKSTRESS': {'POINTS': 0, 'MAXPOINTS': StressFromWorkPoints.max(), 'MAXFORANSWERED': 0},
-                              'GROUPEVENTS': {'POINTS': 0, 'MAXPOINTS': CombinedSmallAndLargeGroupActivitiesPoints.max(), 'MAXFORANSWERED': 0},
-                              'NONWORKACTIVITIES': {'POINTS': 0, 'MAXPOINTS': TotalHoursOfNonWorkActivitiesRange.max(), 'MAXFORANSWERED': 0},
-                              'NONWORKGRAT': {'POINTS': 0, 'MAXPOINTS': GratificationFromAllSocialEngagementPoints.max(), 'MAXFORANSWERED': 0},
-                              'NONWORKSTRESS': {'POINTS': 0, 'MAXPOINTS': StressFromAllSocialEngagementPoints.max(), 'MAXFORANSWERED': 0},
-                              'FINSTRESS': {'POINTS': 0, 'MAXPOINTS': DifficultyPayingBillsPoints.max(), 'MAXFORANSWERED': 0},
-                              'PRINETWORK': {'POINTS': 0, 'MAXPOINTS': TimesMeetingOrSpeakingWithFriendPoints.max(), 'MAXFORANSWERED': 0},
-                              'TOTALNETWORK': {'POINTS': 0, 'MAXPOINTS': TotalPrimaryAndSecondaryFriendsPoints.max(), 'MAXFORANSWERED': 0},
-                              'COMMUNITYCOH': {'POINTS': 0, 'MAXPOINTS': CommunityCohesionVIPoints, 'MAXFORANSWERED': 0},
-                              'COMMUNITYINTER': {'POINTS': 0, 'MAXPOINTS': PointsIncreaseForMeetingOrSpeakingWithNonCloseFriends, 'MAXFORANSWERED': 0},
-                              'SOCIALSAT': {'POINTS': 0, 'MAXPOINTS': SocialSatisfactionRange.max(), 'MAXFORANSWERED': 0},
-                              'EMOTIONALENRICH': {'POINTS': 0, 'MAXPOINTS': EmotionalEnrichmentRange.max(), 'MAXFORANSWERED': 0},
-                              'SLEEPHOURS': {'POINTS': 0, 'MAXPOINTS': HoursOfSleepPoints.max(), 'MAXFORANSWERED': 0},
-                              'SLEEPSAT': {'POINTS': 0, 'MAXPOINTS': SatisfactionOfSleepPoints.max(), 'MAXFORANSWERED': 0},
-                              'LIFESAT': {'POINTS': 0, 'MAXPOINTS': SatisfactionWithLifePoints.max(), 'MAXFORANSWERED': 0},
-                              'ENERGYLVL': {'POINTS': 0, 'MAXPOINTS': EnergyLevelPoints.max(), 'MAXFORANSWERED': 0},
-                              'LIFECONTROL': {'POINTS': 0, 'MAXPOINTS': AbilityToHandleEverythingNeededPoints.max(), 'MAXFORANSWERED': 0},
-                              'OPTIMISM': {'POINTS': 0, 'MAXPOINTS': OptimismAboutTheFuturePoints.max(), 'MAXFORANSWERED': 0},
-                              'DIRECTION': {'POINTS': 0, 'MAXPOINTS': SenseOfDirectionPoints.max(), 'MAXFORANSWERED': 0},
-                              'ANXIETYLVL': {'POINTS': 0, 'MAXPOINTS': anxietyLevelPoints.max(), 'MAXFORANSWERED': 0},
-                              'NEEDSMET': {'POINTS': 0, 'MAXPOINTS': NeedsBeingMetPoints.max(), 'MAXFORANSWERED': 0},
-                              'RELATIONSHIPS': {'POINTS': 0, 'MAXPOINTS': MeaningfulRelationshipsPoints.max(), 'MAXFORANSWERED': 0},
-                              'OVERALLHAPPY': {'POINTS': 0, 'MAXPOINTS': OverallHappinessPoints.max(), 'MAXFORANSWERED': 0},
-                              'OVERALLSTRESS': {'POINTS': 0, 'MAXPOINTS': OverallStressLevelPoints.max(), 'MAXFORANSWERED': 0},
-                              'OVERALLANXIETY': {'POINTS': 0, 'MAXPOINTS': OverallAnxietyLevelPoints.max(), 'MAXFORANSWERED': 0},
-                              'OVERALLSAT': {'POINTS': 0, 'MAXPOINTS': OverallSatisfactionPoints.max(), 'MAXFORANSWERED': 0}}}
+PLAN = utilities.ScoringPlan(name(), (('WORKCOMP', ComparisonOfHoursWorkedToDesiredPoints.max()),
+                                       ('WORKGRAT', GratificationFromWorkPoints.max()),
+                                       ('WORKCAR', HoursSpentInCarForJobPoints.max()),
+                                       ('WORKHOURS', HoursSpentWorkingJobPoints.max()),
+                                       ('WORKSTRESS', StressFromWorkPoints.max()),
+                                       ('GROUPEVENTS', CombinedSmallAndLargeGroupActivitiesPoints.max()),
+                                       ('NONWORKACTIVITIES', TotalHoursOfNonWorkActivitiesRange.max()),
+                                       ('NONWORKGRAT', GratificationFromAllSocialEngagementPoints.max()),
+                                       ('NONWORKSTRESS', StressFromAllSocialEngagementPoints.max()),
+                                       ('FINSTRESS', DifficultyPayingBillsPoints.max()),
+                                       ('PRINETWORK', TimesMeetingOrSpeakingWithFriendPoints.max()),
+                                       ('TOTALNETWORK', TotalPrimaryAndSecondaryFriendsPoints.max()),
+                                       ('COMMUNITYCOH', CommunityCohesionVIPoints),
+                                       ('COMMUNITYINTER', PointsIncreaseForMeetingOrSpeakingWithNonCloseFriends),
+                                       ('SOCIALSAT', SocialSatisfactionRange.max()),
+                                       ('EMOTIONALENRICH', EmotionalEnrichmentRange.max()),
+                                       ('SLEEPHOURS', HoursOfSleepPoints.max()),
+                                       ('SLEEPSAT', SatisfactionOfSleepPoints.max()),
+                                       ('LIFESAT', SatisfactionWithLifePoints.max()),
+                                       ('ENERGYLVL', EnergyLevelPoints.max()),
+                                       ('LIFECONTROL', AbilityToHandleEverythingNeededPoints.max()),
+                                       ('OPTIMISM', OptimismAboutTheFuturePoints.max()),
+                                       ('DIRECTION', SenseOfDirectionPoints.max()),
+                                       ('ANXIETYLVL', anxietyLevelPoints.max()),
+                                       ('NEEDSMET', NeedsBeingMetPoints.max()),
+                                       ('RELATIONSHIPS', MeaningfulRelationshipsPoints.max()),
+                                       ('OVERALLHAPPY', OverallHappinessPoints.max()),
+                                       ('OVERALLSTRESS', OverallStressLevelPoints.max()),
+                                       ('OVERALLANXIETY', OverallAnxietyLevelPoints.max()),
+                                       ('OVERALLSAT', OverallSatisfactionPoints.max())))
+
+
+def scaled(pts: int) -> int:
+    return round((pts / MaxPsychosocialPointsForThoseWithJobs) * MaxPsychosocialPointsForThoseWithoutJobs)
+
+
+# max points are scaled to those without jobs
+PLAN.maxpoints = scaled(PLAN.maxpoints)
+
+WORKCOMP = PLAN.slots['WORKCOMP']
+WORKGRAT = PLAN.slots['WORKGRAT']
+WORKCAR = PLAN.slots['WORKCAR']
+WORKHOURS = PLAN.slots['WORKHOURS']
+WORKSTRESS = PLAN.slots['WORKSTRESS']
+GROUPEVENTS = PLAN.slots['GROUPEVENTS']
+NONWORKACTIVITIES = PLAN.slots['NONWORKACTIVITIES']
+NONWORKGRAT = PLAN.slots['NONWORKGRAT']
+NONWORKSTRESS = PLAN.slots['NONWORKSTRESS']
+COMMUNITYCOH = PLAN.slots['COMMUNITYCOH']
+COMMUNITYINTER = PLAN.slots['COMMUNITYINTER']
+SOCIALSAT = PLAN.slots['SOCIALSAT']
+EMOTIONALENRICH = PLAN.slots['EMOTIONALENRICH']
+
+NETWORK_RULES = utilities.compileRules(PLAN, (('FINSTRESS', 'DifficultyPayingBills', utilities.AnswerVector.asKey, DifficultyPayingBillsPoints),
+                                              ('PRINETWORK', 'TimesMeetingSpeakingFriends', utilities.AnswerVector.asInt, TimesMeetingOrSpeakingWithFriendPoints),
+                                              ('TOTALNETWORK', 'TotalPrimarySecondaryFriends', utilities.AnswerVector.asInt, TotalPrimaryAndSecondaryFriendsPoints)))
+WELLBEING_RULES = utilities.compileRules(PLAN, (('SLEEPHOURS', 'SleepTime', utilities.AnswerVector.asKey, HoursOfSleepPoints),
+                                                ('SLEEPSAT', 'SatisfactionSleep', utilities.AnswerVector.asKey, SatisfactionOfSleepPoints),
+                                                ('LIFESAT', 'GoodAboutLife', utilities.AnswerVector.asKey, SatisfactionWithLifePoints),
+                                                ('ENERGYLVL', 'EnergyLevel', utilities.AnswerVector.asKey, EnergyLevelPoints),
+                                                ('LIFECONTROL', 'HandleEverythingNeeded', utilities.AnswerVector.asKey, AbilityToHandleEverythingNeededPoints),
+                                                ('OPTIMISM', 'OptimisticAboutFuture', utilities.AnswerVector.asKey, OptimismAboutTheFuturePoints),
+                                                ('DIRECTION', 'SenseOfDirection', utilities.AnswerVector.asKey, SenseOfDirectionPoints),
+                                                ('ANXIETYLVL', 'AnxietyLevel', utilities.AnswerVector.asKey, anxietyLevelPoints),
+                                                ('NEEDSMET', 'NeedsBeingMet', utilities.AnswerVector.asKey, NeedsBeingMetPoints),
+                                                ('RELATIONSHIPS', 'MeaningfulRelationships', utilities.AnswerVector.asKey, MeaningfulRelationshipsPoints),
+                                                ('OVERALLHAPPY', 'OverallHappiness', utilities.AnswerVector.asKey, OverallHappinessPoints),
+                                                ('OVERALLSTRESS', 'OverallStressLevel', utilities.AnswerVector.asKey, OverallStressLevelPoints),
+                                                ('OVERALLANXIETY', 'OverallAnxietyLevel', utilities.AnswerVector.asKey, OverallAnxietyLevelPoints),
+                                                ('OVERALLSAT', 'OverallLifeSatisfaction', utilities.AnswerVector.asKey, OverallSatisfactionPoints)))
+
+# non-work activities, (hours, times, gratification, stress)
+# activities counted by times only add their hours when the times are above 0
+HoursActivities = (('HoursHelpingFriendsFamily', 'GratificationHelpingFriendsFamily', 'StressHelpingFriendsFamily'),
+                   ('HoursVolunteering', 'GratificationVolunteering', 'StressVolunteering'))
+GroupActivities = (('TimesSmallGroupActivities', 'HoursSmallGroupActivities', 'GratificationSmallGroupActivities',
+                    'StressSmallGroupActivities'),
+                   ('TimesLargeGroupActivities', 'HoursLargeGroupActivities', 'GratificationLargeGroupActivities',
+                    'StressLargeGroupActivities'))
+SatisfactionQuestions = ('SocialSatisfaction', 'FamilySatisfaction', 'BalanceSatisfaction')
+
+
+def domains() -> Dict[str, Tuple[str, ...]]:
+    # legal answers for the questions with a fixed set of answers
+    xdomains = {'HoursWorked': tuple(HoursSpentWorkingJobPoints._points),
+                'ComparisonHoursWorkedToDesired': tuple(ComparisonOfHoursWorkedToDesiredPoints._points),
+                'GratificationFromWork': tuple(GratificationFromWorkPoints._points),
+                'HoursInCarForWork': tuple(HoursSpentInCarForJobPoints._points),
+                'StressFromWork': tuple(StressFromWorkPoints._points)}
+    xdomains.update(utilities.ruleDomains(NETWORK_RULES))
+    xdomains.update(utilities.ruleDomains(WELLBEING_RULES))
+    return xdomains
+
+
+def score(answers: utilities.AnswerVector, trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> utilities.ScoreCard:
+    card = PLAN.card(trace)
 
     # Work Engagement
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['WORKHOURS']['MAXPOINTS']
-    hoursWorked = utilities.strToKey(answers, 'HoursWorked')
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['WORKCOMP']['MAXPOINTS']
-    comparisonOfHoursWorkedToDesired = utilities.strToKey(answers, 'ComparisonHoursWorkedToDesired')
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['WORKGRAT']['MAXPOINTS']
-    gratificationFromWork = utilities.strToKey(answers, 'GratificationFromWork')
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['WORKCAR']['MAXPOINTS']
-    hoursInCarForWork = utilities.strToKey(answers, 'HoursInCarForWork')
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['WORKSTRESS']['MAXPOINTS']
-    stressFromWork = utilities.strToKey(answers, 'StressFromWork')
-
-    if hoursWorked is not None:
-        results = utilities.subptsanswered(hoursWorked, 'WORKHOURS', HoursSpentWorkingJobPoints, results)
-
-        if hoursWorked in ('2', '3', '4'):
-            if gratificationFromWork is not None:
-                results = utilities.subptsanswered(gratificationFromWork, 'WORKGRAT', GratificationFromWorkPoints,
-                                                   results)
-
-            if hoursInCarForWork is not None:
-                results = utilities.subptsanswered(hoursInCarForWork, 'WORKCAR', HoursSpentInCarForJobPoints, results)
-
-            if stressFromWork is not None:
-                results = utilities.subptsanswered(stressFromWork, 'WORKSTRESS', StressFromWorkPoints, results)
-
-    if comparisonOfHoursWorkedToDesired is not None:
-        results = utilities.subptsanswered(comparisonOfHoursWorkedToDesired, 'WORKCOMP',
-                                           ComparisonOfHoursWorkedToDesiredPoints, results)
+    hoursWorked = answers.asKey('HoursWorked')
+    comparisonOfHoursWorkedToDesired = answers.asKey('ComparisonHoursWorkedToDesired')
+    gratificationFromWork = answers.asKey('GratificationFromWork')
+    hoursInCarForWork = answers.asKey('HoursInCarForWork')
+    stressFromWork = answers.asKey('StressFromWork')
+
+    working = hoursWorked is not None and hoursWorked in ('2', '3', '4')
+    card.lookup(WORKHOURS, hoursWorked, HoursSpentWorkingJobPoints, 'HoursWorked')
+    if working:
+        card.lookup(WORKGRAT, gratificationFromWork, GratificationFromWorkPoints, 'GratificationFromWork')
+        card.lookup(WORKCAR, hoursInCarForWork, HoursSpentInCarForJobPoints, 'HoursInCarForWork')
+        card.lookup(WORKSTRESS, stressFromWork, StressFromWorkPoints, 'StressFromWork')
+    card.lookup(WORKCOMP, comparisonOfHoursWorkedToDesired, ComparisonOfHoursWorkedToDesiredPoints,
+                'ComparisonHoursWorkedToDesired')
 
     # Non-work Engagement
     totalHoursSpentInNonWorkActivities = 0
@@ -391,254 +435,142 @@ def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[st
     smallOrLargeGroupEventsAnswered = False
     hoursAnswered = False
 
-    hoursSpentHelpingOthers = utilities.strToInt(answers, 'HoursHelpingFriendsFamily')
-    if hoursSpentHelpingOthers is not None:
-        totalHoursSpentInNonWorkActivities += hoursSpentHelpingOthers
-        hoursAnswered = True
-        if hoursSpentHelpingOthers > 0:
-            # Include gratification and stress scales into average
-            gratificationFromHelpingOthers = utilities.strToInt(answers, 'GratificationHelpingFriendsFamily')
-            if gratificationFromHelpingOthers is not None:
-                gratDenom += 1
-                combinedGratificationScale += gratificationFromHelpingOthers
-
-            stressFromHelpingOthers = utilities.strToInt(answers, 'StressHelpingFriendsFamily')
-            if stressFromHelpingOthers is not None:
-                stressDenom += 1
-                combinedStressScale += stressFromHelpingOthers
-
-    hoursVolunteering = utilities.strToInt(answers, 'HoursVolunteering')
-    if hoursVolunteering is not None:
-        totalHoursSpentInNonWorkActivities += hoursVolunteering
-        hoursAnswered = True
-        if hoursVolunteering > 0:
-            # Include gratification and stress scales into average
-            gratificationFromVolunteering = utilities.strToInt(answers, 'GratificationVolunteering')
-            if gratificationFromVolunteering is not None:
-                gratDenom += 1
-                combinedGratificationScale += gratificationFromVolunteering
-
-            stressFromVolunteering = utilities.strToInt(answers, 'StressVolunteering')
-            if stressFromVolunteering is not None:
-                stressDenom += 1
-                combinedStressScale += stressFromVolunteering
-
-    timesSpentInSmallGroupActivities = utilities.strToInt(answers, 'TimesSmallGroupActivities')
-    if timesSpentInSmallGroupActivities is not None:
-        smallOrLargeGroupEventsAnswered = True
-        combinedSmallAndLargeGroupEvents += timesSpentInSmallGroupActivities
-        if timesSpentInSmallGroupActivities > 0:
-            # Include gratification and stress scales into average
-            gratificationFromSmallGroupActivities = utilities.strToInt(answers, 'GratificationSmallGroupActivities')
-            if gratificationFromSmallGroupActivities is not None:
-                gratDenom += 1
-                combinedGratificationScale += gratificationFromSmallGroupActivities
-
-            stressFromSmallGroupActivities = utilities.strToInt(answers, 'StressSmallGroupActivities')
-            if stressFromSmallGroupActivities is not None:
-                stressDenom += 1
-                combinedStressScale += stressFromSmallGroupActivities
-
-            # include hours
-            hoursSpentInSmallGroupActivities = utilities.strToInt(answers, 'HoursSmallGroupActivities')
-            if hoursSpentInSmallGroupActivities is not None:
-                totalHoursSpentInNonWorkActivities += hoursSpentInSmallGroupActivities
-                hoursAnswered = True
-
-    timesSpentInLargeGroupActivities = utilities.strToInt(answers, 'TimesLargeGroupActivities')
-    if timesSpentInLargeGroupActivities is not None:
-        smallOrLargeGroupEventsAnswered = True
-        combinedSmallAndLargeGroupEvents += timesSpentInLargeGroupActivities
-        if timesSpentInLargeGroupActivities > 0:
-            # Include gratification and stress scales into average
-            gratificationFromLargeGroupActivities = utilities.strToInt(answers, 'GratificationLargeGroupActivities')
-            if gratificationFromLargeGroupActivities is not None:
-                gratDenom += 1
-                combinedGratificationScale += gratificationFromLargeGroupActivities
-
-            stressFromLargeGroupActivities = utilities.strToInt(answers, 'StressLargeGroupActivities')
-            if stressFromLargeGroupActivities is not None:
-                stressDenom += 1
-                combinedStressScale += stressFromLargeGroupActivities
-
-            # include hours
-            hoursSpentInLargeGroupActivities = utilities.strToInt(answers, 'HoursLargeGroupActivities')
-            if hoursSpentInLargeGroupActivities is not None:
-                totalHoursSpentInNonWorkActivities += hoursSpentInLargeGroupActivities
-                hoursAnswered = True
+    for hoursName, gratificationName, stressName in HoursActivities:
+        hours = answers.asInt(hoursName)
+        if hours is not None:
+            totalHoursSpentInNonWorkActivities += hours
+            hoursAnswered = True
+            if hours > 0:
+                # Include gratification and stress scales into average
+                gratification = answers.asInt(gratificationName)
+                if gratification is not None:
+                    gratDenom += 1
+                    combinedGratificationScale += gratification
+
+                stress = answers.asInt(stressName)
+                if stress is not None:
+                    stressDenom += 1
+                    combinedStressScale += stress
+
+    for timesName, hoursName, gratificationName, stressName in GroupActivities:
+        times = answers.asInt(timesName)
+        if times is not None:
+            smallOrLargeGroupEventsAnswered = True
+            combinedSmallAndLargeGroupEvents += times
+            if times > 0:
+                # Include gratification and stress scales into average
+                gratification = answers.asInt(gratificationName)
+                if gratification is not None:
+                    gratDenom += 1
+                    combinedGratificationScale += gratification
+
+                stress = answers.asInt(stressName)
+                if stress is not None:
+                    stressDenom += 1
+                    combinedStressScale += stress
+
+                # include hours
+                hours = answers.asInt(hoursName)
+                if hours is not None:
+                    totalHoursSpentInNonWorkActivities += hours
+                    hoursAnswered = True
 
     # Small and Large Group Events VI Subscore
-    results = utilities.subptscond(combinedSmallAndLargeGroupEvents, smallOrLargeGroupEventsAnswered, 'GROUPEVENTS',
-                                   CombinedSmallAndLargeGroupActivitiesPoints, results)
+    if smallOrLargeGroupEventsAnswered:
+        card.lookup(GROUPEVENTS, combinedSmallAndLargeGroupEvents, CombinedSmallAndLargeGroupActivitiesPoints)
 
     # Total time spent in non-work activities VI Subscore
-    results = utilities.subptscond(totalHoursSpentInNonWorkActivities, hoursAnswered, 'NONWORKACTIVITIES',
-                                   TotalHoursOfNonWorkActivitiesRange, results)
+    if hoursAnswered:
+        card.lookup(NONWORKACTIVITIES, totalHoursSpentInNonWorkActivities, TotalHoursOfNonWorkActivitiesRange)
 
     # Gratification from all non-work activities VI Subscore
     if gratDenom > 0:
-        results = utilities.subpts(int(round(combinedGratificationScale / gratDenom)), 'NONWORKGRAT',
-                                   GratificationFromAllSocialEngagementPoints, results)
-    else:
-        results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['NONWORKGRAT']['MAXPOINTS']
+        card.lookup(NONWORKGRAT, int(round(combinedGratificationScale / gratDenom)),
+                    GratificationFromAllSocialEngagementPoints)
 
     # Stress from all non-work activities VI Subscore
     if stressDenom > 0:
-        results = utilities.subpts(int(round(combinedStressScale / stressDenom)), 'NONWORKSTRESS',
-                                   StressFromAllSocialEngagementPoints, results)
-    else:
-        results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['NONWORKSTRESS']['MAXPOINTS']
-
-    # Financial
-    difficultyPayingBills = utilities.strToKey(answers, 'DifficultyPayingBills')
-    results = utilities.subpts(difficultyPayingBills, 'FINSTRESS', DifficultyPayingBillsPoints, results)
-
-    # Social Network
-    timesMeetingOrSpeakingWithFriend = utilities.strToInt(answers, 'TimesMeetingSpeakingFriends')
-    results = utilities.subpts(timesMeetingOrSpeakingWithFriend, 'PRINETWORK', TimesMeetingOrSpeakingWithFriendPoints,
-                               results)
-
-    totalPrimaryAndSecondaryFriends = utilities.strToInt(answers, 'TotalPrimarySecondaryFriends')
-    results = utilities.subpts(totalPrimaryAndSecondaryFriends, 'TOTALNETWORK', TotalPrimaryAndSecondaryFriendsPoints,
-                               results)
-
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['COMMUNITYCOH']['MAXPOINTS']
-    haveNeighborThatCanBeReliedOn = utilities.strToBool(answers, 'HaveNeighborThatCanBeReliedOn')  # bool
+        card.lookup(NONWORKSTRESS, int(round(combinedStressScale / stressDenom)), StressFromAllSocialEngagementPoints)
+
+    # Financial, Social Network
+    utilities.scoreRules(NETWORK_RULES, answers, card)
+
+    haveNeighborThatCanBeReliedOn = answers.asBool('HaveNeighborThatCanBeReliedOn')  # bool
     if haveNeighborThatCanBeReliedOn is not None:
-        results['COMPONENTS']['COMMUNITYCOH']['MAXFORANSWERED'] = results['COMPONENTS']['COMMUNITYCOH']['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS']['COMMUNITYCOH']['MAXFORANSWERED']
+        card.answered(COMMUNITYCOH)
         if haveNeighborThatCanBeReliedOn:
-            results['COMPONENTS']['COMMUNITYCOH']['POINTS'] = results['COMPONENTS']['COMMUNITYCOH']['MAXPOINTS']
-            logging.debug("score increased by %d for %s", results['COMPONENTS']['COMMUNITYCOH']['POINTS'],
-                         'COMMUNITYCOH')
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS']['COMMUNITYCOH']['POINTS']
+            card.award(COMMUNITYCOH, CommunityCohesionVIPoints, 'HaveNeighborThatCanBeReliedOn',
+                       haveNeighborThatCanBeReliedOn, 'community cohesion')
 
-    timesMeetingOrSpeakingWithNonCloseFriends = utilities.strToBool(answers, 'TimesMeetingSpeakingNonCloseFriends')
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['COMMUNITYINTER']['MAXPOINTS']
+    timesMeetingOrSpeakingWithNonCloseFriends = answers.asBool('TimesMeetingSpeakingNonCloseFriends')
     if timesMeetingOrSpeakingWithNonCloseFriends is not None:
-        results['COMPONENTS']['COMMUNITYINTER']['MAXFORANSWERED'] = results['COMPONENTS']['COMMUNITYINTER']['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS']['COMMUNITYINTER']['MAXFORANSWERED']
+        card.answered(COMMUNITYINTER)
         if timesMeetingOrSpeakingWithNonCloseFriends:
-            results['COMPONENTS']['COMMUNITYINTER']['POINTS'] = PointsIncreaseForMeetingOrSpeakingWithNonCloseFriends
-            logging.debug('score increased by %d for CommunityInteraction', results['COMPONENTS']['COMMUNITYINTER']['POINTS'])
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS']['COMMUNITYINTER']['POINTS']
+            card.award(COMMUNITYINTER, PointsIncreaseForMeetingOrSpeakingWithNonCloseFriends,
+                       'TimesMeetingSpeakingNonCloseFriends', timesMeetingOrSpeakingWithNonCloseFriends,
+                       'community interaction')
 
     satisfactionTotal = 0
     satisfactionDenom = 0
-    socialSatisfaction = utilities.strToInt(answers, 'SocialSatisfaction')
-    if socialSatisfaction is not None:
-        satisfactionTotal += socialSatisfaction
-        satisfactionDenom += 1
-    familyLifeSatisfaction = utilities.strToInt(answers, 'FamilySatisfaction')
-    if familyLifeSatisfaction is not None:
-        satisfactionTotal += familyLifeSatisfaction
-        satisfactionDenom += 1
-    workLifeBalanceSatisfaction = utilities.strToInt(answers, 'BalanceSatisfaction')
-    if workLifeBalanceSatisfaction is not None:
-        satisfactionTotal += workLifeBalanceSatisfaction
-        satisfactionDenom += 1
+    for satisfactionName in SatisfactionQuestions:
+        satisfaction = answers.asInt(satisfactionName)
+        if satisfaction is not None:
+            satisfactionTotal += satisfaction
+            satisfactionDenom += 1
     if satisfactionDenom > 0:
-        results = utilities.subpts(satisfactionTotal / satisfactionDenom, 'SOCIALSAT', SocialSatisfactionRange, results)
-    else:
-        results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['SOCIALSAT']['MAXPOINTS']
+        card.lookup(SOCIALSAT, satisfactionTotal / satisfactionDenom, SocialSatisfactionRange)
 
     runningTotal = 0
     denominatorCount = 0
-    emotionalAnswered = False
 
     # Emotionally Enriching Experiences
-    inRelationShip = utilities.strToInt(answers, 'InRelationship')
+    inRelationShip = answers.asInt('InRelationship')
     if inRelationShip is not None:
-        emotionalAnswered = True
         if inRelationShip > 1:
             # Love life / relationship
-            satisfactionWithLoveLife = utilities.strToInt(answers, 'RelationshipSatisfaction')
+            satisfactionWithLoveLife = answers.asInt('RelationshipSatisfaction')
             if satisfactionWithLoveLife is not None:
                 runningTotal += satisfactionWithLoveLife
                 denominatorCount += 1
 
             # Sex life
-            satisfactionWithSexLife = utilities.strToInt(answers, 'PhysicalSatisfaction')
+            satisfactionWithSexLife = answers.asInt('PhysicalSatisfaction')
             if satisfactionWithSexLife is not None:
                 runningTotal += satisfactionWithSexLife
                 denominatorCount += 1
 
     # Pet Owner
-    petOwner = utilities.strToBool(answers, 'PetOwner')  # bool
+    petOwner = answers.asBool('PetOwner')  # bool
     if petOwner is not None:
-        emotionalAnswered = True
         if petOwner:
-            gratificationFromBeingPetOwner = utilities.strToInt(answers, 'GratificationPetOwner')
+            gratificationFromBeingPetOwner = answers.asInt('GratificationPetOwner')
             if gratificationFromBeingPetOwner is not None:
                 runningTotal += gratificationFromBeingPetOwner
                 denominatorCount += 1
 
     # Alone time
-    satisfactionOfTimeSpentAlone = utilities.strToInt(answers, 'SatisfactionTimeAlone')
+    satisfactionOfTimeSpentAlone = answers.asInt('SatisfactionTimeAlone')
     if satisfactionOfTimeSpentAlone is not None:
-        emotionalAnswered = True
         runningTotal += satisfactionOfTimeSpentAlone
         denominatorCount += 1
+    # anything counted in the denominator was answered
     if denominatorCount > 0:
-        results = utilities.subptscond(runningTotal / denominatorCount, emotionalAnswered, 'EMOTIONALENRICH',
-                                       EmotionalEnrichmentRange, results)
-    else:
-        results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS']['EMOTIONALENRICH']['MAXPOINTS']
-
-    # Sleep
-    hoursOfSleep = utilities.strToKey(answers, 'SleepTime')
-    results = utilities.subpts(hoursOfSleep, 'SLEEPHOURS', HoursOfSleepPoints, results)
+        card.lookup(EMOTIONALENRICH, runningTotal / denominatorCount, EmotionalEnrichmentRange)
 
-    satisfactionOfSleep = utilities.strToKey(answers, 'SatisfactionSleep')
-    results = utilities.subpts(satisfactionOfSleep, 'SLEEPSAT', SatisfactionOfSleepPoints, results)
-
-    # Quality Of Life
-    satisfactionWithLife = utilities.strToKey(answers, 'GoodAboutLife')
-    results = utilities.subpts(satisfactionWithLife, 'LIFESAT', SatisfactionWithLifePoints, results)
-
-    energyLevel = utilities.strToKey(answers, 'EnergyLevel')
-    results = utilities.subpts(energyLevel, 'ENERGYLVL', EnergyLevelPoints, results)
-
-    abilityToHandleEverythingNeeded = utilities.strToKey(answers, 'HandleEverythingNeeded')
-    results = utilities.subpts(abilityToHandleEverythingNeeded, 'LIFECONTROL', AbilityToHandleEverythingNeededPoints,
-                               results)
-
-    optimismAboutTheFuture = utilities.strToKey(answers, 'OptimisticAboutFuture')
-    results = utilities.subpts(optimismAboutTheFuture, 'OPTIMISM', OptimismAboutTheFuturePoints, results)
-
-    senseOfDirection = utilities.strToKey(answers, 'SenseOfDirection')
-    results = utilities.subpts(senseOfDirection, 'DIRECTION', SenseOfDirectionPoints, results)
-
-    anxietyLevel = utilities.strToKey(answers, 'AnxietyLevel')
-    results = utilities.subpts(anxietyLevel, 'ANXIETYLVL', anxietyLevelPoints, results)
-
-    needsBeingMet = utilities.strToKey(answers, 'NeedsBeingMet')
-    results = utilities.subpts(needsBeingMet, 'NEEDSMET', NeedsBeingMetPoints, results)
-
-    meaningfulRelationships = utilities.strToKey(answers, 'MeaningfulRelationships')
-    results = utilities.subpts(meaningfulRelationships, 'RELATIONSHIPS', MeaningfulRelationshipsPoints, results)
-
-    overallHappiness = utilities.strToKey(answers, 'OverallHappiness')
-    results = utilities.subpts(overallHappiness, 'OVERALLHAPPY', OverallHappinessPoints, results)
-
-    overallStressLevel = utilities.strToKey(answers, 'OverallStressLevel')
-    results = utilities.subpts(overallStressLevel, 'OVERALLSTRESS', OverallStressLevelPoints, results)
-
-    overallAnxietyLevel = utilities.strToKey(answers, 'OverallAnxietyLevel')
-    results = utilities.subpts(overallAnxietyLevel, 'OVERALLANXIETY', OverallAnxietyLevelPoints, results)
-
-    overallSatisfaction = utilities.strToKey(answers, 'OverallLifeSatisfaction')
-    results = utilities.subpts(overallSatisfaction, 'OVERALLSAT', OverallSatisfactionPoints, results)
+    # Sleep, Quality Of Life
+    utilities.scoreRules(WELLBEING_RULES, answers, card)
 
+    card.tally()
     # scale score
-    if hoursWorked is not None and hoursWorked in ('2', '3', '4'):
+    if working:
         logging.debug("scaling score for working client")
-        results['POINTS'] = round(
-            (results['POINTS'] / MaxPsychosocialPointsForThoseWithJobs) * MaxPsychosocialPointsForThoseWithoutJobs)
-    results['MAXFORANSWERED'] = round(
-        (results['MAXFORANSWERED'] / MaxPsychosocialPointsForThoseWithJobs) * MaxPsychosocialPointsForThoseWithoutJobs)
-    results['MAXPOINTS'] = round(
-        (results['MAXPOINTS'] / MaxPsychosocialPointsForThoseWithJobs) * MaxPsychosocialPointsForThoseWithoutJobs)
+        card.total = scaled(card.total)
+        if card.trace is not None:
+            card.explain(None, 'HoursWorked', hoursWorked, card.total, 'scaled for working')
+    card.maxforansweredtotal = scaled(card.maxforansweredtotal)
+    return card
 
-    return results
 
+def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, int]]]]:
+    logging.debug("calculating score for %s", name())
+    return score(utilities.answerVector(answers)).results()
@@ -1,6 +1,7 @@
+import importlib
 import logging
-import pprint
-from typing import List, Dict, Union
+from typing import Dict, Iterable, List, Tuple, Union
+from . import utilities
 from . import Exercise
 from . import Medical
 from . import Nutrition
@@ -9,6 +10,9 @@ from . import Perception
 
 ConstituentModules = (Exercise, Medical, Nutrition, Social, Perception)
 
+# bump whenever a points table, threshold or scoring rule changes
+RULES_VERSION = '1'
+
 
 def sectionNames() -> List[str]:
     return [x.name() for x in ConstituentModules]
@@ -21,20 +25,210 @@ def inputs() -> List[str]:
     return list(xinputs)
 
 
-def vi_points(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
-    # construct point calculators
-    score = {'INDEX': 0, 'MAXPOINTS': 0, 'MAXFORANSWERED': 0, 'COMPONENTS': {}}
+# static, max points never depend on the answers
+MAXPOINTS = sum(x.PLAN.maxpoints for x in ConstituentModules)
+
+# question -> answer vector slot for every question read by the constituent modules
+Questions: Dict[str, int] = {qname: slot for slot, qname in enumerate(sorted(inputs()))}
+
+
+# module name -> questions read by the module
+ModuleInputs: Dict[str, frozenset] = {x.name(): frozenset(x.inputs()) for x in ConstituentModules}
+# inputs that are not stored answers or that change with the calendar (age), modules reading them are always rescored
+VolatileInputs = frozenset(('BirthDate', 'Gender'))
+
+
+# scored answer sets, see fingerprint
+cache = utilities.LRUCache(4096)
+
+# candidate scorer compared with the production score on a sample of requests, see candidate
+shadow = utilities.ShadowScorer()
+
+
+def answerVector(answers: Union[Dict[str, str], utilities.AnswerVector]) -> utilities.AnswerVector:
+    return utilities.answerVector(answers, Questions)
+
+
+def scoreCards(answers: Union[Dict[str, str], utilities.AnswerVector],
+               trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> List[utilities.ScoreCard]:
+    answers = answerVector(answers)
+    return [constituent.score(answers, trace) for constituent in ConstituentModules]
+
+
+def fingerprint(answers: utilities.AnswerVector) -> tuple:
+    # canonical answer set key, no answer ('' or None) is one value and the birth date is folded into the age
+    # so the entry does not outlive a birthday
+    values = ['' if ans is None else ans for ans in answers.values]
+    values[Questions['BirthDate']] = answers.age()
+    return tuple(values)
+
+
+def domains() -> Dict[str, Tuple[str, ...]]:
+    xdomains = {}
+    for x in ConstituentModules:
+        xdomains.update(x.domains())
+    return xdomains
+
+
+# question -> legal answers, for the questions with a fixed set of answers
+Domains: Dict[str, Tuple[str, ...]] = domains()
+
+
+def storedCard(name: str, total: int, maxforansweredtotal: int,
+               components: Dict[str, tuple]) -> Union[utilities.ScoreCard, None]:
+    # score card for a stored module score, None if it does not match the module plan
+    for constituent in ConstituentModules:
+        if constituent.name() == name:
+            if total is None or maxforansweredtotal is None:
+                return None
+            return constituent.PLAN.restore(total, maxforansweredtotal, components)
+    return None
+
+
+def rescoreCards(answers: Union[Dict[str, str], utilities.AnswerVector], changed: Iterable[str],
+                 previous: Dict[str, utilities.ScoreCard], volatile: frozenset = VolatileInputs) -> List[utilities.ScoreCard]:
+    # only rescore the modules reading a changed or volatile question, reuse the previous cards for the rest
+    answers = answerVector(answers)
+    changed = volatile.union(changed)
+    cards = []
     for constituent in ConstituentModules:
-        name = constituent.name()
-        logging.debug('calculating index for %s', name)
-        cscore = constituent.vi_points(answers)
-        logging.debug('score for %s = %s', name, cscore['POINTS'])
-        score['COMPONENTS'][name] = cscore
-        score['INDEX'] = score['INDEX'] + cscore['POINTS']
-        score['MAXPOINTS'] = score['MAXPOINTS'] + cscore['MAXPOINTS']
-        score['MAXFORANSWERED'] = score['MAXFORANSWERED'] + cscore['MAXFORANSWERED']
+        card = previous.get(constituent.name())
+        if card is None or not changed.isdisjoint(ModuleInputs[constituent.name()]):
+            card = constituent.score(answers)
+        else:
+            logging.debug("reusing score for %s", constituent.name())
+        cards.append(card)
+    return cards
+
+
+def results(cards: List[utilities.ScoreCard]) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
+    # build the legacy nested score dict from the score cards
+    score = {'INDEX': 0, 'MAXPOINTS': MAXPOINTS, 'MAXFORANSWERED': 0, 'COMPONENTS': {}}
+    for card in cards:
+        score['COMPONENTS'][card.plan.name] = card.results()
+        score['INDEX'] = score['INDEX'] + card.total
+        score['MAXFORANSWERED'] = score['MAXFORANSWERED'] + card.maxforansweredtotal
+    return score
+
 
+def vi_points(answers: Dict[str, str], trace: Union[List[Dict[str, utilities.ValType]], None] = None) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
+    """score an answer set
+
+    If trace is a list each rule that fired is appended to it as a dict with the component, subcomponent,
+    question, answer seen, points awarded and rule. Traced scores are always computed, not served from the cache.
+    """
+    answers = answerVector(answers)
+    if trace is not None:
+        cards = scoreCards(answers, trace)
+    else:
+        key = fingerprint(answers)
+        cards = cache.get(key)
+        if cards is None:
+            cards = scoreCards(answers)
+            cache.put(key, cards)
+    # score cards are not changed after scoring, the nested dict is built fresh for each caller
+    score = results(cards)
     logging.debug('vitality index = %s', score['INDEX'])
-    logging.debug('vitality index = %s', pprint.pformat(score))
     return score
 
+
+def vi_points_incremental(answers: Dict[str, str], changed: Iterable[str],
+                          previous: Dict[str, utilities.ScoreCard]) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
+    """vi_points for answers that differ from a previous score only in the changed questions
+
+    previous maps module names to score cards of the previous score (see storedCard). Modules with no
+    previous card or reading any changed or volatile input are rescored, the others are reused as is.
+    The cards are not cached, the cache only has fully scored cards. Look for the answer set with cached_points first.
+    """
+    score = results(rescoreCards(answers, changed, previous))
+    logging.debug('vitality index = %s', score['INDEX'])
+    return score
+
+
+def cached_points(answers: Dict[str, str]) -> Union[Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]], None]:
+    # vi_points of an answer set scored before in this process, None if it is not in the cache
+    cards = cache.get(fingerprint(answerVector(answers)))
+    return None if cards is None else results(cards)
+
+
+def sensitivity(answers: Dict[str, str], questions: Union[Iterable[str], None] = None) -> Dict[str, Dict[str, int]]:
+    """INDEX change for every legal alternative answer of every question with a fixed set of answers
+
+    Returns question -> {answer: points delta}. Only the modules reading the question are rescored for each
+    alternative. Alternatives the scorer rejects with an exception are left out.
+    """
+    answers = answerVector(answers)
+    base = scoreCards(answers)
+    index = sum(card.total for card in base)
+    previous = {card.plan.name: card for card in base}
+    deltas = {}
+    for qname in (Domains if questions is None else questions):
+        if qname not in Domains:
+            continue
+        deltas[qname] = {}
+        for ans in Domains[qname]:
+            try:
+                cards = rescoreCards(answers.updated(qname, ans), (qname,), previous, frozenset())
+            except (KeyError, ValueError, ZeroDivisionError) as error:
+                logging.warning("no score for %s = %s - %r", qname, ans, error)
+                continue
+            deltas[qname][ans] = sum(card.total for card in cards) - index
+    return deltas
+
+
+def vi_points_batch(answers, questions: List[str]) -> Dict[str, object]:
+    """score many answer sets at once
+
+    answers is a users x questions matrix (numpy array or nested lists) of raw answer strings, None or '' for
+    no answer, with the columns named by questions. Returns the vi_points dict shape with a numpy array per
+    user for INDEX, MAXFORANSWERED and every component and subcomponent POINTS and MAXFORANSWERED, and for
+    the subcomponent MAXPOINTS. The index and component MAXPOINTS stay the static ints. ERROR flags the rows
+    vi_points would raise an exception for.
+    """
+    # numpy is only needed for batch scoring
+    from . import batch
+    cols = batch.Columns(answers, questions)
+    cards = batch.scoreCards(cols, ConstituentModules)
+    score = {'INDEX': sum(card.total for card in cards), 'MAXPOINTS': MAXPOINTS,
+             'MAXFORANSWERED': sum(card.maxforansweredtotal for card in cards), 'COMPONENTS': {}}
+    for card in cards:
+        components = {}
+        for slot, cname in enumerate(card.plan.components):
+            components[cname] = {'POINTS': card.points[:, slot], 'MAXPOINTS': card.component_maxpoints[:, slot],
+                                 'MAXFORANSWERED': card.maxforanswered[:, slot]}
+        score['COMPONENTS'][card.plan.name] = {'POINTS': card.total, 'MAXPOINTS': card.plan.maxpoints,
+                                               'MAXFORANSWERED': card.maxforansweredtotal, 'COMPONENTS': components}
+    score['ERROR'] = cols.error
+    logging.debug('scored %d answer sets', cols.size)
+    return score
+
+
+def vi_points_uncached(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
+    return results(scoreCards(answers))
+
+
+def vi_points_batch_row(answers: Dict[str, str]) -> Dict[str, Union[int, Dict[str, Dict[str, Union[int, Dict[str, Dict[str, int]]]]]]]:
+    """vi_points through the batch scorer, one answer set as a one row batch"""
+    questions = sorted(answers)
+    score = vi_points_batch([[answers[qname] for qname in questions]], questions)
+    if score.pop('ERROR')[0]:
+        raise ValueError("answer set the scorer rejects")
+
+    def row(node):
+        return {key: row(val) if isinstance(val, dict) else int(val if isinstance(val, int) else val[0])
+                for key, val in node.items()}
+    return row(score)
+
+
+# built in candidate scorers by name
+Candidates = {'uncached': vi_points_uncached, 'batch': vi_points_batch_row}
+
+
+def candidate(name: Union[str, None]):
+    """candidate scorer for shadow scoring, a Candidates name or module:function, None for no name"""
+    if not name:
+        return None
+    if name in Candidates:
+        return Candidates[name]
+    module, _, func = name.partition(':')
+    return getattr(importlib.import_module(module), func)
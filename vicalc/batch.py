@@ -0,0 +1,427 @@
+import logging
+import re
+from datetime import date
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from . import utilities
+from . import Exercise
+from . import Medical
+from . import Nutrition
+from . import Social
+from . import Perception
+
+"""Vectorized scoring over many answer sets at once
+
+    Answers come in as a users x questions matrix of the raw answer strings, one column per question.
+    Columns are parsed with the same answer vector accessors as the single answer set path but only over the
+    distinct values in the column, answers are low cardinality codes so that is a handful of calls.
+    PointsMap lookups become gathers from small dense arrays over the distinct values and PointsRange
+    lookups become searchsorted over the (ascending) range limits.
+
+    Row i of every result equals the single answer set score of row i. Rows the single answer set
+    scorer would raise an exception for are flagged in ERROR and their points are not meaningful.
+"""
+
+IntArray = np.ndarray
+BoolArray = np.ndarray
+
+IsoDate = re.compile(r'\d{4}-\d{2}-\d{2}$')
+
+
+class Columns(object):
+    """the answer matrix with per column parse results cached"""
+
+    def __init__(self, answers: np.ndarray, questions: Sequence[str]) -> None:
+        answers = np.asarray(answers)
+        if answers.dtype.kind != 'U':
+            # None is no answer, same as ''
+            answers = np.where(answers == None, '', answers).astype(str)
+        self.answers = answers
+        self.size = self.answers.shape[0]
+        self.questions: Dict[str, int] = {qname: col for col, qname in enumerate(questions)}
+        self.error: BoolArray = np.zeros(self.size, dtype=bool)
+        self._parsed: Dict[Tuple[str, object], Tuple[list, IntArray]] = {}
+
+    def has(self, qname: str) -> bool:
+        return qname in self.questions
+
+    def unique(self, qname: str) -> Tuple[np.ndarray, IntArray]:
+        # distinct raw answers for a column and the index of each row into them
+        key = (qname, None)
+        if key not in self._parsed:
+            if qname in self.questions:
+                raw, inverse = np.unique(self.answers[:, self.questions[qname]], return_inverse=True)
+            else:
+                logging.error("No answer for %s", qname)
+                raw, inverse = np.array([''], dtype=str), np.zeros(self.size, dtype=np.int64)
+            self._parsed[key] = (raw, inverse.reshape(-1))
+        return self._parsed[key]
+
+    def distinct(self, qname: str, handler) -> Tuple[list, IntArray]:
+        # distinct parsed answers for a column and the index of each row into them
+        key = (qname, handler)
+        if key not in self._parsed:
+            raw, inverse = self.unique(qname)
+            self._parsed[key] = ([handler(utilities.AnswerVector({qname: str(ans)}), qname) for ans in raw], inverse)
+        return self._parsed[key]
+
+    def keys(self, qname: str) -> Tuple[list, IntArray]:
+        return self.distinct(qname, utilities.AnswerVector.asKey)
+
+    def ints(self, qname: str) -> Tuple[IntArray, BoolArray]:
+        parsed, inverse = self.distinct(qname, utilities.AnswerVector.asInt)
+        present = np.array([v is not None for v in parsed], dtype=bool)
+        vals = np.array([v if v is not None else 0 for v in parsed], dtype=np.int64)
+        return vals[inverse], present[inverse]
+
+    def bools(self, qname: str) -> Tuple[BoolArray, BoolArray]:
+        parsed, inverse = self.distinct(qname, utilities.AnswerVector.asBool)
+        present = np.array([v is not None for v in parsed], dtype=bool)
+        vals = np.array([bool(v) for v in parsed], dtype=bool)
+        return vals[inverse], present[inverse]
+
+    def ages(self) -> Tuple[IntArray, BoolArray]:
+        key = ('BirthDate', 'age')
+        if key not in self._parsed:
+            raw, inverse = self.unique('BirthDate')
+            # plain yyyy-mm-dd dates are converted in one go, anything else goes through the answer handler
+            iso = np.array([IsoDate.match(ans) is not None for ans in raw], dtype=bool)
+            try:
+                born = raw[iso].astype('datetime64[D]')
+            except ValueError:
+                iso[:] = False
+                born = np.array([], dtype='datetime64[D]')
+            present = iso.copy()
+            vals = np.zeros(len(raw), dtype=np.int64)
+            today = date.today()
+            years = born.astype('datetime64[Y]')
+            months = born.astype('datetime64[M]')
+            bornYear = years.astype(np.int64) + 1970
+            bornMonth = (months - years).astype(np.int64) + 1
+            bornDay = (born - months).astype(np.int64) + 1
+            vals[iso] = today.year - bornYear - ((today.month < bornMonth) | ((today.month == bornMonth) & (today.day < bornDay)))
+            for idx in np.flatnonzero(~iso):
+                age = utilities.AnswerVector({'BirthDate': str(raw[idx])}).age()
+                if age is not None:
+                    present[idx] = True
+                    vals[idx] = age
+            self._parsed[key] = (vals[inverse], present[inverse])
+        return self._parsed[key]
+
+
+class BatchCard(object):
+    """per slot points for every row, the batch counterpart of utilities.ScoreCard"""
+
+    def __init__(self, plan: utilities.ScoringPlan, size: int) -> None:
+        self.plan = plan
+        self.points: IntArray = np.zeros((size, plan.size), dtype=np.int64)
+        self.maxforanswered: IntArray = np.zeros((size, plan.size), dtype=np.int64)
+        # per row, a module can change the max points of a row (see Nutrition)
+        self.component_maxpoints: IntArray = np.tile(np.array(plan.component_maxpoints, dtype=np.int64), (size, 1))
+        self.total: IntArray = np.zeros(size, dtype=np.int64)
+        self.maxforansweredtotal: IntArray = np.zeros(size, dtype=np.int64)
+
+    def answered(self, slot: int, present: BoolArray) -> None:
+        self.maxforanswered[:, slot] = np.where(present, self.plan.component_maxpoints[slot], 0)
+
+    def award(self, slot: int, mask: BoolArray, pts) -> None:
+        self.points[:, slot] = np.where(mask, pts, self.points[:, slot])
+
+    def lookup(self, slot: int, vals, present: BoolArray, ptscls: utilities.MapType) -> None:
+        # numeric values, same semantics as ScoreCard.lookup
+        pts, legal = points(ptscls, vals)
+        self.answered(slot, present)
+        self.award(slot, present & legal, pts)
+
+    def lookupKeys(self, slot: int, distinct: Tuple[list, IntArray], ptscls: utilities.PointsMap) -> None:
+        # string keys, same semantics as ScoreCard.lookup
+        pts, present, legal = keyPoints(distinct, ptscls)
+        self.answered(slot, present)
+        self.award(slot, present & legal, pts)
+
+    def tally(self) -> 'BatchCard':
+        self.total = self.points.sum(axis=1)
+        self.maxforansweredtotal = self.maxforanswered.sum(axis=1)
+        return self
+
+
+def keyPoints(distinct: Tuple[list, IntArray], ptscls: utilities.PointsMap) -> Tuple[IntArray, BoolArray, BoolArray]:
+    # points for parsed string keys, whether each row was answered and whether the answer was legal
+    parsed, inverse = distinct
+    present = np.array([v is not None for v in parsed], dtype=bool)
+    legal = np.array([v in ptscls._points for v in parsed], dtype=bool)
+    pts = np.array([ptscls._points.get(v, 0) for v in parsed], dtype=np.int64)
+    return pts[inverse], present[inverse], legal[inverse]
+
+
+def points(ptscls: utilities.MapType, vals) -> Tuple[IntArray, BoolArray]:
+    # points for numeric values and whether each value was legal for the table
+    vals = np.asarray(vals)
+    if isinstance(ptscls, utilities.PointsRange):
+        limits = np.array([lim for lim, pts in ptscls.range], dtype=np.float64)
+        table = np.array([pts for lim, pts in ptscls.range] + [ptscls.default], dtype=np.int64)
+        # first limit with val <= lim (inclusive) or val < lim
+        idx = np.searchsorted(limits, vals, side='left' if ptscls.inclusive else 'right')
+        return table[idx], np.ones(vals.shape, dtype=bool)
+    # PointsMap with integer keys, dense gather
+    lo = min(ptscls._points)
+    hi = max(ptscls._points)
+    table = np.array([ptscls._points.get(k, 0) for k in range(lo, hi + 1)], dtype=np.int64)
+    known = np.array([k in ptscls._points for k in range(lo, hi + 1)], dtype=bool)
+    idx = vals.astype(np.int64) - lo
+    inrange = (idx >= 0) & (idx <= hi - lo)
+    idx = np.where(inrange, idx, 0)
+    return np.where(inrange, table[idx], 0), inrange & known[idx]
+
+
+def scoreRules(rules: Tuple[utilities.RuleType, ...], cols: Columns, card: BatchCard) -> BatchCard:
+    for slot, qname, handler, ptscls in rules:
+        if handler is utilities.AnswerVector.asKey:
+            card.lookupKeys(slot, cols.keys(qname), ptscls)
+        else:
+            vals, present = cols.ints(qname)
+            card.lookup(slot, vals, present, ptscls)
+    return card
+
+
+def exercise(cols: Columns) -> BatchCard:
+    card = BatchCard(Exercise.PLAN, cols.size)
+
+    minsExercised, minsPresent = cols.ints('MinutesPhysicalActivity')
+    card.answered(Exercise.EXERCISE, minsPresent & (minsExercised != 0))
+    age, agePresent = cols.ages()
+    vig, vigPresent = cols.ints('MinutesVigorousExercise')
+    mod, modPresent = cols.ints('MinutesModerateExercise')
+    scored = minsPresent & (minsExercised > 0) & agePresent & vigPresent & modPresent
+
+    goals = np.where((age < Exercise.ActivityLevelAgeThreshold)[:, None],
+                     np.array(Exercise.ActivityGoalsUnderSixtyFive, dtype=np.int64),
+                     np.array(Exercise.ActivityGoalsSixtyFivePlus, dtype=np.int64))
+    vigorousGoal, moderateGoal, combinedVigorousGoal, combinedModerateGoal, useModerate = goals.T
+    met = (vig >= vigorousGoal) | (mod >= moderateGoal) | ((vig >= combinedVigorousGoal) & (mod >= combinedModerateGoal))
+    percentVigorousMet = vig / vigorousGoal
+    percentModerateMet = mod / moderateGoal
+    percentCombinedMet = (vig / combinedVigorousGoal + mod / combinedModerateGoal) / 2
+    percent = np.where(percentVigorousMet > percentModerateMet,
+                       np.where(percentVigorousMet > percentCombinedMet, percentVigorousMet, percentCombinedMet),
+                       np.where((useModerate != 0) & (percentModerateMet > percentCombinedMet), percentModerateMet,
+                                percentCombinedMet))
+    pts = np.where(met, Exercise.MaxExerciseActivityPointsAvailable,
+                   np.rint(Exercise.MaxExerciseActivityPointsAvailable * percent).astype(np.int64))
+    card.award(Exercise.EXERCISE, scored, pts)
+
+    return scoreRules(Exercise.RULES, cols, card).tally()
+
+
+def medical(cols: Columns) -> BatchCard:
+    card = BatchCard(Medical.PLAN, cols.size)
+
+    age, agePresent = cols.ages()
+    height, heightPresent = cols.ints('Height')
+    weight, weightPresent = cols.ints('Weight')
+    bmiPresent = agePresent & heightPresent & weightPresent
+    # a height of 0 raises in the single answer set scorer
+    cols.error |= bmiPresent & (height == 0)
+    bmiPresent &= height != 0
+    bmi = (weight / np.where(height != 0, height * height, 1)) * Medical.BMIConstant
+    below, belowLegal = points(Medical.BelowBMIThresholdAgeRange, bmi)
+    above, aboveLegal = points(Medical.AboveBMIThresholdAgeRange, bmi)
+    card.answered(Medical.BMI, bmiPresent)
+    card.award(Medical.BMI, bmiPresent, np.where(age <= Medical.BMIAgeThreshold, below, above))
+
+    numberOfConditions, conditionsPresent = cols.ints('NumberOfConditions')
+    card.answered(Medical.MEDCONDS, conditionsPresent)
+    hasConditions = conditionsPresent & (numberOfConditions > 0)
+    managedByLifestyle, lifestylePresent = cols.ints('ConditionsManagedByLifestyle')
+    managedByDr, drPresent = cols.ints('ConditionsManagedByDoctor')
+    affect, affectPresent, affectLegal = keyPoints(cols.keys('ConditionsAffectOnLife'),
+                                                   Medical.AffectOnLifeFromConditionsPoints)
+    # an affect on life answer that is not in the table raises in the single answer set scorer
+    cols.error |= hasConditions & affectPresent & ~affectLegal
+    adjustment = (numberOfConditions * Medical.PointDecreasePerMajorCondition +
+                  np.where(lifestylePresent, managedByLifestyle * Medical.PointIncreaseForMangingConditionsWithMedicationandLifestyle, 0) +
+                  np.where(drPresent, managedByDr * Medical.PointIncreaseForDoctorTreatingCondition, 0) +
+                  np.where(affectPresent, affect, 0))
+    card.award(Medical.MEDCONDS, conditionsPresent,
+               Medical.MaxStartingMajorConditionsPoints + np.where(hasConditions, adjustment, 0))
+
+    scoreRules(Medical.RULES, cols, card)
+
+    usedTobaccoInPast7Days, tobacco7Present = cols.bools('UsedTobaccoInPast7Days')
+    card.award(Medical.TOBACCO7, tobacco7Present & usedTobaccoInPast7Days, Medical.PointDecreaseForTobaccoUsePast7Days)
+    usedTobaccoInPast6Months, tobacco180Present = cols.bools('UsedTobaccoInPast6Months')
+    card.award(Medical.TOBACCO180, tobacco180Present & usedTobaccoInPast6Months,
+               Medical.PointDecreaseForTobaccoUsePast60Days)
+
+    return card.tally()
+
+
+def nutrition(cols: Columns) -> BatchCard:
+    card = BatchCard(Nutrition.PLAN, cols.size)
+
+    scoreRules(Nutrition.SERVINGS_RULES, cols, card)
+
+    fruitParsed, fruitInverse = cols.keys('NumberFruitServings')
+    vegParsed, vegInverse = cols.keys('NumberVegetableServings')
+    pairPoints = np.zeros((len(fruitParsed), len(vegParsed)), dtype=np.int64)
+    pairLegal = np.zeros((len(fruitParsed), len(vegParsed)), dtype=bool)
+    for i, fruit in enumerate(fruitParsed):
+        for j, veg in enumerate(vegParsed):
+            if fruit in Nutrition.FruitAndVegServingsMap and veg in Nutrition.FruitAndVegServingsMap[fruit]:
+                pairPoints[i, j] = Nutrition.FruitAndVegServingsMap[fruit][veg]
+                pairLegal[i, j] = True
+    fruitPresent = np.array([v is not None for v in fruitParsed], dtype=bool)[fruitInverse]
+    vegPresent = np.array([v is not None for v in vegParsed], dtype=bool)[vegInverse]
+    bothPresent = fruitPresent & vegPresent
+    # a fruit and vegetable pair that is not in the map raises in the single answer set scorer
+    cols.error |= bothPresent & ~pairLegal[fruitInverse, vegInverse]
+    card.answered(Nutrition.NUMFRUITANDVEG, bothPresent)
+    card.award(Nutrition.NUMFRUITANDVEG, bothPresent, pairPoints[fruitInverse, vegInverse])
+
+    scoreRules(Nutrition.DRINKS_RULES, cols, card)
+
+    if not cols.has('Gender'):
+        # raises in the single answer set scorer
+        cols.error[:] = True
+    genderParsed, genderInverse = cols.distinct('Gender', lambda answers, qname: utilities.isMale(answers.asKey(qname)))
+    female = np.array([v is not None and not v for v in genderParsed], dtype=bool)[genderInverse]
+    drinks = cols.keys('NumberAlcoholicDrinks')
+    malePts, present, maleLegal = keyPoints(drinks, Nutrition.AlcoholicDrinksMalePoints)
+    femalePts, present, femaleLegal = keyPoints(drinks, Nutrition.AlcoholicDrinksFemalePoints)
+    card.component_maxpoints[female] = Nutrition.FemaleComponentMaxPoints
+    card.answered(Nutrition.NUMALCDRINKS, present)
+    card.award(Nutrition.NUMALCDRINKS, present & np.where(female, femaleLegal, maleLegal),
+               np.where(female, femalePts, malePts))
+
+    return card.tally()
+
+
+def social(cols: Columns) -> BatchCard:
+    card = BatchCard(Social.PLAN, cols.size)
+
+    # Work Engagement
+    hoursWorked = cols.keys('HoursWorked')
+    parsed, inverse = hoursWorked
+    working = np.array([v is not None and v in ('2', '3', '4') for v in parsed], dtype=bool)[inverse]
+    card.lookupKeys(Social.WORKHOURS, hoursWorked, Social.HoursSpentWorkingJobPoints)
+    for slot, qname, ptscls in ((Social.WORKGRAT, 'GratificationFromWork', Social.GratificationFromWorkPoints),
+                                (Social.WORKCAR, 'HoursInCarForWork', Social.HoursSpentInCarForJobPoints),
+                                (Social.WORKSTRESS, 'StressFromWork', Social.StressFromWorkPoints)):
+        # only scored for people working
+        pts, present, legal = keyPoints(cols.keys(qname), ptscls)
+        present = present & working
+        card.answered(slot, present)
+        card.award(slot, present & legal, pts)
+    card.lookupKeys(Social.WORKCOMP, cols.keys('ComparisonHoursWorkedToDesired'), Social.ComparisonOfHoursWorkedToDesiredPoints)
+
+    # Non-work Engagement
+    size = cols.size
+    totalHours = np.zeros(size, dtype=np.int64)
+    hoursAnswered = np.zeros(size, dtype=bool)
+    gratTotal = np.zeros(size, dtype=np.int64)
+    gratDenom = np.zeros(size, dtype=np.int64)
+    stressTotal = np.zeros(size, dtype=np.int64)
+    stressDenom = np.zeros(size, dtype=np.int64)
+    groupEvents = np.zeros(size, dtype=np.int64)
+    groupAnswered = np.zeros(size, dtype=bool)
+
+    def engagement(active: BoolArray, gratificationName: str, stressName: str) -> None:
+        nonlocal gratTotal, gratDenom, stressTotal, stressDenom
+        gratification, gratificationPresent = cols.ints(gratificationName)
+        gratificationPresent = gratificationPresent & active
+        gratTotal = gratTotal + np.where(gratificationPresent, gratification, 0)
+        gratDenom = gratDenom + gratificationPresent
+        stress, stressPresent = cols.ints(stressName)
+        stressPresent = stressPresent & active
+        stressTotal = stressTotal + np.where(stressPresent, stress, 0)
+        stressDenom = stressDenom + stressPresent
+
+    for hoursName, gratificationName, stressName in Social.HoursActivities:
+        hours, hoursPresent = cols.ints(hoursName)
+        totalHours = totalHours + np.where(hoursPresent, hours, 0)
+        hoursAnswered = hoursAnswered | hoursPresent
+        engagement(hoursPresent & (hours > 0), gratificationName, stressName)
+
+    for timesName, hoursName, gratificationName, stressName in Social.GroupActivities:
+        times, timesPresent = cols.ints(timesName)
+        groupAnswered = groupAnswered | timesPresent
+        groupEvents = groupEvents + np.where(timesPresent, times, 0)
+        active = timesPresent & (times > 0)
+        engagement(active, gratificationName, stressName)
+        hours, hoursPresent = cols.ints(hoursName)
+        hoursPresent = hoursPresent & active
+        totalHours = totalHours + np.where(hoursPresent, hours, 0)
+        hoursAnswered = hoursAnswered | hoursPresent
+
+    card.lookup(Social.GROUPEVENTS, groupEvents, groupAnswered, Social.CombinedSmallAndLargeGroupActivitiesPoints)
+    card.lookup(Social.NONWORKACTIVITIES, totalHours, hoursAnswered, Social.TotalHoursOfNonWorkActivitiesRange)
+    gratPresent = gratDenom > 0
+    card.lookup(Social.NONWORKGRAT, np.rint(gratTotal / np.maximum(gratDenom, 1)), gratPresent,
+                Social.GratificationFromAllSocialEngagementPoints)
+    stressPresent = stressDenom > 0
+    card.lookup(Social.NONWORKSTRESS, np.rint(stressTotal / np.maximum(stressDenom, 1)), stressPresent,
+                Social.StressFromAllSocialEngagementPoints)
+
+    # Financial, Social Network
+    scoreRules(Social.NETWORK_RULES, cols, card)
+
+    neighbor, neighborPresent = cols.bools('HaveNeighborThatCanBeReliedOn')
+    card.answered(Social.COMMUNITYCOH, neighborPresent)
+    card.award(Social.COMMUNITYCOH, neighborPresent & neighbor, Social.CommunityCohesionVIPoints)
+    nonClose, nonClosePresent = cols.bools('TimesMeetingSpeakingNonCloseFriends')
+    card.answered(Social.COMMUNITYINTER, nonClosePresent)
+    card.award(Social.COMMUNITYINTER, nonClosePresent & nonClose,
+               Social.PointsIncreaseForMeetingOrSpeakingWithNonCloseFriends)
+
+    satisfactionTotal = np.zeros(size, dtype=np.int64)
+    satisfactionDenom = np.zeros(size, dtype=np.int64)
+    for satisfactionName in Social.SatisfactionQuestions:
+        satisfaction, satisfactionPresent = cols.ints(satisfactionName)
+        satisfactionTotal = satisfactionTotal + np.where(satisfactionPresent, satisfaction, 0)
+        satisfactionDenom = satisfactionDenom + satisfactionPresent
+    card.lookup(Social.SOCIALSAT, satisfactionTotal / np.maximum(satisfactionDenom, 1), satisfactionDenom > 0,
+                Social.SocialSatisfactionRange)
+
+    runningTotal = np.zeros(size, dtype=np.int64)
+    denominatorCount = np.zeros(size, dtype=np.int64)
+
+    def enrich(active: BoolArray, qname: str) -> None:
+        nonlocal runningTotal, denominatorCount
+        val, present = cols.ints(qname)
+        present = present & active
+        runningTotal = runningTotal + np.where(present, val, 0)
+        denominatorCount = denominatorCount + present
+
+    inRelationship, relationshipPresent = cols.ints('InRelationship')
+    enrich(relationshipPresent & (inRelationship > 1), 'RelationshipSatisfaction')
+    enrich(relationshipPresent & (inRelationship > 1), 'PhysicalSatisfaction')
+    petOwner, petOwnerPresent = cols.bools('PetOwner')
+    enrich(petOwnerPresent & petOwner, 'GratificationPetOwner')
+    enrich(np.ones(size, dtype=bool), 'SatisfactionTimeAlone')
+    card.lookup(Social.EMOTIONALENRICH, runningTotal / np.maximum(denominatorCount, 1), denominatorCount > 0,
+                Social.EmotionalEnrichmentRange)
+
+    # Sleep, Quality Of Life
+    scoreRules(Social.WELLBEING_RULES, cols, card)
+
+    card.tally()
+    # scale score
+    card.total = np.where(working, scaled(card.total), card.total)
+    card.maxforansweredtotal = scaled(card.maxforansweredtotal)
+    return card
+
+
+def scaled(pts: IntArray) -> IntArray:
+    return np.rint((pts / Social.MaxPsychosocialPointsForThoseWithJobs) *
+                   Social.MaxPsychosocialPointsForThoseWithoutJobs).astype(np.int64)
+
+
+def perception(cols: Columns) -> BatchCard:
+    return scoreRules(Perception.RULES, cols, BatchCard(Perception.PLAN, cols.size)).tally()
+
+
+BatchScorers = {Exercise: exercise, Medical: medical, Nutrition: nutrition, Social: social, Perception: perception}
+
+
+def scoreCards(cols: Columns, constituents) -> List[BatchCard]:
+    return [BatchScorers[constituent](cols) for constituent in constituents]
@@ -0,0 +1,277 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Tuple, Union
+from . import utilities
+from . import VICalculator
+
+"""Microbenchmarks for the scoring engine
+
+    Synthetic answer sets are generated from the module inputs() and the rule points tables: PointsMap keys
+    for the fixed answer questions, values either side of each PointsRange limit for the ranged ones and
+    the parser the modules read the other questions with (probed once) for the rest.
+
+    Each case (empty, sparse, full, invalid) is timed per module and for the whole index, best of the rounds.
+    Peak memory allocated per call is measured in a separate pass under tracemalloc.
+
+    python -m vicalc.benchmark [--save] [--baseline vicalc_benchmark.json] [--tolerance 0.5]
+
+    With --save the results are written to the baseline file, otherwise they are compared to it and the
+    run fails if any time or allocation is more than tolerance above its baseline.
+"""
+
+Cases = ('empty', 'sparse', 'full', 'invalid')
+
+# answers no parser accepts, or that are outside every points table
+InvalidAnswers = ('x', '-1', '1.5', '99999', 'Yes', '2021-13-45', ' ')
+
+# answers for the questions no rule or probe gives values for, all parse as ints
+FreeIntAnswers = tuple(str(x) for x in (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20, 45, 70, 150, 200))
+BoolAnswers = ('Yes', 'No', 'yes', 'no', '1', '0')
+GenderAnswers = ('Male', 'Female', 'Other')
+
+# seconds, shortest timing round
+MinRoundTime = 0.02
+
+
+def moduleRules(constituent) -> Tuple[utilities.RuleType, ...]:
+    # every compiled rule table of the module (RULES, SERVINGS_RULES, ...)
+    rules = ()
+    for attr in dir(constituent):
+        if attr.endswith('RULES'):
+            rules += getattr(constituent, attr)
+    return rules
+
+
+def rangeAnswers(ptscls: utilities.PointsRange) -> Tuple[str, ...]:
+    # values either side of each limit and past the last one
+    vals = set()
+    for lim, pts in ptscls.range:
+        vals.update((int(lim) - 1, int(lim), int(lim) + 1))
+    vals.add(int(ptscls.range[-1][0]) * 2 + 1)
+    return tuple(str(x) for x in sorted(vals) if x >= 0)
+
+
+def probeParsers() -> Dict[str, Callable[[str], utilities.ValType]]:
+    # score one answer set with '1' for every question and see which parser each question was read with
+    answers = {qname: '1' for qname in VICalculator.Questions}
+    answers['BirthDate'] = '1970-01-01'
+    answers['Gender'] = 'Male'
+    vector = VICalculator.answerVector(answers)
+    for constituent in VICalculator.ConstituentModules:
+        try:
+            constituent.score(vector)
+        except (KeyError, ValueError, ZeroDivisionError):
+            pass
+    return {qname: vector.parsers[slot] for qname, slot in vector.index.items() if vector.parsers[slot] is not None}
+
+
+def answerDomains() -> Dict[str, Tuple[str, ...]]:
+    """legal answers for every question read by the constituent modules"""
+    domains = {}
+    for constituent in VICalculator.ConstituentModules:
+        for slot, qname, handler, ptscls in moduleRules(constituent):
+            if isinstance(ptscls, utilities.PointsRange):
+                domains[qname] = rangeAnswers(ptscls)
+    domains.update(VICalculator.Domains)
+    parsers = probeParsers()
+    start = date(1930, 1, 1)
+    for qname in VICalculator.Questions:
+        if qname in domains:
+            continue
+        if qname == 'BirthDate':
+            domains[qname] = tuple((start + timedelta(days=days)).strftime("%Y-%m-%d") for days in range(0, 27000, 97))
+        elif qname == 'Gender':
+            domains[qname] = GenderAnswers
+        elif parsers.get(qname) is utilities.parseBool:
+            domains[qname] = BoolAnswers
+        else:
+            domains[qname] = FreeIntAnswers
+    return domains
+
+
+class SyntheticAnswers(object):
+    """random answer sets over the answer domains, the same sets for the same seed"""
+
+    def __init__(self, seed: int = 1) -> None:
+        self.random = random.Random(seed)
+        self.domains = answerDomains()
+
+    def answerSet(self, density: float, invalid: float = 0.0) -> Dict[str, str]:
+        answers = {}
+        for qname, domain in self.domains.items():
+            if self.random.random() >= density:
+                answers[qname] = ''
+            elif self.random.random() < invalid:
+                answers[qname] = self.random.choice(InvalidAnswers)
+            else:
+                answers[qname] = self.random.choice(domain)
+        return answers
+
+    def case(self, name: str, n: int) -> List[Dict[str, str]]:
+        if name == 'empty':
+            return [{qname: '' for qname in self.domains} for i in range(n)]
+        if name == 'sparse':
+            return [self.answerSet(0.2) for i in range(n)]
+        if name == 'full':
+            return [self.answerSet(1.0) for i in range(n)]
+        if name == 'invalid':
+            return [self.answerSet(0.8, 0.3) for i in range(n)]
+        raise ValueError(name)
+
+
+def targets() -> Dict[str, Callable[[Dict[str, str]], object]]:
+    # what is timed, each is called with one raw answer dict and parses it itself
+    funcs = {}
+    for constituent in VICalculator.ConstituentModules:
+        funcs[constituent.name()] = lambda answers, constituent=constituent: constituent.score(VICalculator.answerVector(answers))
+    funcs['INDEX'] = lambda answers: VICalculator.results(VICalculator.scoreCards(answers))
+    # vi_points with every answer set already in the cache
+    funcs['INDEX_CACHED'] = VICalculator.vi_points
+    return funcs
+
+
+def call(func: Callable[[Dict[str, str]], object], answers: Dict[str, str]) -> bool:
+    # invalid answer sets can raise, that is part of what is measured
+    try:
+        func(answers)
+        return True
+    except (KeyError, ValueError, ZeroDivisionError):
+        return False
+
+
+def passes(func: Callable[[Dict[str, str]], object], sets: List[Dict[str, str]], number: int) -> Tuple[float, int]:
+    # time number passes over the answer sets, and the number of calls that raised in a pass
+    errors = 0
+    start = time.perf_counter()
+    for i in range(number):
+        errors = 0
+        for answers in sets:
+            if not call(func, answers):
+                errors += 1
+    return time.perf_counter() - start, errors
+
+
+def timeCalls(func: Callable[[Dict[str, str]], object], sets: List[Dict[str, str]], rounds: int) -> Tuple[float, int]:
+    # best time per call over the rounds and the number of calls that raised
+    # as timeit does, keep garbage collection pauses out of the timings and make each round long enough to
+    # measure reliably
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        elapsed, errors = passes(func, sets, number)
+        while elapsed < MinRoundTime:
+            number *= 2
+            elapsed, errors = passes(func, sets, number)
+        best = elapsed
+        for r in range(rounds - 1):
+            elapsed, errors = passes(func, sets, number)
+            best = min(best, elapsed)
+    finally:
+        if gcenabled:
+            gc.enable()
+    return best / (number * len(sets)), errors
+
+
+def allocations(func: Callable[[Dict[str, str]], object], sets: List[Dict[str, str]]) -> float:
+    # mean peak bytes allocated by one call
+    total = 0
+    tracemalloc.start()
+    try:
+        for answers in sets:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(func, answers)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(sets)
+
+
+def run(n: int = 200, rounds: int = 7, seed: int = 1) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """case -> target -> {'us_per_call', 'calls_per_sec', 'bytes_per_call', 'errors'}"""
+    synthetic = SyntheticAnswers(seed)
+    funcs = targets()
+    # scoring logs an error for every unparsable answer, keep that out of the timings
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.CRITICAL)
+    results = {}
+    try:
+        for case in Cases:
+            sets = synthetic.case(case, n)
+            VICalculator.cache.clear()
+            for answers in sets:
+                call(VICalculator.vi_points, answers)
+            results[case] = {}
+            for tname, func in funcs.items():
+                per_call, errors = timeCalls(func, sets, rounds)
+                results[case][tname] = {'us_per_call': per_call * 1e6,
+                                        'calls_per_sec': 1.0 / per_call,
+                                        'bytes_per_call': allocations(func, sets),
+                                        'errors': errors}
+    finally:
+        logging.getLogger().setLevel(level)
+    return results
+
+
+def regressions(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Dict[str, Dict[str, float]]],
+                tolerance: float) -> List[str]:
+    # measurements more than tolerance above the baseline
+    failures = []
+    for case, cresults in results.items():
+        for tname, measured in cresults.items():
+            base = baseline.get(case, {}).get(tname)
+            if not base:
+                continue
+            for key in ('us_per_call', 'bytes_per_call'):
+                if base[key] and measured[key] > base[key] * (1.0 + tolerance):
+                    failures.append("%s %s %s %.1f, baseline %.1f" % (case, tname, key, measured[key], base[key]))
+    return failures
+
+
+def report(results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    print("%-8s %-14s %12s %12s %12s %8s" % ('case', 'target', 'us/call', 'calls/sec', 'bytes/call', 'errors'))
+    for case, cresults in results.items():
+        for tname, measured in cresults.items():
+            print("%-8s %-14s %12.1f %12.0f %12.0f %8d" % (case, tname, measured['us_per_call'], measured['calls_per_sec'],
+                                                         measured['bytes_per_call'], measured['errors']))
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the vicalc scoring engine.")
+    parser.add_argument('--sets', type=int, default=200, help="answer sets per case, default 200")
+    parser.add_argument('--rounds', type=int, default=7, help="timing rounds, the best is kept, default 7")
+    parser.add_argument('--seed', type=int, default=1, help="answer generator seed, default 1")
+    parser.add_argument('--baseline', default='vicalc_benchmark.json', help="baseline file")
+    parser.add_argument('--save', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown over the baseline, default 0.5")
+    args = parser.parse_args(argv)
+
+    results = run(args.sets, args.rounds, args.seed)
+    report(results)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("saved baseline %s" % args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline %s, run with --save to create it" % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failures = regressions(results, baseline, args.tolerance)
+    for failure in failures:
+        print("REGRESSION %s" % failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
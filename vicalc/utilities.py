@@ -1,6 +1,10 @@
-from typing import Dict, Tuple, Union
+from typing import Callable, Dict, Hashable, List, Tuple, Union
+from collections import OrderedDict
 from datetime import datetime, date
 import logging
+import random
+import threading
+import time
 
 
 class PointsRange(object):
@@ -46,135 +50,6 @@ class PointsMap(object):
         return self._points[val]
 
 
-# answer handlers
-# let these throw ValueError
-def yesNoToBool(answers: Dict[str, str], qname: str) -> Union[bool, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        if ans in ('Yes', 'yes'):
-            return True
-        elif ans in ('No', 'no'):
-            return False
-        else:
-            logging.error("answer is not yes/no - %s", ans)
-    return None
-
-
-def strToBool(answers: Dict[str, str], qname: str) -> Union[bool, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        if ans in ('1', 'Yes', 'yes', 'True', 'true'):
-            return True
-        elif ans in ('0', 'No', 'no', 'False', 'false'):
-            return False
-        else:
-            logging.error("answer is not legal bool - %s", ans)
-    return None
-
-
-def strToInt(answers: Dict[str, str], qname: str) -> Union[int, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        try:
-            return int(ans)
-        except ValueError as ve:
-            logging.error("answer is not legal int - %s", ans)
-    return None
-
-
-def strToDate(answers: Dict[str, str], qname: str) -> Union[date, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        try:
-            return datetime.strptime(ans, "%Y-%m-%d").date()
-        except ValueError as ve:
-            logging.error("answer is not legal Date - %s", ans)
-    return None
-
-
-def strToDatetime(answers: Dict[str, str], qname: str) -> Union[datetime, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        try:
-            return datetime.strptime(ans, "%Y-%m-%d-%H-%M-%S")
-        except ValueError as ve:
-            logging.error("answer is not legal Datetime - %s", ans)
-    return None
-
-
-def strToIndex(answers: Dict[str, str], qname: str) -> Union[int, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        try:
-            return int(ans)
-        except ValueError as ve:
-            logging.error("answer is not legal index - %s", ans)
-    return None
-
-
-def strToKey(answers: Dict[str, str], qname: str) -> Union[str, None]:
-    ans = None
-    try:
-        ans = answers[qname]
-    except KeyError as ke:
-        # TODO this is an error now as we expect to have an answer
-        # sometimes None, for every question
-        # later we will not provide any dict entry for questions with no answers
-        logging.error("No answer for %s", qname)
-    # this should be None if no answer but we check for None or empty string ''
-    if ans:
-        return ans
-    return None
-
-
 # birth date handlers
 def ageFromBirthDate(born: date) -> int:
     today = date.today()
@@ -192,54 +67,369 @@ ResultsType = Dict[str, Union[int, Dict[str, Dict[str, int]]]]
 MapType = Union[PointsRange, PointsMap]
 
 
-def subpts(val: ValType, name: str, ptscls: MapType, results: ResultsType) -> ResultsType:
-    pts:int  = 0
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS'][name]['MAXPOINTS']
-    if val is not None:
-        results['COMPONENTS'][name]['MAXFORANSWERED'] = results['COMPONENTS'][name]['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS'][name]['MAXFORANSWERED']
-        try:
-            pts = ptscls.points(val)
-        except (KeyError, IndexError) as error:
-            # val not legal index to points
-            # log warning but continue execution
-            # no points assigned
-            logging.error("Illegal value %s input for %s" % (str(val), name))
-        else:
-            results['COMPONENTS'][name]['POINTS'] = pts
-            logging.debug("score increased by total of %d for %s", results['COMPONENTS'][name]['POINTS'], name)
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS'][name]['POINTS']
-
-    return results
-
-
-def subptscond(val: ValType, cond: bool, name: str, ptscls: MapType, results: ResultsType) -> ResultsType:
-    pts: int = 0
-    results['MAXPOINTS'] = results['MAXPOINTS'] + results['COMPONENTS'][name]['MAXPOINTS']
-    if cond:
-        results['COMPONENTS'][name]['MAXFORANSWERED'] = results['COMPONENTS'][name]['MAXPOINTS']
-        results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS'][name]['MAXFORANSWERED']
+# answer vector
+# parsed answer not read yet
+UNPARSED = object()
+
+
+class AnswerVector(object):
+    """One set of answers parsed once against a question -> slot index
+
+    Answers are read through typed accessors, a missing or malformed answer is logged and read as None.
+    Each answer is parsed on its first read and the parsed value is kept for the other modules, the
+    age is derived once.
+    """
+    __slots__ = ('index', 'values', 'parsed', 'parsers', '_age')
+
+    def __init__(self, answers: Dict[str, str], index: Union[Dict[str, int], None] = None) -> None:
+        if index is None:
+            index = {qname: slot for slot, qname in enumerate(answers)}
+        self.index: Dict[str, int] = index
+        # questions with no dict entry are left out
+        self.values: List[Union[str, None, object]] = [answers.get(qname, UNPARSED) for qname in index]
+        self.parsed: List[object] = [UNPARSED] * len(index)
+        self.parsers: List[object] = [None] * len(index)
+        self._age: Union[int, None, object] = UNPARSED
+
+    def __getitem__(self, qname: str) -> Union[str, None]:
+        # raw answer, let this throw KeyError if there is no answer entry
+        slot = self.index.get(qname)
+        ans = self.values[slot] if slot is not None else UNPARSED
+        if ans is UNPARSED:
+            raise KeyError(qname)
+        return ans
+
+    def _read(self, qname: str, parser: Callable[[str], ValType], error: str) -> ValType:
+        slot = self.index.get(qname)
+        if slot is None or self.values[slot] is UNPARSED:
+            # TODO this is an error now as we expect to have an answer
+            # sometimes None, for every question
+            logging.error("No answer for %s", qname)
+            return None
+        if self.parsers[slot] is parser:
+            return self.parsed[slot]
+        val = None
+        ans = self.values[slot]
+        # this should be None if no answer but we check for None or empty string ''
+        if ans:
+            try:
+                val = parser(ans)
+            except ValueError as ve:
+                logging.error(error, ans)
+        self.parsed[slot] = val
+        self.parsers[slot] = parser
+        return val
+
+    def updated(self, qname: str, ans: Union[str, None]) -> 'AnswerVector':
+        # copy with one answer replaced, the other parsed answers are kept
+        vector = AnswerVector.__new__(AnswerVector)
+        vector.index = self.index
+        vector.values = list(self.values)
+        vector.parsed = list(self.parsed)
+        vector.parsers = list(self.parsers)
+        vector._age = self._age
+        slot = self.index[qname]
+        vector.values[slot] = ans
+        vector.parsed[slot] = UNPARSED
+        vector.parsers[slot] = None
+        if qname == 'BirthDate':
+            vector._age = UNPARSED
+        return vector
+
+    def asKey(self, qname: str) -> Union[str, None]:
+        return self._read(qname, parseKey, "answer is not legal key - %s")
+
+    def asInt(self, qname: str) -> Union[int, None]:
+        return self._read(qname, int, "answer is not legal int - %s")
+
+    def asBool(self, qname: str) -> Union[bool, None]:
+        return self._read(qname, parseBool, "answer is not legal bool - %s")
+
+    def asDate(self, qname: str) -> Union[date, None]:
+        return self._read(qname, parseDate, "answer is not legal Date - %s")
+
+    def age(self) -> Union[int, None]:
+        if self._age is UNPARSED:
+            bdate = self.asDate('BirthDate')
+            self._age = ageFromBirthDate(bdate) if bdate is not None else None
+        return self._age
+
+
+def parseKey(ans: str) -> str:
+    return ans
+
+
+def parseBool(ans: str) -> bool:
+    if ans in ('1', 'Yes', 'yes', 'True', 'true'):
+        return True
+    elif ans in ('0', 'No', 'no', 'False', 'false'):
+        return False
+    raise ValueError(ans)
+
+
+def parseDate(ans: str) -> date:
+    return datetime.strptime(ans, "%Y-%m-%d").date()
+
+
+def answerVector(answers: Union[Dict[str, str], AnswerVector], index: Union[Dict[str, int], None] = None) -> AnswerVector:
+    if isinstance(answers, AnswerVector):
+        if index is None or answers.index is index:
+            return answers
+        # re-slot against the requested index
+        answers = {qname: answers.values[slot] for qname, slot in answers.index.items()
+                   if answers.values[slot] is not UNPARSED}
+    return AnswerVector(answers, index)
+
+
+class ScoringPlan(object):
+    """Fixed slot layout for the subcomponents of a constituent module.
+
+    Built once at import from the module point tables. Scoring fills flat per slot lists on a
+    ScoreCard and the legacy nested results dict is only built when asked for.
+    """
+
+    def __init__(self, name: str, components: Tuple[Tuple[str, int], ...], maxpoints: Union[int, None] = None) -> None:
+        self.name = name
+        self.components: Tuple[str, ...] = tuple(cname for cname, cmax in components)
+        self.component_maxpoints: Tuple[int, ...] = tuple(cmax for cname, cmax in components)
+        self.slots: Dict[str, int] = {cname: slot for slot, cname in enumerate(self.components)}
+        self.size = len(self.components)
+        # total max points is static, it never depends on the answers
+        self.maxpoints: int = sum(self.component_maxpoints) if maxpoints is None else maxpoints
+
+    def card(self, trace: Union[List[Dict[str, ValType]], None] = None) -> 'ScoreCard':
+        return ScoreCard(self, trace)
+
+    def restore(self, total: int, maxforansweredtotal: int,
+                components: Dict[str, Tuple[int, int]]) -> Union['ScoreCard', None]:
+        # score card from stored (points, maxforanswered) per subcomponent
+        # None if the stored subcomponents do not match the plan
+        if len(components) != self.size:
+            return None
+        card = ScoreCard(self)
+        for slot, cname in enumerate(self.components):
+            pts, cmaxans = components.get(cname, (None, None))
+            if pts is None or cmaxans is None:
+                return None
+            card.points[slot] = pts
+            card.maxforanswered[slot] = cmaxans
+        card.total = total
+        card.maxforansweredtotal = maxforansweredtotal
+        return card
+
+
+class ScoreCard(object):
+    __slots__ = ('plan', 'points', 'maxforanswered', 'component_maxpoints', 'total', 'maxforansweredtotal', 'trace')
+
+    def __init__(self, plan: ScoringPlan, trace: Union[List[Dict[str, ValType]], None] = None) -> None:
+        self.plan = plan
+        self.points: List[int] = [0] * plan.size
+        self.maxforanswered: List[int] = [0] * plan.size
+        self.component_maxpoints: Tuple[int, ...] = plan.component_maxpoints
+        self.total: int = 0
+        self.maxforansweredtotal: int = 0
+        # explain trace, only collected when a list is given
+        self.trace = trace
+
+    def answered(self, slot: int) -> None:
+        self.maxforanswered[slot] = self.plan.component_maxpoints[slot]
+
+    def award(self, slot: int, pts: int, qname: Union[str, None] = None, val: ValType = None,
+              rule: Union[str, None] = None) -> None:
+        self.points[slot] = pts
+        if self.trace is not None:
+            self.explain(slot, qname, val, pts, rule)
+
+    def lookup(self, slot: int, val: ValType, ptscls: MapType, qname: Union[str, None] = None) -> None:
+        # answered if there is a value, no points if the value is not legal for the table
+        if val is not None:
+            self.maxforanswered[slot] = self.plan.component_maxpoints[slot]
+            try:
+                self.points[slot] = ptscls.points(val)
+            except (KeyError, IndexError) as error:
+                # val not legal index to points
+                # log warning but continue execution
+                # no points assigned
+                logging.error("Illegal value %s input for %s", val, self.plan.components[slot])
+                if self.trace is not None:
+                    self.explain(slot, qname, val, 0, 'illegal value')
+                return
+            if self.trace is not None:
+                self.explain(slot, qname, val, self.points[slot], type(ptscls).__name__)
+
+    def explain(self, slot: Union[int, None], qname: Union[str, None], val: ValType, pts: int,
+                rule: Union[str, None]) -> None:
+        # which rule fired, the value seen and the points awarded
+        self.trace.append({'component': self.plan.name,
+                           'subcomponent': self.plan.components[slot] if slot is not None else None,
+                           'question': qname, 'answer': val, 'points': pts, 'rule': rule})
+
+    def tally(self) -> 'ScoreCard':
+        self.total = sum(self.points)
+        self.maxforansweredtotal = sum(self.maxforanswered)
+        return self
+
+    def results(self) -> ResultsType:
+        components = {}
+        for cname, pts, cmax, cmaxans in zip(self.plan.components, self.points, self.component_maxpoints,
+                                             self.maxforanswered):
+            components[cname] = {'POINTS': pts, 'MAXPOINTS': cmax, 'MAXFORANSWERED': cmaxans}
+        return {'POINTS': self.total, 'MAXPOINTS': self.plan.maxpoints, 'MAXFORANSWERED': self.maxforansweredtotal,
+                'COMPONENTS': components}
+
+
+# (slot, question, answer vector accessor, points table)
+RuleType = Tuple[int, str, Callable[[AnswerVector, str], ValType], MapType]
+
+
+def compileRules(plan: ScoringPlan, rules: Tuple[Tuple[str, str, Callable[[AnswerVector, str], ValType], MapType], ...]) -> Tuple[RuleType, ...]:
+    return tuple((plan.slots[cname], qname, handler, ptscls) for cname, qname, handler, ptscls in rules)
+
+
+def ruleDomains(rules: Tuple[RuleType, ...]) -> Dict[str, Tuple[str, ...]]:
+    # legal answers of the questions looked up as keys of a PointsMap
+    return {qname: tuple(ptscls._points) for slot, qname, handler, ptscls in rules
+            if handler is AnswerVector.asKey and isinstance(ptscls, PointsMap)}
+
+
+def scoreRules(rules: Tuple[RuleType, ...], answers: AnswerVector, card: ScoreCard) -> ScoreCard:
+    for slot, qname, handler, ptscls in rules:
+        card.lookup(slot, handler(answers, qname), ptscls, qname)
+    return card
+
+
+class LRUCache(object):
+    """Process local, size bounded least recently used cache with hit/miss/eviction counters"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Union[object, None]:
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self) -> None:
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+def compareScores(expected: Dict[str, object], actual: Dict[str, object], path: str = '') -> List[Tuple[str, object, object]]:
+    # (path, expected, actual) for every value that differs between two nested score dicts
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        kpath = path + '/' + str(key) if path else str(key)
+        exp = expected.get(key)
+        act = actual.get(key)
+        if isinstance(exp, dict) and isinstance(act, dict):
+            mismatches.extend(compareScores(exp, act, kpath))
+        elif exp != act:
+            mismatches.append((kpath, exp, act))
+    return mismatches
+
+
+class ShadowScorer(object):
+    """Runs a candidate scorer next to the production one on a sampled fraction of calls
+
+    The candidate only ever sees copies of the answers, its score and any exception it raises are recorded
+    here and never reach the caller. Keeps latency totals for both scorers, mismatch counts and the most
+    recent mismatching values.
+    """
+
+    def __init__(self, candidate: Union[Callable[[Dict[str, str]], ResultsType], None] = None, rate: float = 0.0,
+                 keep: int = 50) -> None:
+        self.candidate = candidate
+        self.rate = rate
+        self.keep = keep
+        self.random = random.Random()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def configure(self, candidate: Union[Callable[[Dict[str, str]], ResultsType], None], rate: float) -> None:
+        with self._lock:
+            self.candidate = candidate
+            self.rate = rate if candidate else 0.0
+
+    def reset(self) -> None:
+        self.sampled = 0
+        self.matched = 0
+        self.mismatched = 0
+        self.errors = 0
+        self.production_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self.candidate_max_seconds = 0.0
+        self.recent: List[Dict[str, object]] = []
+
+    def sample(self) -> bool:
+        return self.rate > 0.0 and self.random.random() < self.rate
+
+    def compare(self, answers: Dict[str, str], score: ResultsType, production_seconds: float) -> None:
+        candidate = self.candidate
+        if candidate is None:
+            return
+        start = time.perf_counter()
         try:
-            pts = ptscls.points(val)
-        except (KeyError, IndexError) as error:
-            logging.error("Illegal value %s input for %s" % (str(val), name))
-        else:
-            results['COMPONENTS'][name]['POINTS'] = pts
-            logging.debug("score increased by total of %d for %s", results['COMPONENTS'][name]['POINTS'], name)
-            results['POINTS'] = results['POINTS'] + results['COMPONENTS'][name]['POINTS']
-    return results
-
-
-def subptsanswered(val: ValType, name: str, ptscls: MapType, results: ResultsType) -> ResultsType:
-    pts: int = 0
-    results['COMPONENTS'][name]['MAXFORANSWERED'] = results['COMPONENTS'][name]['MAXPOINTS']
-    results['MAXFORANSWERED'] = results['MAXFORANSWERED'] + results['COMPONENTS'][name]['MAXFORANSWERED']
-    try:
-        pts = ptscls.points(val)
-    except (KeyError, IndexError) as error:
-        logging.error("Illegal value %s input for %s" % (str(val), name))
-    else:
-        results['COMPONENTS'][name]['POINTS'] = ptscls.points(val)
-        logging.debug("score increased by total of %d for %s", results['COMPONENTS'][name]['POINTS'], name)
-        results['POINTS'] = results['POINTS'] + results['COMPONENTS'][name]['POINTS']
-    return results
+            cscore = candidate(dict(answers))
+        except Exception as error:
+            logging.warning("shadow scorer: candidate failed - %r", error)
+            with self._lock:
+                self.sampled += 1
+                self.errors += 1
+                self.production_seconds += production_seconds
+            return
+        elapsed = time.perf_counter() - start
+        mismatches = compareScores(score, cscore)
+        with self._lock:
+            self.sampled += 1
+            self.production_seconds += production_seconds
+            self.candidate_seconds += elapsed
+            self.candidate_max_seconds = max(self.candidate_max_seconds, elapsed)
+            if mismatches:
+                self.mismatched += 1
+                self.recent.append({'mismatches': [{'path': p, 'production': e, 'candidate': a} for p, e, a in mismatches]})
+                del self.recent[:-self.keep]
+            else:
+                self.matched += 1
+        if mismatches:
+            logging.warning("shadow scorer: %d mismatches, first %s production %r candidate %r", len(mismatches), *mismatches[0])
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            timed = self.sampled - self.errors
+            return {'rate': self.rate, 'sampled': self.sampled, 'matched': self.matched, 'mismatched': self.mismatched,
+                    'errors': self.errors,
+                    'production_mean_ms': 1000.0 * self.production_seconds / self.sampled if self.sampled else None,
+                    'candidate_mean_ms': 1000.0 * self.candidate_seconds / timed if timed else None,
+                    'candidate_max_ms': 1000.0 * self.candidate_max_seconds,
+                    'recent': list(self.recent)}
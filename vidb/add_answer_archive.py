@@ -0,0 +1,41 @@
+import os
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+"""
+Create the answer_archive table if needed. The service reads it for answers older than the retention horizon and
+archive_answers.py moves superseded answers to it.
+
+Run once before deploying the service with the answer archive. Safe to rerun.
+"""
+AnswerArchive.__table__.create(engine, checkfirst=True)
+print("answer_archive is there")
@@ -0,0 +1,48 @@
+import os
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+"""
+Create the index_structure table and add result.structure_version and result.sub_component_scores if needed, for
+packed subcomponent scores (RESULT_PACKED_SCORES). Existing Results keep their ResultSubComponent rows.
+
+Run once before deploying the service with packed scores. Safe to rerun.
+"""
+IndexStructure.__table__.create(engine, checkfirst=True)
+columns = [column['name'] for column in inspect(engine).get_columns('result')]
+for name in ('structure_version', 'sub_component_scores'):
+    if name not in columns:
+        print("adding result.%s" % name)
+        column_type = Result.__table__.c[name].type.compile(dialect=engine.dialect)
+        session.execute(text("ALTER TABLE result ADD %s %s NULL" % (name, column_type)))
+session.commit()
+print("index_structure and the packed score columns are there")
@@ -0,0 +1,46 @@
+import os
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+"""
+Add result.rules_version, the vicalc scoring rules a Result was calculated with, and its index if needed.
+Existing Results keep a null version, rescore.py rescores them.
+
+Run once before deploying the service with scoring rules versions. Safe to rerun.
+"""
+if 'rules_version' not in [column['name'] for column in inspect(engine).get_columns('result')]:
+    print("adding result.rules_version")
+    column_type = Result.__table__.c.rules_version.type.compile(dialect=engine.dialect)
+    session.execute(text("ALTER TABLE result ADD rules_version %s NULL" % column_type))
+    session.execute(text("CREATE INDEX ix_result_rules_version ON result (rules_version)"))
+    session.commit()
+print("result.rules_version is there")
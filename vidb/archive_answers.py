@@ -0,0 +1,74 @@
+import os
+from datetime import datetime, timedelta
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+"""
+Move answers superseded before the retention horizon from the answer table to the answer_archive table.
+
+An answer is archived when it is older than ANSWER_RETENTION_DAYS, the user answered the same question again before
+the horizon and no Result uses it, through an answer set or an answer_result link. The latest answer to each question
+as of the horizon stays in the answer table, so as-of reads after the horizon never need the archive, the service
+reads the archive for earlier times.
+Users are done in chunks of ARCHIVE_CHUNK_SIZE, each chunk in its own transaction. Run it periodically, the
+answer_archive table is created by add_answer_archive.py.
+"""
+retention_days = int(os.environ.get('ANSWER_RETENTION_DAYS') or 730)
+chunk_size = int(os.environ.get('ARCHIVE_CHUNK_SIZE') or 500)
+horizon = datetime.utcnow().replace(microsecond=0) - timedelta(days=retention_days)
+print("archiving answers superseded before %s" % horizon)
+
+columns = ['id', 'time_received', 'answer', 'user_id', 'question_name']
+last_user_id = 0
+total = 0
+while True:
+    user_ids = [user_id for user_id, in session.query(User.id).filter(User.id > last_user_id).order_by(User.id).limit(chunk_size)]
+    if not user_ids:
+        break
+    last_user_id = user_ids[-1]
+
+    ranked = select(Answer.id, func.row_number().over(partition_by=(Answer.user_id, Answer.question_name),
+                                                      order_by=(Answer.time_received.desc(), Answer.id.desc())).label('rownum'))
+    ranked = ranked.where(Answer.user_id.in_(user_ids)).where(Answer.time_received <= horizon).subquery()
+    linked = select(answer_result.c.answer_id).where(answer_result.c.answer_id == ranked.c.id)
+    in_set = select(answer_set_answer.c.answer_id).where(answer_set_answer.c.answer_id == ranked.c.id)
+    superseded = select(ranked.c.id).where(ranked.c.rownum > 1).where(~linked.exists()).where(~in_set.exists())
+
+    moved = session.execute(AnswerArchive.__table__.insert().from_select(
+        columns, select(Answer.id, Answer.time_received, Answer.answer, Answer.user_id, Answer.question_name)
+        .where(Answer.id.in_(superseded)))).rowcount
+    if moved:
+        session.execute(Answer.__table__.delete().where(Answer.id.in_(select(AnswerArchive.id).where(AnswerArchive.user_id.in_(user_ids)))))
+    session.commit()
+    total += moved
+    print("users %d-%d: %d answers archived" % (user_ids[0], user_ids[-1], moved))
+print("%d answers archived" % total)
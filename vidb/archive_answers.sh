@@ -0,0 +1,6 @@
+#!/bin/bash
+DBHOST="viback.database.windows.net"; export DBHOST
+DATABASE="vibackend"; export DATABASE
+DBUSER="vi@viback"; export DBUSER
+VIDBPATH="/home/viadm/VIINC/vidb-alchemy"; export VIDBPATH
+$VIDBPATH/venv/bin/python $VIDBPATH/archive_answers.py >> $VIDBPATH/log/archive_answers.cron.log 2>&1
@@ -0,0 +1,89 @@
+import os
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import bindparam, create_engine, func, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+"""
+Create the answer_set tables if needed and move the answer_result links of the Results into answer sets, one set for
+each distinct set of answers of a user. Results without links get the empty set of their user.
+
+Run once when deploying answer sets, the service writes answer sets after that. Safe to rerun, Results that have an
+answer set are skipped. Results are done in chunks of ANSWER_SET_CHUNK_SIZE, each chunk in its own transaction.
+"""
+chunk_size = int(os.environ.get('ANSWER_SET_CHUNK_SIZE') or 1000)
+
+AnswerSet.__table__.create(engine, checkfirst=True)
+answer_set_answer.create(engine, checkfirst=True)
+if 'answer_set_id' not in [column['name'] for column in inspect(engine).get_columns('result')]:
+    print("adding result.answer_set_id")
+    session.execute(text("ALTER TABLE result ADD answer_set_id INTEGER NULL REFERENCES answer_set (id)"))
+    session.execute(text("CREATE INDEX ix_result_answer_set_id ON result (answer_set_id)"))
+    session.commit()
+
+last_result_id = 0
+total_results = 0
+total_sets = 0
+while True:
+    results = session.execute(select(Result.id, Result.user_id).where(Result.id > last_result_id)
+                              .where(Result.answer_set_id.is_(None)).order_by(Result.id).limit(chunk_size)).all()
+    if not results:
+        break
+    last_result_id = results[-1].id
+    result_ids = [result.id for result in results]
+
+    answer_ids = {result_id: [] for result_id in result_ids}
+    for result_id, answer_id in session.execute(select(answer_result.c.result_id, answer_result.c.answer_id)
+                                                .where(answer_result.c.result_id.in_(result_ids))):
+        answer_ids[result_id].append(answer_id)
+    digests = {result.id: answer_set_digest(result.user_id, answer_ids[result.id]) for result in results}
+
+    sets = dict(session.execute(select(AnswerSet.digest, AnswerSet.id).where(AnswerSet.digest.in_(list(set(digests.values()))))).all())
+    new = {}
+    for result in results:
+        if digests[result.id] not in sets:
+            new[digests[result.id]] = (result.user_id, answer_ids[result.id])
+    if new:
+        session.execute(AnswerSet.__table__.insert(), [{'digest': digest, 'user_id': user_id} for digest, (user_id, aids) in new.items()])
+        sets.update(session.execute(select(AnswerSet.digest, AnswerSet.id).where(AnswerSet.digest.in_(list(new.keys())))).all())
+        members = [{'answer_set_id': sets[digest], 'answer_id': answer_id} for digest, (user_id, aids) in new.items() for answer_id in aids]
+        if members:
+            session.execute(answer_set_answer.insert(), members)
+
+    session.execute(Result.__table__.update().where(Result.__table__.c.id == bindparam('result_id'))
+                    .values(answer_set_id=bindparam('sid')),
+                    [{'result_id': result_id, 'sid': sets[digest]} for result_id, digest in digests.items()])
+    session.execute(answer_result.delete().where(answer_result.c.result_id.in_(result_ids)))
+    session.commit()
+    total_results += len(results)
+    total_sets += len(new)
+    print("results %d-%d: %d new answer sets" % (result_ids[0], result_ids[-1], len(new)))
+print("%d results, %d new answer sets, %d answer_result links left" % (total_results, total_sets,
+                                                                       session.execute(select(func.count()).select_from(answer_result)).scalar()))
@@ -0,0 +1,68 @@
+import os
+from urllib import parse
+from msrestazure.azure_active_directory import MSIAuthentication
+from azure.keyvault.key_vault_client import KeyVaultClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from models import *
+
+
+dbhost = os.environ.get('DBHOST') or '192.168.0.134'
+database = os.environ.get('DATABASE') or 'vibackend'
+dbuser = os.environ.get('DBUSER') or 'vi@viback'
+dbpwd = os.environ.get('DBPWD')
+
+if not dbpwd:
+    # Create MSI Authentication
+    credentials = MSIAuthentication(resource='https://vault.azure.net')
+    key_vault_client = KeyVaultClient(credentials)
+    key_vault_uri = 'https://viinc.vault.azure.net'
+    secret = key_vault_client.get_secret(key_vault_uri,  # Your KeyVault URL
+                                         "MSSQL-DB-PWD",  # Name of your secret
+                                         "")  # The version of the secret. Empty string for latest
+    dbpwd = secret.value
+dbpwd = parse.quote_plus(dbpwd)
+SQLALCHEMY_DATABASE_URI = 'mssql+pymssql://{user}:{password}@{host}/{db}?charset=utf8'.format(user=dbuser,
+                                                                                              password=dbpwd,
+                                                                                              host=dbhost,
+                                                                                              db=database)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=True, connect_args={'tds_version': '7.0'})
+Session = sessionmaker(bind=engine)
+session = Session()
+
+print("connecting to %s:%s:%s" % (dbhost, database, dbuser))
+
+"""
+Create the current_answer and answered_count tables if needed and (re)load them with the newest answer of every
+user to every question and the number of questions each user has answered in every index component.
+
+Run once when deploying the current_answer table, the service keeps it up to date after that.
+Run it with the service stopped, answers saved while it runs can be lost from the table.
+"""
+CurrentAnswer.__table__.create(engine, checkfirst=True)
+AnsweredCount.__table__.create(engine, checkfirst=True)
+
+ranked = select(Answer.user_id, Answer.question_name, Answer.id, Answer.time_received,
+                func.row_number().over(partition_by=(Answer.user_id, Answer.question_name),
+                                       order_by=(Answer.time_received.desc(), Answer.id.desc())).label('rownum')).subquery()
+newest = select(ranked.c.user_id, ranked.c.question_name, ranked.c.id, ranked.c.time_received).where(ranked.c.rownum == 1)
+
+print("deleting current answers")
+session.execute(CurrentAnswer.__table__.delete())
+print("loading current answers")
+session.execute(CurrentAnswer.__table__.insert().from_select(['user_id', 'question_name', 'answer_id', 'time_received'], newest))
+
+# a question counts once for each of its subcomponents in the index the service scores, INDEX as in its config
+index_name = os.environ.get('INDEX') or "Vitality Index"
+counts = select(CurrentAnswer.user_id, IndexSubComponent.indexcomponent_name, func.count())
+counts = counts.join(indexsubcomponent_question, indexsubcomponent_question.c.question_name == CurrentAnswer.question_name)
+counts = counts.join(IndexSubComponent, IndexSubComponent.name == indexsubcomponent_question.c.indexsubcomponent_name)
+counts = counts.join(IndexComponent, IndexComponent.name == IndexSubComponent.indexcomponent_name)
+counts = counts.where(IndexComponent.index_name == index_name).group_by(CurrentAnswer.user_id, IndexSubComponent.indexcomponent_name)
+print("deleting answered counts")
+session.execute(AnsweredCount.__table__.delete())
+print("loading answered counts")
+session.execute(AnsweredCount.__table__.insert().from_select(['user_id', 'indexcomponent_name', 'answered'], counts))
+session.commit()
+print("%d current answers, %d answered counts" % (session.query(CurrentAnswer).count(), session.query(AnsweredCount).count()))
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Index, Table
+import hashlib
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Index, Table, LargeBinary, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -21,6 +22,10 @@ class User(Base):
     results = relationship('Result', cascade="all, delete-orphan", back_populates='user', order_by="Result.time_generated.desc()")
     answers = relationship('Answer', cascade="all, delete-orphan", back_populates='user', order_by="Answer.time_received.desc(), Answer.question_name")
     tokens = relationship('Token', cascade="all, delete-orphan", back_populates='user')
+    current_answers = relationship('CurrentAnswer', cascade="all, delete-orphan", back_populates='user')
+    answered_counts = relationship('AnsweredCount', cascade="all, delete-orphan", back_populates='user')
+    archived_answers = relationship('AnswerArchive', cascade="all, delete-orphan", back_populates='user')
+    answer_sets = relationship('AnswerSet', cascade="all, delete-orphan", back_populates='user')
 
 # indexes
 Index('user_idx_email_pword', User.email, User.pword)
@@ -57,6 +62,7 @@ class Question(Base):
     answers = relationship('Answer', back_populates='question', order_by="Answer.user_id, Answer.time_received.desc(), Answer.question_name")
 
 
+# links from before answer sets, see vidb/load_answer_sets.py
 answer_result = Table('answer_result',
                       Base.metadata,
                       Column('answer_id', Integer, ForeignKey('answer.id'), index=True),
@@ -64,6 +70,18 @@ answer_result = Table('answer_result',
                       )
 
 
+answer_set_answer = Table('answer_set_answer',
+                          Base.metadata,
+                          Column('answer_set_id', Integer, ForeignKey('answer_set.id'), index=True),
+                          Column('answer_id', Integer, ForeignKey('answer.id'), index=True)
+                          )
+
+
+def answer_set_digest(user_id: int, answer_ids) -> str:
+    # content address of a set of answers of a user
+    return hashlib.sha256(("%d:%s" % (user_id, ",".join(str(answer_id) for answer_id in sorted(answer_ids)))).encode()).hexdigest()
+
+
 class Answer(Base):
     __tablename__ = 'answer'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -75,25 +93,96 @@ class Answer(Base):
     # relationships
     user = relationship('User', back_populates='answers')
     question = relationship('Question', back_populates='answers')
-    results = relationship('Result', secondary=answer_result, back_populates='answers')
+    # results scored from an answer set with this answer
+    results = relationship('Result', secondary=answer_set_answer, primaryjoin="Answer.id == answer_set_answer.c.answer_id",
+                           secondaryjoin="answer_set_answer.c.answer_set_id == Result.answer_set_id", viewonly=True,
+                           order_by="Result.time_generated.desc(), Result.id.desc()")
+    linked_results = relationship('Result', secondary=answer_result, back_populates='linked_answers')
 
 # indexes
 Index('answer_idx_user_question_time', Answer.user_id, Answer.question_name, Answer.time_received)
 
 
+class AnswerArchive(Base):
+    # superseded answers moved out of the answer table by archive_answers.py, they keep their answer ids
+    __tablename__ = 'answer_archive'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    time_received = Column(DateTime, nullable=False)
+    answer = Column(String(256), nullable=False)
+    # foreign keys
+    user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    question_name = Column(String(256), ForeignKey('question.name'), nullable=False)
+    # relationships
+    user = relationship('User', back_populates='archived_answers')
+    question = relationship('Question')
+
+# indexes
+Index('answer_archive_idx_user_question_time', AnswerArchive.user_id, AnswerArchive.question_name, AnswerArchive.time_received)
+
+
+class AnswerSet(Base):
+    # a distinct set of answers scored together, shared by all the Results scored from it
+    __tablename__ = 'answer_set'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # answer_set_digest of the user and the answer ids
+    digest = Column(String(64), nullable=False, unique=True)
+    # foreign keys
+    user_id = Column(Integer, ForeignKey('user.id'), nullable=False, index=True)
+    # relationships
+    user = relationship('User', back_populates='answer_sets')
+    answers = relationship('Answer', secondary=answer_set_answer)
+    results = relationship('Result', back_populates='answer_set')
+
+
+class CurrentAnswer(Base):
+    # newest answer of each user to each question, maintained when answers are saved
+    __tablename__ = 'current_answer'
+    user_id = Column(Integer, ForeignKey('user.id'), primary_key=True)
+    question_name = Column(String(256), ForeignKey('question.name'), primary_key=True)
+    time_received = Column(DateTime, nullable=False)
+    # foreign keys
+    answer_id = Column(Integer, ForeignKey('answer.id'), nullable=False, index=True)
+    # relationships
+    user = relationship('User', back_populates='current_answers')
+    answer = relationship('Answer')
+
+
+class AnsweredCount(Base):
+    # number of questions of each index component a user has answered, a question counts once for each of its
+    # subcomponents, maintained when answers are saved
+    __tablename__ = 'answered_count'
+    user_id = Column(Integer, ForeignKey('user.id'), primary_key=True)
+    indexcomponent_name = Column(String(256), ForeignKey('indexcomponent.name'), primary_key=True)
+    answered = Column(Integer, nullable=False, default=0)
+    # relationships
+    user = relationship('User', back_populates='answered_counts')
+
+
 class Result(Base):
     __tablename__ = 'result'
     id = Column(Integer, primary_key=True, autoincrement=True)
     time_generated = Column(DateTime, nullable=False)
     points = Column(Integer, nullable=False)
     maxforanswered = Column(Integer, nullable=False)
+    # vicalc scoring rules the result was calculated with, null for results from before versioning
+    rules_version = Column(String(32), index=True)
+    # subcomponent scores packed in the order of an index structure version instead of ResultSubComponent rows,
+    # null for results with rows, see packedscores.py
+    structure_version = Column(String(32))
+    sub_component_scores = Column(LargeBinary)
     # foreign keys
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False, index=True)
     index_name = Column(String(256), ForeignKey('index.name'), nullable=False, index=True)
+    # null for results from before answer sets, they have answer_result links
+    answer_set_id = Column(Integer, ForeignKey('answer_set.id'), index=True)
     # relationships
     user = relationship('User', back_populates='results')
     index = relationship('Index', back_populates='results')
-    answers = relationship('Answer', secondary=answer_result, back_populates='results', order_by="Answer.time_received.desc(), Answer.question_name")
+    answer_set = relationship('AnswerSet', back_populates='results')
+    answers = relationship('Answer', secondary=answer_set_answer, primaryjoin="Result.answer_set_id == answer_set_answer.c.answer_set_id",
+                           secondaryjoin="answer_set_answer.c.answer_id == Answer.id", viewonly=True,
+                           order_by="Answer.time_received.desc(), Answer.question_name")
+    linked_answers = relationship('Answer', secondary=answer_result, back_populates='linked_results', order_by="Answer.time_received.desc(), Answer.question_name")
     result_components = relationship('ResultComponent', cascade="all, delete-orphan", back_populates='result', order_by="ResultComponent.id")
 
 # indexes
@@ -127,6 +216,16 @@ class ResultSubComponent(Base):
     index_sub_component = relationship('IndexSubComponent', back_populates='result_sub_components')
 
 
+class IndexStructure(Base):
+    # order of the components and subcomponents packed Result scores were written in
+    __tablename__ = 'index_structure'
+    version = Column(String(32), primary_key=True)
+    # json list of [component name, [subcomponent names]]
+    layout = Column(Text, nullable=False)
+    # foreign keys
+    index_name = Column(String(256), ForeignKey('index.name'), nullable=False)
+
+
 class Index(Base):
     __tablename__ = 'index'
     name = Column(String(256), primary_key=True)
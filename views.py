@@ -1,4 +1,7 @@
+from datetime import datetime
+from sqlalchemy.orm import object_session
 from vidb.models import *
+import indexmodel
 
 
 class UserView:
@@ -39,16 +42,22 @@ class AnswerView:
                      'results': "/answers/{0}/results".format(answer.id)
                      }
                  }
+        if answer.id is None:
+            # buffered, it has no id until it is saved
+            dself.update({'id': None, 'self': None, 'relationships': {'user': "/users", 'results': None}})
         return dself
 
 
 class ResultComponentView:
     @classmethod
-    def render(cls, rc: ResultComponent):
+    def render(cls, rc: ResultComponent, idx: indexmodel.IndexModel = None):
+        # max points come from the shared index model rather than the IndexComponent row
+        if idx is None:
+            idx = indexmodel.load(object_session(rc), rc.result.index_name)
         dself = {'attributes': {'points': rc.points,
                                 'maxforanswered': rc.maxforanswered,
                                 'name': rc.indexcomponent_name,
-                                'maxpoints': rc.index_component.maxpoints
+                                'maxpoints': idx.component_maxpoints(rc.indexcomponent_name)
                                 },
                  'id': str(rc.id),
                  'type': 'ResultComponent',
@@ -63,12 +72,14 @@ class ResultComponentView:
 class ResultView:
     @classmethod
     def render(cls, result: Result):
+        idx = indexmodel.load(object_session(result), result.index_name)
         dself = {'attributes': {'time_generated': result.time_generated.strftime("%Y-%m-%d-%H-%M-%S"),
                                 'points': result.points,
                                 'maxforanswered': result.maxforanswered,
-                                'maxpoints': result.index.maxpoints,
-                                'result_components': [ResultComponentView.render(rc) for rc in result.result_components],
-                                'name': result.index_name
+                                'maxpoints': idx.maxpoints,
+                                'result_components': [ResultComponentView.render(rc, idx) for rc in result.result_components],
+                                'name': result.index_name,
+                                'rules_version': result.rules_version
                                 },
                  'id': str(result.id),
                  'type': 'Result',
@@ -79,3 +90,42 @@ class ResultView:
                     }
                  }
         return dself
+
+
+class ScoreView:
+    @classmethod
+    def render(cls, score: dict, idx: indexmodel.IndexModel, aod: datetime, rules_version: str):
+        # a score that is not saved, in the shape of a Result with the subcomponents of each component
+        components = []
+        for icname, icscore in score['COMPONENTS'].items():
+            sub_components = [{'attributes': {'points': scscore['POINTS'],
+                                              'maxforanswered': scscore['MAXFORANSWERED'],
+                                              'name': scname,
+                                              'maxpoints': idx.sub_component_maxpoints(scname)
+                                              },
+                               'type': 'ResultSubComponent'
+                               } for scname, scscore in icscore['COMPONENTS'].items()]
+            components.append({'attributes': {'points': icscore['POINTS'],
+                                              'maxforanswered': icscore['MAXFORANSWERED'],
+                                              'name': icname,
+                                              'maxpoints': idx.component_maxpoints(icname),
+                                              'result_sub_components': sub_components
+                                              },
+                               'type': 'ResultComponent'
+                               })
+        dself = {'attributes': {'time_generated': aod.strftime("%Y-%m-%d-%H-%M-%S"),
+                                'points': score['INDEX'],
+                                'maxforanswered': score['MAXFORANSWERED'],
+                                'maxpoints': idx.maxpoints,
+                                'result_components': components,
+                                'name': idx.name,
+                                'rules_version': rules_version
+                                },
+                 'id': None,
+                 'type': 'ScorePreview',
+                 'self': None,
+                 'relationships': {
+                     'user': "/users"
+                    }
+                 }
+        return dself